@@ -0,0 +1,90 @@
+from django.utils.functional import cached_property
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import claims_usuario_vigentes
+
+
+class UsuarioToken(TokenUser):
+    """
+    Usuario construido solo con los claims del access token (ver
+    tokens.agregar_claims_usuario): id, username, is_staff, is_superuser,
+    unidad_habitacional_id y rol_id no consultan la base de datos.
+
+    Cualquier otro atributo (get_full_name, email, groups, ...) carga el
+    User completo la primera vez que se pide.
+    """
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def unidad_habitacional_id(self):
+        return self.token.get('unidad')
+
+    @cached_property
+    def rol_id(self):
+        return self.token.get('rol')
+
+    @cached_property
+    def usuario(self):
+        """Instancia completa de User (una consulta, solo si hace falta)"""
+        from .models import User
+
+        return User.objects.get(pk=self.id)
+
+    @property
+    def groups(self):
+        return self.usuario.groups
+
+    def __str__(self):
+        return self.username
+
+    def __eq__(self, other):
+        if isinstance(other, TokenUser):
+            return self.id == other.id
+        return getattr(other, 'pk', None) == self.id and hasattr(other, '_meta')
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __getattr__(self, nombre):
+        if nombre.startswith('_'):
+            raise AttributeError(nombre)
+        return getattr(self.usuario, nombre)
+
+
+class JWTAutenticacionSinConsulta(JWTAuthentication):
+    """
+    JWTAuthentication que, en lecturas (GET/HEAD/OPTIONS) y con tokens que
+    traen los claims de usuario, devuelve un UsuarioToken en lugar de
+    consultar la tabla de usuarios en cada request.
+
+    Las escrituras siguen cargando el User real: los serializers lo asignan
+    a llaves foráneas (Reserva.usuario, Aviso.autor), que exigen una
+    instancia del modelo.
+
+    Los claims solo se usan si su sello `usr_v` es el vigente (ver
+    tokens.claims_usuario_vigentes): tras desactivar o modificar al usuario se
+    carga el User, y JWTAuthentication rechaza a los inactivos.
+    """
+
+    def authenticate(self, request):
+        self.solo_lectura = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if (
+            getattr(self, 'solo_lectura', False)
+            and 'is_staff' in validated_token
+            and claims_usuario_vigentes(validated_token)
+        ):
+            return UsuarioToken(validated_token)
+        return super().get_user(validated_token)
@@ -0,0 +1,22 @@
+from django.core.checks import Error, Tags, register
+
+from .services.cache_compartida import cache_compartida
+
+
+@register(Tags.caches, deploy=True)
+def revisar_cache_compartida(app_configs, **kwargs):
+    """`manage.py check --deploy`: en producción la cache debe ser compartida"""
+    if cache_compartida():
+        return []
+    return [
+        Error(
+            "La cache por defecto es local a cada proceso.",
+            hint=(
+                "Defina REDIS_URL: sin una cache compartida las revocaciones de "
+                "privilegios y los cambios de configuración y de rostros no llegan "
+                "a los demás workers, y los servicios consultan la base de datos en "
+                "cada request."
+            ),
+            id="api.E001",
+        )
+    ]
@@ -0,0 +1,56 @@
+from datetime import datetime, time, timedelta
+
+from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+
+def fecha_de_parametro(valor, parametro):
+    """date de un query param AAAA-MM-DD (ValidationError si no es válida)"""
+    try:
+        fecha = parse_date(valor)
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise ValidationError({parametro: "Fecha inválida, use AAAA-MM-DD."})
+    return fecha
+
+
+def id_de_parametro(valor, parametro):
+    """int de un query param que filtra por una FK (ValidationError si no es un entero)"""
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValidationError({parametro: "Debe ser un número entero."})
+
+
+def inicio_dia(fecha):
+    """Medianoche local (aware) de una fecha"""
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def filtrar_rango_fechas(queryset, campo, params, desde="fecha_desde", hasta="fecha_hasta"):
+    """
+    Filtrar `campo` por los días [desde, hasta] (ambos incluidos) recibidos
+    como query params, con un intervalo semiabierto sobre la columna:
+
+        campo >= inicio(desde) AND campo < inicio(hasta + 1 día)
+
+    Si `campo` es un DateTimeField los límites son medianoches locales aware.
+    Nunca se usa campo__date: el cast de la columna impide usar su índice
+    (y en la bitácora, descartar particiones).
+    """
+    con_hora = isinstance(queryset.model._meta.get_field(campo), models.DateTimeField)
+
+    valor = params.get(desde)
+    if valor:
+        inicio = fecha_de_parametro(valor, desde)
+        queryset = queryset.filter(**{f"{campo}__gte": inicio_dia(inicio) if con_hora else inicio})
+
+    valor = params.get(hasta)
+    if valor:
+        fin = fecha_de_parametro(valor, hasta) + timedelta(days=1)
+        queryset = queryset.filter(**{f"{campo}__lt": inicio_dia(fin) if con_hora else fin})
+
+    return queryset
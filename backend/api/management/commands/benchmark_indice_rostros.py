@@ -0,0 +1,66 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.services.indices_rostros import IndiceExacto, IndiceIVF
+
+
+class Command(BaseCommand):
+    help = 'Compara recall y latencia del índice IVF contra la búsqueda exacta sobre una galería sintética'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rostros', type=int, default=50000, help='Tamaño de la galería sintética')
+        parser.add_argument('--dimension', type=int, default=128, help='Dimensión de los embeddings')
+        parser.add_argument('--consultas', type=int, default=500, help='Número de sondas a evaluar')
+        parser.add_argument('--listas', type=int, default=0, help='Celdas IVF (0 = raíz cuadrada del tamaño)')
+        parser.add_argument('--sondas', default='1,2,4,8,16,32', help='Valores de n_sondas separados por coma')
+        parser.add_argument('--ruido', type=float, default=0.35, help='Desviación del ruido de las sondas')
+        parser.add_argument('--semilla', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['semilla'])
+        galeria = self._normalizar(rng.standard_normal((options['rostros'], options['dimension']), dtype=np.float32))
+
+        # Sondas: rostros de la galería con ruido, como capturas reales de la misma persona
+        objetivos = rng.integers(0, len(galeria), options['consultas'])
+        ruido = rng.standard_normal((len(objetivos), options['dimension']), dtype=np.float32)
+        escala = np.float32(options['ruido'] / np.sqrt(options['dimension']))
+        sondas = self._normalizar(galeria[objetivos] + escala * ruido)
+
+        exacto = IndiceExacto(galeria)
+        esperados, latencias = self._medir(exacto, sondas)
+        self._reportar('exacto', latencias, 1.0)
+
+        inicio = time.perf_counter()
+        ivf = IndiceIVF(galeria, n_listas=options['listas'])
+        self.stdout.write(
+            f"IVF entrenado con {len(ivf.centroides)} listas en {time.perf_counter() - inicio:.2f} s"
+        )
+
+        for n_sondas in [int(valor) for valor in options['sondas'].split(',') if valor.strip()]:
+            ivf.n_sondas = max(1, min(n_sondas, len(ivf.centroides)))
+            obtenidos, latencias = self._medir(ivf, sondas)
+            recall = float(np.mean(obtenidos == esperados))
+            self._reportar(f'ivf sondas={ivf.n_sondas}', latencias, recall)
+
+    @staticmethod
+    def _normalizar(matriz):
+        return matriz / np.linalg.norm(matriz, axis=1, keepdims=True)
+
+    @staticmethod
+    def _medir(indice, sondas):
+        resultados = np.empty(len(sondas), dtype=np.int64)
+        latencias = np.empty(len(sondas))
+        for i, sonda in enumerate(sondas):
+            inicio = time.perf_counter()
+            filas, _ = indice.buscar(sonda, k=1)
+            latencias[i] = time.perf_counter() - inicio
+            resultados[i] = filas[0] if len(filas) else -1
+        return resultados, latencias * 1000
+
+    def _reportar(self, nombre, latencias, recall):
+        self.stdout.write(
+            f"{nombre:<18} recall@1={recall:.3f}  "
+            f"p50={np.percentile(latencias, 50):.3f} ms  p95={np.percentile(latencias, 95):.3f} ms"
+        )
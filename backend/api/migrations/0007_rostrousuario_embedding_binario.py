@@ -0,0 +1,58 @@
+import json
+
+import numpy as np
+from django.db import migrations, models
+
+
+def json_a_binario(apps, schema_editor):
+    RostroUsuario = apps.get_model('api', 'RostroUsuario')
+    for rostro in RostroUsuario.objects.only('id', 'embedding').iterator(chunk_size=500):
+        try:
+            vector = np.asarray(json.loads(rostro.embedding), dtype='<f4').reshape(-1)
+        except (TypeError, ValueError):
+            # Embeddings corruptos quedan vacíos y se ignoran al cargar la galería
+            vector = np.empty(0, dtype='<f4')
+        RostroUsuario.objects.filter(pk=rostro.pk).update(embedding_binario=vector.tobytes())
+
+
+def binario_a_json(apps, schema_editor):
+    RostroUsuario = apps.get_model('api', 'RostroUsuario')
+    for rostro in RostroUsuario.objects.only('id', 'embedding_binario').iterator(chunk_size=500):
+        vector = np.frombuffer(rostro.embedding_binario or b'', dtype='<f4')
+        RostroUsuario.objects.filter(pk=rostro.pk).update(embedding=json.dumps(vector.tolist()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_configuracionreconocimiento_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rostrousuario',
+            name='embedding_binario',
+            field=models.BinaryField(null=True),
+        ),
+        # Nullable antes de eliminarla para que la migración sea reversible con filas existentes
+        migrations.AlterField(
+            model_name='rostrousuario',
+            name='embedding',
+            field=models.TextField(null=True, help_text='Vector de características faciales en formato JSON'),
+        ),
+        migrations.RunPython(json_a_binario, binario_a_json),
+        migrations.RemoveField(
+            model_name='rostrousuario',
+            name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='rostrousuario',
+            old_name='embedding_binario',
+            new_name='embedding',
+        ),
+        migrations.AlterField(
+            model_name='rostrousuario',
+            name='embedding',
+            field=models.BinaryField(help_text='Vector de características faciales (float32 little-endian)'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def poblar_presencias(apps, schema_editor):
+    """Inicializar la presencia de cada usuario con su último registro de acceso"""
+    User = apps.get_model('api', 'User')
+    RegistroAcceso = apps.get_model('api', 'RegistroAcceso')
+    PresenciaUsuario = apps.get_model('api', 'PresenciaUsuario')
+
+    ultimo = RegistroAcceso.objects.filter(usuario=models.OuterRef('pk')).order_by('-timestamp')
+    usuarios = (
+        User.objects.filter(pk__in=RegistroAcceso.objects.filter(usuario__isnull=False).values('usuario'))
+        .annotate(
+            ultimo_tipo=models.Subquery(ultimo.values('tipo_acceso')[:1]),
+            ultimo_timestamp=models.Subquery(ultimo.values('timestamp')[:1]),
+        )
+        .values_list('pk', 'ultimo_tipo', 'ultimo_timestamp')
+    )
+    PresenciaUsuario.objects.bulk_create(
+        (
+            PresenciaUsuario(usuario_id=pk, dentro=tipo == 'entrada', ultima_vez_visto=timestamp)
+            for pk, tipo, timestamp in usuarios.iterator(chunk_size=2000)
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_rostrousuario_embedding_binario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PresenciaUsuario',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='presencia', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('dentro', models.BooleanField(default=False)),
+                ('ultima_vez_visto', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Presencia de Usuario',
+                'verbose_name_plural': 'Presencias de Usuario',
+                'indexes': [models.Index(fields=['dentro'], name='api_presenc_dentro_9a2c34_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_presencias, migrations.RunPython.noop),
+    ]
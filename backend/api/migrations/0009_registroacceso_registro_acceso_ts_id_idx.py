@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_presenciausuario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registroacceso',
+            index=models.Index(fields=['timestamp', 'id'], name='registro_acceso_ts_id_idx'),
+        ),
+    ]
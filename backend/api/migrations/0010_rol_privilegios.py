@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_registroacceso_registro_acceso_ts_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rol',
+            name='privilegios',
+            field=models.ManyToManyField(blank=True, related_name='roles', through='api.RolPrivilegio', to='api.privilegio'),
+        ),
+    ]
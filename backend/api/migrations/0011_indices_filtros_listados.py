@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_rol_privilegios'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cuota',
+            index=models.Index(fields=['estado', 'fecha_vencimiento'], name='cuota_estado_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cuota',
+            index=models.Index(fields=['unidad_habitacional', 'estado'], name='cuota_unidad_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invitado',
+            index=models.Index(fields=['residente', 'fecha_evento'], name='invitado_residente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invitado',
+            index=models.Index(fields=['estado', 'fecha_evento'], name='invitado_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroacceso',
+            index=models.Index(fields=['usuario', 'timestamp'], name='registro_acceso_usuario_ts_idx'),
+        ),
+    ]
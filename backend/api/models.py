@@ -1,5 +1,9 @@
-from django.db import models
+import json
+import numpy as np
+from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 class UnidadHabitacional(models.Model):
     numero = models.CharField(max_length=10)
@@ -15,6 +19,7 @@ class UnidadHabitacional(models.Model):
 class Rol(models.Model):
     nombre = models.CharField(max_length=50)
     descripcion = models.TextField(blank=True, null=True)
+    privilegios = models.ManyToManyField('Privilegio', through='RolPrivilegio', related_name='roles', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -59,6 +64,49 @@ class RolPrivilegio(models.Model):
 
     def __str__(self):
         return f"{self.rol.nombre} - {self.privilegio.nombre}"
+
+    @classmethod
+    def asignar(cls, mapa):
+        """
+        Asignar en un solo INSERT los privilegios de {rol_id: [privilegio_id, ...]}.
+        Las asignaciones que ya existen se ignoran.
+        """
+        from .services.privilegios_service import privilegios_service
+
+        asignaciones = [
+            cls(rol_id=rol_id, privilegio_id=privilegio_id)
+            for rol_id, privilegio_ids in mapa.items()
+            for privilegio_id in set(privilegio_ids)
+        ]
+        if not asignaciones:
+            return
+        with transaction.atomic():
+            cls.objects.bulk_create(asignaciones, ignore_conflicts=True)
+            # bulk_create no emite post_save: invalidar a mano
+            transaction.on_commit(privilegios_service.invalidar)
+
+    @classmethod
+    def revocar(cls, mapa):
+        """
+        Quitar en un solo DELETE los privilegios de {rol_id: [privilegio_id, ...]}.
+
+        QuerySet.delete() leería las filas y las borraría una por una para
+        emitir post_delete; nada referencia a RolPrivilegio, así que se borra
+        directo y se invalida la cache una sola vez.
+        """
+        from .services.privilegios_service import privilegios_service
+
+        filtro = Q()
+        for rol_id, privilegio_ids in mapa.items():
+            if privilegio_ids:
+                filtro |= Q(rol_id=rol_id, privilegio_id__in=privilegio_ids)
+        if not filtro:
+            return 0
+        with transaction.atomic():
+            borrados = cls.objects.filter(filtro)._raw_delete(cls.objects.db)
+            if borrados:
+                transaction.on_commit(privilegios_service.invalidar)
+        return borrados
     
 class Cuota(models.Model):
     TIPO_CHOICES = [
@@ -88,6 +136,11 @@ class Cuota(models.Model):
 
     class Meta:
         ordering = ['-fecha_emision']
+        indexes = [
+            # ?estado= con rango de vencimiento, y las cuotas de una unidad por estado
+            models.Index(fields=['estado', 'fecha_vencimiento'], name='cuota_estado_venc_idx'),
+            models.Index(fields=['unidad_habitacional', 'estado'], name='cuota_unidad_estado_idx'),
+        ]
 
 class Invitado(models.Model):
     TIPO_EVENTO_CHOICES = [
@@ -127,6 +180,29 @@ class Invitado(models.Model):
         ordering = ['-creado_en']
         verbose_name = 'Invitado'
         verbose_name_plural = 'Invitados'
+        indexes = [
+            # Invitados del residente por fecha, y listados de administración por estado
+            models.Index(fields=['residente', 'fecha_evento'], name='invitado_residente_fecha_idx'),
+            models.Index(fields=['estado', 'fecha_evento'], name='invitado_estado_fecha_idx'),
+        ]
+
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+
+def embedding_a_bytes(valor):
+    """Empaquetar un embedding (JSON, lista o array) como bytes float32 little-endian"""
+    if isinstance(valor, str):
+        valor = json.loads(valor)
+    vector = np.asarray(valor, dtype=EMBEDDING_DTYPE).reshape(-1)
+    if vector.size == 0 or not np.all(np.isfinite(vector)):
+        raise ValueError("El embedding debe ser un vector numérico no vacío")
+    return vector.tobytes()
+
+
+def embedding_desde_bytes(datos):
+    """Leer un embedding almacenado en binario como array float32"""
+    return np.frombuffer(datos, dtype=EMBEDDING_DTYPE)
+
 
 class RostroUsuario(models.Model):
     ESTADO_CHOICES = [
@@ -136,7 +212,7 @@ class RostroUsuario(models.Model):
     ]
 
     usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='rostro')
-    embedding = models.TextField(help_text="Vector de características faciales en formato JSON")
+    embedding = models.BinaryField(help_text="Vector de características faciales (float32 little-endian)")
     imagen_referencia = models.ImageField(upload_to='rostros/', null=True, blank=True)
     esta_activo = models.BooleanField(default=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
@@ -149,7 +225,18 @@ class RostroUsuario(models.Model):
     def __str__(self):
         return f"Rostro de {self.usuario.get_full_name()}"
 
-    def actualizar_estadisticas(self, confianza):
+    @property
+    def vector(self):
+        """Embedding como array float32 de NumPy (sin copiar el buffer)"""
+        return embedding_desde_bytes(self.embedding)
+
+    def establecer_embedding(self, valor):
+        """Asignar el embedding desde JSON, lista o array"""
+        self.embedding = embedding_a_bytes(valor)
+
+    CAMPOS_ESTADISTICAS = ['total_accesos', 'confianza_promedio', 'ultimo_acceso']
+
+    def actualizar_estadisticas(self, confianza, guardar=True):
         """Actualizar estadísticas después de un acceso exitoso"""
         self.total_accesos += 1
         # Calcular confianza promedio ponderada
@@ -158,7 +245,8 @@ class RostroUsuario(models.Model):
         else:
             self.confianza_promedio = (self.confianza_promedio * (self.total_accesos - 1) + confianza) / self.total_accesos
         self.ultimo_acceso = timezone.now()
-        self.save()
+        if guardar:
+            self.save(update_fields=self.CAMPOS_ESTADISTICAS)
 
     class Meta:
         verbose_name = 'Rostro de Usuario'
@@ -192,6 +280,47 @@ class RegistroAcceso(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Registro de Acceso'
         verbose_name_plural = 'Registros de Acceso'
+        indexes = [
+            # Paginación por cursor (timestamp, id)
+            models.Index(fields=['timestamp', 'id'], name='registro_acceso_ts_id_idx'),
+            # Historial de un usuario (?usuario=) por fecha
+            models.Index(fields=['usuario', 'timestamp'], name='registro_acceso_usuario_ts_idx'),
+        ]
+
+class PresenciaUsuario(models.Model):
+    """Estado actual (dentro/fuera) de cada usuario, actualizado junto a cada RegistroAcceso"""
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='presencia')
+    dentro = models.BooleanField(default=False)
+    ultima_vez_visto = models.DateTimeField()
+
+    def __str__(self):
+        estado = "dentro" if self.dentro else "fuera"
+        return f"{self.usuario_id} - {estado} - {self.ultima_vez_visto}"
+
+    @classmethod
+    def actualizar_desde_registros(cls, registros):
+        """Reflejar registros de acceso exitosos en la tabla de presencia con un solo upsert"""
+        presencias = {}
+        for registro in registros:
+            if registro.usuario_id and registro.estado == 'exitoso':
+                # Si un usuario aparece varias veces, prevalece su último registro
+                presencias[registro.usuario_id] = cls(
+                    usuario_id=registro.usuario_id,
+                    dentro=registro.tipo_acceso == 'entrada',
+                    ultima_vez_visto=registro.timestamp or timezone.now(),
+                )
+        if presencias:
+            cls.objects.bulk_create(
+                presencias.values(),
+                update_conflicts=True,
+                unique_fields=['usuario'],
+                update_fields=['dentro', 'ultima_vez_visto'],
+            )
+
+    class Meta:
+        indexes = [models.Index(fields=['dentro'])]
+        verbose_name = 'Presencia de Usuario'
+        verbose_name_plural = 'Presencias de Usuario'
 
 class ConfiguracionReconocimiento(models.Model):
     """Configuración del sistema de reconocimiento facial"""
@@ -205,10 +334,10 @@ class ConfiguracionReconocimiento(models.Model):
 
     @classmethod
     def obtener_valor(cls, nombre, default=None):
-        try:
-            return cls.objects.get(nombre=nombre).valor
-        except cls.DoesNotExist:
-            return default
+        # Se lee de la instantánea por proceso, sin consultar la base en cada llamada
+        from .services.configuracion_service import configuracion_service
+
+        return configuracion_service.obtener().valores.get(nombre, default)
 
     @classmethod
     def establecer_valor(cls, nombre, valor, descripcion=""):
@@ -0,0 +1,103 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Paginación por cursor sobre una llave compuesta (campo, id).
+
+    El cursor guarda el par (campo, id) de la última fila entregada y la
+    página siguiente se pide con `campo < valor OR (campo = valor AND id < pk)`
+    (sentido inverso si el orden es ascendente). Con un índice compuesto sobre
+    (campo, id) cada página cuesta lo mismo sin importar su profundidad y no
+    hay COUNT(*) ni OFFSET.
+
+    `?ordering=campo` o `?ordering=-campo` elige el sentido; el campo es fijo.
+    """
+
+    ordering = ('-id',)
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    invalid_cursor_message = 'Cursor inválido'
+
+    def get_ordering(self, request, queryset, view):
+        campo, desempate = self.ordering
+        nombre = campo.lstrip('-')
+        solicitado = request.query_params.get('ordering')
+        if solicitado == nombre:
+            return (nombre, desempate.lstrip('-'))
+        if solicitado == f'-{nombre}':
+            return (f'-{nombre}', f"-{desempate.lstrip('-')}")
+        return (campo, desempate)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.campos = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request)
+        reverso = bool(cursor and cursor.reverse)
+
+        # La página anterior se recorre con el orden invertido y luego se voltea
+        orden = [self._invertir(campo) if reverso else campo for campo in self.campos]
+        queryset = queryset.order_by(*orden)
+        if cursor is not None:
+            queryset = self._despues_de(queryset, orden, self._decodificar_posicion(queryset, cursor.position))
+
+        filas = list(queryset[:self.page_size + 1])
+        hay_mas = len(filas) > self.page_size
+        filas = filas[:self.page_size]
+        if reverso:
+            filas.reverse()
+
+        self.page = filas
+        self.has_next = (cursor is not None) if reverso else hay_mas
+        self.has_previous = hay_mas if reverso else (cursor is not None)
+        return filas
+
+    @staticmethod
+    def _invertir(campo):
+        return campo[1:] if campo.startswith('-') else f'-{campo}'
+
+    @staticmethod
+    def _despues_de(queryset, orden, posicion):
+        campo, desempate = [c.lstrip('-') for c in orden]
+        valor, pk = posicion
+        operador = 'lt' if orden[0].startswith('-') else 'gt'
+        # El rango `campo <= valor` deja al índice acotar el recorrido; el OR desempata por id
+        return queryset.filter(**{f'{campo}__{operador}e': valor}).filter(
+            Q(**{f'{campo}__{operador}': valor}) | Q(**{f'{desempate}__{operador}': pk})
+        )
+
+    def _decodificar_posicion(self, queryset, posicion):
+        try:
+            valor, pk = (posicion or '').split('|', 1)
+            return tuple(
+                queryset.model._meta.get_field(campo.lstrip('-')).to_python(texto)
+                for campo, texto in zip(self.campos, (valor, pk))
+            )
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _posicion(self, fila):
+        valores = [getattr(fila, campo.lstrip('-')) for campo in self.campos]
+        return '|'.join(v.isoformat() if hasattr(v, 'isoformat') else str(v) for v in valores)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._posicion(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._posicion(self.page[0])))
+
+
+class RegistroAccesoPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
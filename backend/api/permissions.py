@@ -1,5 +1,8 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from .services.privilegios_service import privilegios_service
+from .tokens import privilegio_en_claims
+
 
 class IsAdminOrReadOnly(BasePermission):
     """
@@ -20,7 +23,10 @@ class TienePrivilegio(BasePermission):
 
     - superuser => permitido.
     - si la vista NO define privilegio => permitido (no bloquea accidentalmente).
-    - intenta resolver por `user.roles` (M2M) o por `user.rol` (FK) si existe.
+    - con JWT_PRIVILEGIOS_EN_TOKEN, si el access token trae el mapa de bits
+      vigente (`privs` + `rol_v`) se decide solo con el claim.
+    - si no, resuelve los códigos del rol del usuario (`user.rol_id`) con la
+      cache de privilegios_service: con la cache caliente no hay consultas.
     - si no puede determinar privilegios => deniega (False), pero NUNCA lanza excepción.
     """
 
@@ -39,21 +45,11 @@ class TienePrivilegio(BasePermission):
         if not code:
             return True
 
-        # Intenta por M2M: user.roles
-        try:
-            roles_qs = getattr(user, "roles", None)
-            if roles_qs is not None and hasattr(roles_qs, "filter"):
-                return roles_qs.filter(privilegios__codigo=code).exists()
-        except Exception:
-            pass
-
-        # Intenta por FK: user.rol
         try:
-            rol = getattr(user, "rol", None)
-            if rol and hasattr(rol, "privilegios"):
-                return rol.privilegios.filter(codigo=code).exists()
+            en_claims = privilegio_en_claims(getattr(request, "auth", None), code)
+            if en_claims is not None:
+                return en_claims
+            return privilegios_service.tiene_privilegio(user, code)
         except Exception:
-            pass
-
-        # Fallback: denegar sin romper
-        return False
+            # Fallback: denegar sin romper
+            return False
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import User, UnidadHabitacional, Rol, Privilegio, RolPrivilegio, Cuota, Invitado, RostroUsuario, RegistroAcceso
+from .models import User, UnidadHabitacional, Rol, Privilegio, RolPrivilegio, Cuota, Invitado, RostroUsuario, RegistroAcceso, PresenciaUsuario
+from .models import embedding_a_bytes, embedding_desde_bytes
 from django.utils import timezone
 
 
@@ -68,6 +69,34 @@ class RolPrivilegioSerializer(serializers.ModelSerializer):
         model = RolPrivilegio
         fields = '__all__'
 
+class MatrizPrivilegiosSerializer(serializers.Serializer):
+    """Cambios masivos de la matriz rol-privilegio: {rol_id: [privilegio_id, ...]}"""
+    asignar = serializers.DictField(
+        child=serializers.ListField(child=serializers.IntegerField()), required=False, default=dict
+    )
+    revocar = serializers.DictField(
+        child=serializers.ListField(child=serializers.IntegerField()), required=False, default=dict
+    )
+
+    def validate(self, data):
+        try:
+            mapas = {
+                nombre: {int(rol_id): ids for rol_id, ids in data[nombre].items()}
+                for nombre in ('asignar', 'revocar')
+            }
+        except ValueError:
+            raise serializers.ValidationError('Las claves deben ser ids de rol')
+        roles = set(mapas['asignar']) | set(mapas['revocar'])
+        privilegios = {p for mapa in mapas.values() for ids in mapa.values() for p in ids}
+
+        faltantes = roles - set(Rol.objects.filter(id__in=roles).values_list('id', flat=True))
+        if faltantes:
+            raise serializers.ValidationError({'roles': f'No existen los roles {sorted(faltantes)}'})
+        faltantes = privilegios - set(Privilegio.objects.filter(id__in=privilegios).values_list('id', flat=True))
+        if faltantes:
+            raise serializers.ValidationError({'privilegios': f'No existen los privilegios {sorted(faltantes)}'})
+        return mapas
+
 class CuotaSerializer(serializers.ModelSerializer):
     unidad_habitacional_info = UnidadHabitacionalSerializer(source='unidad_habitacional', read_only=True)
     
@@ -93,8 +122,21 @@ class InvitadoSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("La hora de inicio debe ser anterior a la hora de fin")
         return data
     
+class EmbeddingField(serializers.Field):
+    """Expone el embedding binario como lista de floats y acepta JSON o lista al escribir"""
+
+    def to_representation(self, value):
+        return embedding_desde_bytes(value).tolist()
+
+    def to_internal_value(self, data):
+        try:
+            return embedding_a_bytes(data)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError('Embedding inválido')
+
 class RostroUsuarioSerializer(serializers.ModelSerializer):
     usuario_info = UserSerializer(source='usuario', read_only=True)
+    embedding = EmbeddingField()
     
     class Meta:
         model = RostroUsuario
@@ -105,4 +147,11 @@ class RegistroAccesoSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = RegistroAcceso
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class PresenciaUsuarioSerializer(serializers.ModelSerializer):
+    nombre = serializers.CharField(source='usuario.get_full_name', read_only=True)
+    
+    class Meta:
+        model = PresenciaUsuario
+        fields = ('usuario', 'nombre', 'dentro', 'ultima_vez_visto')
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def cache_compartida():
+    """
+    True si la cache por defecto la ven todos los procesos (Redis, Memcached,
+    base de datos, archivos). Con LocMemCache cada worker tiene la suya y un
+    sello de versión incrementado en uno no llega a los demás.
+
+    CACHE_COMPARTIDA en settings fuerza el valor (p. ej. en los tests).
+    """
+    forzado = getattr(settings, 'CACHE_COMPARTIDA', None)
+    if forzado is not None:
+        return forzado
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
@@ -0,0 +1,107 @@
+import atexit
+import base64
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def decodificar_imagen_base64(imagen_base64, prefijo='acceso'):
+    """Decodificar una captura en data URL base64 a ContentFile"""
+    format, imgstr = imagen_base64.split(';base64,')
+    ext = format.split('/')[-1]
+    return ContentFile(
+        base64.b64decode(imgstr),
+        name=f'{prefijo}_{int(timezone.now().timestamp() * 1000)}.{ext}'
+    )
+
+
+class GuardadoCapturasService:
+    """Escritor en segundo plano de las capturas de RegistroAcceso.
+
+    La respuesta de acceso no espera a decodificar ni escribir la imagen: se
+    encola y un hilo la guarda en el storage y actualiza `imagen_captura`.
+    La cola está acotada; si está llena la captura se descarta y se cuenta.
+    """
+
+    def __init__(self, max_pendientes=None, hilos=None):
+        self.max_pendientes = max_pendientes or getattr(settings, 'CAPTURAS_MAX_PENDIENTES', 64)
+        self.hilos = hilos or getattr(settings, 'CAPTURAS_HILOS', 2)
+        self._cupos = threading.BoundedSemaphore(self.max_pendientes)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._contadores = {'encoladas': 0, 'guardadas': 0, 'descartadas': 0, 'errores': 0}
+
+    def _sumar(self, contador):
+        with self._lock:
+            self._contadores[contador] += 1
+
+    def _obtener_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='capturas')
+                atexit.register(self.cerrar)
+            return self._executor
+
+    def encolar(self, registro_ids, imagen_base64):
+        """Encolar la captura de uno o varios registros; False si no hay imagen o la cola está llena"""
+        if not imagen_base64 or not registro_ids:
+            return False
+
+        # Contrapresión: nunca bloquear la respuesta del acceso esperando un cupo
+        if not self._cupos.acquire(blocking=False):
+            self._sumar('descartadas')
+            return False
+
+        try:
+            self._obtener_executor().submit(self._guardar, list(registro_ids), imagen_base64)
+        except RuntimeError:
+            # El executor ya se cerró (apagado del proceso)
+            self._cupos.release()
+            self._sumar('descartadas')
+            return False
+
+        self._sumar('encoladas')
+        return True
+
+    def _guardar(self, registro_ids, imagen_base64):
+        from ..models import RegistroAcceso
+
+        try:
+            campo = RegistroAcceso._meta.get_field('imagen_captura')
+            imagen = decodificar_imagen_base64(imagen_base64)
+            nombre = campo.storage.save(campo.generate_filename(None, imagen.name), imagen)
+            RegistroAcceso.objects.filter(id__in=registro_ids).update(imagen_captura=nombre)
+            self._sumar('guardadas')
+        except Exception:
+            logger.exception("Error guardando la captura de los registros %s", registro_ids)
+            self._sumar('errores')
+        finally:
+            self._cupos.release()
+            # Cada hilo abre su propia conexión: cerrarla para no dejarla colgada
+            connections.close_all()
+
+    def estadisticas(self):
+        """Contadores de la cola de capturas"""
+        with self._lock:
+            datos = dict(self._contadores)
+        datos['pendientes'] = datos['encoladas'] - datos['guardadas'] - datos['errores']
+        datos['max_pendientes'] = self.max_pendientes
+        return datos
+
+    def cerrar(self, esperar=True):
+        """Vaciar la cola pendiente (al apagar el proceso)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=esperar)
+
+
+# Instancia global del servicio
+guardado_capturas = GuardadoCapturasService()
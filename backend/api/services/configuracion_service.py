@@ -0,0 +1,95 @@
+import time
+from dataclasses import dataclass, field, fields
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+@dataclass(frozen=True)
+class ConfiguracionRuntime:
+    """Instantánea tipada de ConfiguracionReconocimiento.
+
+    Cada atributo se lee de la fila con el mismo `nombre`; si falta o no se
+    puede convertir al tipo del atributo se usa el valor por defecto.
+    """
+
+    umbral_confianza: float = 0.7
+    top_k: int = 5
+    indice_tipo: str = 'exacto'
+    indice_umbral_exacto: int = 10000
+    indice_ivf_listas: int = 0
+    indice_ivf_sondas: int = 8
+    valores: dict = field(default_factory=dict, compare=False)
+
+    @classmethod
+    def desde_valores(cls, valores):
+        """Construir la instantánea a partir de un dict nombre -> valor (texto)"""
+        tipados = {}
+        for campo in fields(cls):
+            if campo.name == 'valores' or campo.name not in valores:
+                continue
+            try:
+                tipados[campo.name] = campo.type(valores[campo.name])
+            except (TypeError, ValueError):
+                continue
+        return cls(valores=dict(valores), **tipados)
+
+    @property
+    def opciones_indice(self):
+        return {
+            'tipo': self.indice_tipo,
+            'umbral_exacto': self.indice_umbral_exacto,
+            'n_listas': self.indice_ivf_listas,
+            'n_sondas': self.indice_ivf_sondas,
+        }
+
+
+class ConfiguracionService:
+    """Configuración de reconocimiento cargada una vez por proceso.
+
+    La instantánea se recarga (una consulta) cuando cambia el sello de
+    versión compartido en la cache o cuando pasan CONFIGURACION_CACHE_TTL
+    segundos; esto último cubre a los workers que no ven el sello (cache
+    local al proceso). En el camino caliente no hay consultas.
+    """
+
+    version_key = "configuracion_reconocimiento_version"
+
+    def __init__(self):
+        self.ttl = getattr(settings, 'CONFIGURACION_CACHE_TTL', 60)
+        self._configuracion = None
+        self._version = None
+        self._cargada_en = None
+
+    def _version_compartida(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, 0, None)
+            version = cache.get(self.version_key, 0)
+        return version
+
+    def obtener(self):
+        """Devolver la instantánea vigente, recargándola si la versión cambió o venció"""
+        version = self._version_compartida()
+        ahora = time.monotonic()
+        if self._configuracion is None or version != self._version or ahora - self._cargada_en >= self.ttl:
+            from ..models import ConfiguracionReconocimiento
+
+            valores = dict(ConfiguracionReconocimiento.objects.values_list('nombre', 'valor'))
+            self._configuracion = ConfiguracionRuntime.desde_valores(valores)
+            self._version = version
+            self._cargada_en = ahora
+        return self._configuracion
+
+    def invalidar(self):
+        """Avisar a todos los procesos que deben recargar la configuración"""
+        self._version_compartida()
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, 0, None)
+            cache.incr(self.version_key)
+
+
+# Instancia global del servicio
+configuracion_service = ConfiguracionService()
@@ -1,110 +1,427 @@
+import copy
 import json
+import threading
+import time
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from django.conf import settings
 from django.core.cache import cache
-from ..models import RostroUsuario
+from ..models import RostroUsuario, embedding_desde_bytes
+from .configuracion_service import configuracion_service
+from .indices_rostros import IndiceExacto, construir_indice
+
+
+class GaleriaRostros:
+    """Galería de rostros activos como una sola matriz float32 normalizada.
+
+    La fila i de `matriz` corresponde a `rostro_ids[i]`, `usuario_ids[i]` y
+    `nombres[i]`; las búsquedas se delegan en `indice` (exacto por defecto).
+
+    Los cambios incrementales no reconstruyen el índice: las filas dadas de baja
+    se marcan en `activos` y los rostros nuevos o modificados quedan en
+    `pendientes`, que se comparan de forma exacta junto al índice. Cuando los
+    cambios acumulados superan `UMBRAL_COMPACTACION` la galería se compacta.
+
+    El servicio no modifica la galería que ya entregó: aplica los cambios sobre
+    una `copia()` y reemplaza la referencia, así las búsquedas no necesitan lock.
+    """
+
+    UMBRAL_COMPACTACION = 0.05
+    MINIMO_COMPACTACION = 64
+
+    def __init__(self, matriz, rostro_ids, usuario_ids, nombres):
+        self.matriz = matriz
+        self.rostro_ids = rostro_ids
+        self.usuario_ids = usuario_ids
+        self.nombres = nombres
+        self.activos = np.ones(len(rostro_ids), dtype=bool)
+        self.posiciones = {int(rostro_id): fila for fila, rostro_id in enumerate(rostro_ids)}
+        self.pendientes = {}  # rostro_id -> (usuario_id, nombre, vector)
+        self._matriz_pendientes = None
+        self.opciones = {}
+        self.indice = IndiceExacto(matriz)
+
+    def __len__(self):
+        return int(self.activos.sum()) + len(self.pendientes)
+
+    @property
+    def dimension(self):
+        if len(self.rostro_ids):
+            return self.matriz.shape[1]
+        for _, _, vector in self.pendientes.values():
+            return vector.shape[0]
+        return 0
+
+    def indexar(self, **opciones):
+        """Reemplazar el índice de búsqueda según la configuración recibida"""
+        self.opciones = opciones
+        if len(self.rostro_ids):
+            self.indice = construir_indice(self.matriz, **opciones)
+        return self
+
+    def copia(self):
+        """Copia que comparte la matriz y el índice (solo lectura) y duplica lo que cambian los deltas"""
+        galeria = copy.copy(self)
+        galeria.activos = self.activos.copy()
+        galeria.pendientes = dict(self.pendientes)
+        return galeria
+
+    def guardar(self, rostro_id, usuario_id, nombre, embedding):
+        """Agregar o actualizar un rostro sin reconstruir el índice"""
+        vector = normalizar_embedding(embedding)
+        dimension = self.dimension
+        if vector is None or (dimension and vector.shape[0] != dimension):
+            self.eliminar(rostro_id)
+            return
+
+        self._desactivar(rostro_id)
+        self.pendientes[rostro_id] = (usuario_id, nombre, vector)
+        self._matriz_pendientes = None
+        self._compactar_si_corresponde()
+
+    def eliminar(self, rostro_id):
+        """Quitar un rostro de la galería (baja, desactivación o borrado)"""
+        self._desactivar(rostro_id)
+        if self.pendientes.pop(rostro_id, None) is not None:
+            self._matriz_pendientes = None
+        self._compactar_si_corresponde()
+
+    def _desactivar(self, rostro_id):
+        fila = self.posiciones.get(rostro_id)
+        if fila is not None:
+            self.activos[fila] = False
+
+    def _compactar_si_corresponde(self):
+        cambios = len(self.activos) - int(self.activos.sum()) + len(self.pendientes)
+        limite = max(self.MINIMO_COMPACTACION, self.UMBRAL_COMPACTACION * len(self.rostro_ids))
+        if cambios > limite:
+            self.compactar()
+
+    def compactar_con(self, **opciones):
+        """Compactar reconstruyendo el índice con otra configuración"""
+        self.opciones = opciones
+        self.compactar()
+
+    def compactar(self):
+        """Incorporar los pendientes a la matriz base y reconstruir el índice"""
+        filas = [
+            (int(self.rostro_ids[fila]), int(self.usuario_ids[fila]), self.nombres[fila], self.matriz[fila])
+            for fila in np.flatnonzero(self.activos)
+        ]
+        filas.extend(
+            (rostro_id, usuario_id, nombre, vector)
+            for rostro_id, (usuario_id, nombre, vector) in self.pendientes.items()
+        )
+        nueva = GaleriaRostros.desde_filas(filas).indexar(**self.opciones)
+        self.__dict__.update(nueva.__dict__)
+
+    def buscar(self, sonda, k=1):
+        """Devolver hasta k candidatos (rostro_id, usuario_id, nombre, similitud) de mayor a menor"""
+        return self.buscar_lote(sonda.reshape(1, -1), k=k)[0]
+
+    def buscar_lote(self, sondas, k=1):
+        """Buscar una matriz de sondas (una por fila); devuelve una lista de candidatos por sonda"""
+        candidatos = [[] for _ in range(len(sondas))]
+
+        if len(self.rostro_ids):
+            activos = None if self.activos.all() else self.activos
+            resultados = self.indice.buscar_lote(sondas, k=k, activos=activos)
+            for lista, (filas, similitudes) in zip(candidatos, resultados):
+                lista.extend(
+                    (int(self.rostro_ids[fila]), int(self.usuario_ids[fila]), self.nombres[fila], float(similitud))
+                    for fila, similitud in zip(filas, similitudes)
+                )
+
+        if self.pendientes:
+            if self._matriz_pendientes is None:
+                self._matriz_pendientes = np.vstack([vector for _, _, vector in self.pendientes.values()])
+            similitudes = self._matriz_pendientes @ sondas.T
+            for lista, columna in zip(candidatos, similitudes.T):
+                lista.extend(
+                    (rostro_id, usuario_id, nombre, float(similitud))
+                    for (rostro_id, (usuario_id, nombre, _)), similitud in zip(self.pendientes.items(), columna)
+                )
+
+        for lista in candidatos:
+            lista.sort(key=lambda candidato: candidato[3], reverse=True)
+            del lista[k:]
+        return candidatos
+
+    @classmethod
+    def vacia(cls):
+        return cls(
+            np.empty((0, 0), dtype=np.float32),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            [],
+        )
+
+    @classmethod
+    def desde_filas(cls, filas):
+        """Construir la galería a partir de tuplas (rostro_id, usuario_id, nombre, embedding)"""
+        vectores = []
+        rostro_ids = []
+        usuario_ids = []
+        nombres = []
+        dimension = None
+
+        for rostro_id, usuario_id, nombre, embedding in filas:
+            vector = normalizar_embedding(embedding)
+            if vector is None:
+                continue
+            # Descartar vectores con una dimensión distinta a la del primero
+            if dimension is None:
+                dimension = vector.shape[0]
+            elif vector.shape[0] != dimension:
+                continue
+            vectores.append(vector)
+            rostro_ids.append(rostro_id)
+            usuario_ids.append(usuario_id)
+            nombres.append(nombre)
+
+        if not vectores:
+            return cls.vacia()
+
+        return cls(
+            np.vstack(vectores),
+            np.asarray(rostro_ids, dtype=np.int64),
+            np.asarray(usuario_ids, dtype=np.int64),
+            nombres,
+        )
+
+
+def normalizar_embedding(embedding):
+    """Convertir un embedding (binario, JSON, lista o array) a vector float32 de norma 1"""
+    try:
+        if isinstance(embedding, (bytes, bytearray, memoryview)):
+            embedding = embedding_desde_bytes(embedding)
+        elif isinstance(embedding, str):
+            embedding = json.loads(embedding)
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    except (TypeError, ValueError):
+        return None
+
+    norma = np.linalg.norm(vector)
+    if vector.size == 0 or not np.isfinite(norma) or norma == 0:
+        return None
+    return vector / norma
+
 
 class FacialRecognitionService:
     def __init__(self):
-        self.umbral_confianza = 0.7  # Umbral mínimo para considerar una coincidencia
-        
+        # Versión compartida de la galería y log de cambios para los demás procesos
+        self.version_key = "rostros_galeria_version"
+        self.delta_key = "rostros_galeria_delta_{}"
+        self.delta_ttl = 3600
+        self.max_deltas = 500
+        # Recarga completa periódica: cubre los avisos que no llegan (cache
+        # local de otro worker, delta vencido o perdido)
+        self.recarga_seg = getattr(settings, 'GALERIA_RECARGA_SEG', 300)
+        self._galeria = None
+        self._version = None
+        self._cargada_en = None
+        self._lock = threading.Lock()
+
     def calcular_similitud(self, embedding1, embedding2):
         """Calcular similitud coseno entre dos embeddings"""
+        emb1 = normalizar_embedding(embedding1)
+        emb2 = normalizar_embedding(embedding2)
+        if emb1 is None or emb2 is None or emb1.shape != emb2.shape:
+            return 0.0
+
+        similitud = float(np.dot(emb1, emb2))
+        return max(0.0, min(1.0, similitud))
+
+    def cargar_galeria(self, chunk_size=2000):
+        """Construir la galería de rostros activos con una sola consulta en streaming.
+
+        Se leen tuplas con `values_list` (sin instanciar modelos) y el nombre
+        del usuario llega en el mismo JOIN, sin una consulta extra por rostro.
+        """
+        filas = (
+            RostroUsuario.objects.filter(esta_activo=True)
+            .values_list('id', 'usuario_id', 'usuario__first_name', 'usuario__last_name', 'embedding')
+            .iterator(chunk_size=chunk_size)
+        )
+        return GaleriaRostros.desde_filas(
+            (rostro_id, usuario_id, f"{nombre} {apellido}".strip(), embedding)
+            for rostro_id, usuario_id, nombre, apellido, embedding in filas
+        )
+
+    @property
+    def umbral_confianza(self):
+        """Umbral mínimo para considerar una coincidencia"""
+        return configuracion_service.obtener().umbral_confianza
+
+    def _version_compartida(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, 0, None)
+            version = cache.get(self.version_key, 0)
+        return version
+
+    def publicar_cambio(self, delta=None):
+        """Registrar un cambio de la galería para todos los procesos.
+
+        `delta` es ('guardar', rostro_id, usuario_id, nombre, embedding) o
+        ('eliminar', rostro_id). Sin delta, los procesos recargan la galería
+        completa (útil tras QuerySet.update, que no emite señales).
+        """
+        self._version_compartida()
         try:
-            # Convertir strings JSON a arrays numpy
-            if isinstance(embedding1, str):
-                emb1 = np.array(json.loads(embedding1)).reshape(1, -1)
-            else:
-                emb1 = np.array(embedding1).reshape(1, -1)
-                
-            if isinstance(embedding2, str):
-                emb2 = np.array(json.loads(embedding2)).reshape(1, -1)
+            version = cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, 0, None)
+            version = cache.incr(self.version_key)
+        if delta is not None:
+            cache.set(self.delta_key.format(version), delta, self.delta_ttl)
+
+    def _aplicar_deltas(self, version):
+        """Copia de la galería local llevada a `version` con el log de cambios; None si hay huecos"""
+        if self._version is None or version < self._version or version - self._version > self.max_deltas:
+            return None
+
+        claves = [self.delta_key.format(v) for v in range(self._version + 1, version + 1)]
+        deltas = cache.get_many(claves)
+        if len(deltas) != len(claves):
+            return None
+
+        galeria = self._galeria.copia()
+        for clave in claves:
+            operacion, rostro_id, *datos = deltas[clave]
+            if operacion == 'guardar':
+                galeria.guardar(rostro_id, *datos)
             else:
-                emb2 = np.array(embedding2).reshape(1, -1)
-            
-            # Calcular similitud coseno
-            similitud = cosine_similarity(emb1, emb2)[0][0]
-            return max(0.0, min(1.0, similitud))
-            
-        except Exception as e:
-            print(f"Error calculando similitud: {e}")
-            return 0.0
+                galeria.eliminar(rostro_id)
+        return galeria
+
+    def _vencida(self):
+        return self._galeria is None or time.monotonic() - self._cargada_en >= self.recarga_seg
+
+    def obtener_galeria(self):
+        """Obtener la galería local, sincronizada con la versión compartida en la cache.
+
+        Los cambios llegan como deltas de la cache; además la galería se
+        recarga entera cada GALERIA_RECARGA_SEG segundos. El lock solo cubre
+        la actualización: la galería devuelta no se modifica después y se
+        puede buscar en ella sin tomarlo.
+        """
+        version = self._version_compartida()
+        opciones = configuracion_service.obtener().opciones_indice
+        galeria = self._galeria
+        if not self._vencida() and version == self._version and galeria.opciones == opciones:
+            return galeria
 
-    def reconocer_rostro(self, embedding_entrante):
+        with self._lock:
+            galeria = self._galeria
+            vencida = self._vencida()
+            if vencida or version != self._version:
+                galeria = None if vencida else self._aplicar_deltas(version)
+                if galeria is None:
+                    # La versión se lee antes de consultar la base: los cambios
+                    # posteriores se vuelven a aplicar y son idempotentes
+                    galeria = self.cargar_galeria().indexar(**opciones)
+                    self._cargada_en = time.monotonic()
+                self._version = version
+            if galeria.opciones != opciones:
+                galeria = galeria.copia()
+                galeria.compactar_con(**opciones)
+            self._galeria = galeria
+            return galeria
+
+    def reconocer_rostro(self, embedding_entrante, umbral=None, top_k=1):
         """Reconocer un rostro comparándolo con todos los rostros registrados"""
+        return self.reconocer_rostros([embedding_entrante], umbral=umbral, top_k=top_k)[0]
+
+    def reconocer_rostros(self, embeddings, umbral=None, top_k=1):
+        """Reconocer varios rostros (p. ej. de un mismo cuadro) con un solo producto matriz-matriz.
+
+        Devuelve un resultado por embedding, en el mismo orden y con el mismo
+        formato que `reconocer_rostro`. `candidatos` lista, de mayor a menor,
+        hasta `top_k` rostros que alcanzan el umbral; el primero es el reconocido.
+        """
+        if umbral is None:
+            umbral = self.umbral_confianza
+        resultados = [self._no_reconocido() for _ in embeddings]
+
         try:
-            # Obtener todos los rostros activos de la cache o de la base de datos
-            cache_key = "rostros_activos_embeddings"
-            rostros_data = cache.get(cache_key)
-            
-            if rostros_data is None:
-                rostros_activos = RostroUsuario.objects.filter(esta_activo=True)
-                rostros_data = []
-                for rostro in rostros_activos:
-                    try:
-                        embedding = json.loads(rostro.embedding)
-                        rostros_data.append({
-                            'usuario_id': rostro.usuario.id,
-                            'usuario_nombre': rostro.usuario.get_full_name(),
-                            'embedding': embedding,
-                            'rostro_id': rostro.id
-                        })
-                    except json.JSONDecodeError:
-                        continue
-                
-                # Cachear por 5 minutos
-                cache.set(cache_key, rostros_data, 300)
-            
-            mejor_confianza = 0.0
-            usuario_reconocido = None
-            rostro_reconocido_id = None
-            
-            for rostro_data in rostros_data:
-                confianza = self.calcular_similitud(embedding_entrante, rostro_data['embedding'])
-                
-                if confianza > mejor_confianza and confianza >= self.umbral_confianza:
-                    mejor_confianza = confianza
-                    usuario_reconocido = {
-                        'id': rostro_data['usuario_id'],
-                        'nombre': rostro_data['usuario_nombre']
+            sondas = [normalizar_embedding(embedding) for embedding in embeddings]
+
+            # Sin lock: la galería obtenida no cambia mientras se busca
+            galeria = self.obtener_galeria()
+            validas = [
+                i for i, sonda in enumerate(sondas)
+                if sonda is not None and len(galeria) and sonda.shape[0] == galeria.dimension
+            ]
+            if not validas:
+                return resultados
+            candidatos = galeria.buscar_lote(np.vstack([sondas[i] for i in validas]), k=max(1, top_k))
+
+            for i, lista in zip(validas, candidatos):
+                resultados[i]['candidatos'] = [
+                    {
+                        'usuario': {'id': usuario_id, 'nombre': nombre},
+                        'confianza': max(0.0, min(1.0, similitud)),
+                        'rostro_id': rostro_id
                     }
-                    rostro_reconocido_id = rostro_data['rostro_id']
-            
-            return {
-                'reconocido': usuario_reconocido is not None,
-                'usuario': usuario_reconocido,
-                'confianza': mejor_confianza,
-                'rostro_id': rostro_reconocido_id
-            }
-            
+                    for rostro_id, usuario_id, nombre, similitud in lista[:top_k]
+                    if max(0.0, min(1.0, similitud)) >= umbral
+                ]
+                if not lista:
+                    continue
+
+                rostro_id, usuario_id, nombre, similitud = lista[0]
+                confianza = max(0.0, min(1.0, similitud))
+
+                if confianza < umbral:
+                    continue
+
+                resultados[i].update({
+                    'reconocido': True,
+                    'usuario': {
+                        'id': usuario_id,
+                        'nombre': nombre
+                    },
+                    'confianza': confianza,
+                    'rostro_id': rostro_id
+                })
+
         except Exception as e:
             print(f"Error en reconocimiento facial: {e}")
-            return {
-                'reconocido': False,
-                'usuario': None,
-                'confianza': 0.0,
-                'rostro_id': None
-            }
+            return [self._no_reconocido() for _ in embeddings]
+
+        return resultados
+
+    @staticmethod
+    def _no_reconocido():
+        return {
+            'reconocido': False,
+            'usuario': None,
+            'confianza': 0.0,
+            'rostro_id': None,
+            'candidatos': []
+        }
 
     def determinar_tipo_acceso(self, usuario_id):
-        """Determinar si es entrada o salida basado en el último acceso"""
+        """Determinar si es entrada o salida según la presencia actual del usuario"""
+        return self.determinar_tipos_acceso([usuario_id]).get(usuario_id, 'entrada')
+
+    def determinar_tipos_acceso(self, usuario_ids):
+        """Tipo de acceso (entrada/salida) para varios usuarios con una búsqueda por clave primaria"""
         try:
-            from ..models import RegistroAcceso
-            
-            # Obtener el último acceso del usuario
-            ultimo_acceso = RegistroAcceso.objects.filter(
-                usuario_id=usuario_id
-            ).order_by('-timestamp').first()
-            
-            if not ultimo_acceso:
-                return 'entrada'  # Si no hay registros previos, es una entrada
-            
-            # Si el último acceso fue una entrada, entonces ahora es salida, y viceversa
-            return 'salida' if ultimo_acceso.tipo_acceso == 'entrada' else 'entrada'
-            
+            from ..models import PresenciaUsuario
+
+            dentro = dict(
+                PresenciaUsuario.objects.filter(usuario_id__in=set(usuario_ids)).values_list('usuario_id', 'dentro')
+            )
+            # Quien está dentro sale; quien está fuera o no tiene registros previos entra
+            return {
+                usuario_id: 'salida' if dentro.get(usuario_id) else 'entrada'
+                for usuario_id in usuario_ids
+            }
+
         except Exception as e:
             print(f"Error determinando tipo de acceso: {e}")
-            return 'entrada'  # Por defecto asumir entrada
+            return {usuario_id: 'entrada' for usuario_id in usuario_ids}  # Por defecto asumir entrada
 
 # Instancia global del servicio
-facial_service = FacialRecognitionService()
\ No newline at end of file
+facial_service = FacialRecognitionService()
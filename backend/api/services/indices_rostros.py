@@ -0,0 +1,137 @@
+import numpy as np
+
+
+def _descartar_inactivos(similitudes, activos):
+    """Excluir de la búsqueda las filas marcadas como inactivas"""
+    if activos is None:
+        return similitudes
+    return np.where(activos, similitudes, -np.inf)
+
+
+def _top_k(similitudes, k):
+    """Posiciones de los k valores más altos, ordenadas de mayor a menor"""
+    k = min(k, len(similitudes))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(similitudes):
+        candidatos = np.argpartition(-similitudes, k - 1)[:k]
+    else:
+        candidatos = np.arange(len(similitudes))
+    candidatos = candidatos[np.argsort(-similitudes[candidatos], kind='stable')]
+    return candidatos[np.isfinite(similitudes[candidatos])]
+
+
+class IndiceExacto:
+    """Búsqueda exhaustiva: un producto matriz-vector contra toda la galería"""
+
+    nombre = 'exacto'
+
+    def __init__(self, matriz, **opciones):
+        self.matriz = matriz
+
+    def __len__(self):
+        return len(self.matriz)
+
+    def buscar(self, sonda, k=1, activos=None):
+        """Devolver (filas, similitudes) de los k rostros más parecidos a la sonda"""
+        similitudes = _descartar_inactivos(self.matriz @ sonda, activos)
+        filas = _top_k(similitudes, k)
+        return filas, similitudes[filas]
+
+    def buscar_lote(self, sondas, k=1, activos=None):
+        """Buscar varias sondas con un solo producto matriz-matriz"""
+        similitudes = self.matriz @ sondas.T
+        if activos is not None:
+            similitudes = np.where(activos[:, None], similitudes, -np.inf)
+        resultados = []
+        for columna in similitudes.T:
+            filas = _top_k(columna, k)
+            resultados.append((filas, columna[filas]))
+        return resultados
+
+
+class IndiceIVF:
+    """Índice de archivo invertido (IVF) con cuantizador grueso k-means esférico.
+
+    Las filas se agrupan en `n_listas` celdas alrededor de centroides; cada
+    búsqueda compara la sonda solo con las `n_sondas` celdas más cercanas.
+    Más sondas dan más recall a cambio de más latencia.
+    """
+
+    nombre = 'ivf'
+
+    def __init__(self, matriz, n_listas=0, n_sondas=8, iteraciones=10, semilla=0, **opciones):
+        total = len(matriz)
+        if n_listas <= 0:
+            n_listas = int(np.sqrt(total))
+        n_listas = max(1, min(n_listas, total))
+
+        centroides, asignacion = self._entrenar(matriz, n_listas, iteraciones, semilla)
+
+        # Reordenar la matriz por celda para que cada lista sea un bloque contiguo
+        orden = np.argsort(asignacion, kind='stable')
+        self.filas = orden
+        self.matriz = np.ascontiguousarray(matriz[orden])
+        self.limites = np.searchsorted(asignacion[orden], np.arange(n_listas + 1))
+        self.centroides = centroides
+        self.n_sondas = max(1, min(n_sondas, n_listas))
+
+    def __len__(self):
+        return len(self.filas)
+
+    @staticmethod
+    def _asignar(matriz, centroides, bloque=8192):
+        asignacion = np.empty(len(matriz), dtype=np.int64)
+        for inicio in range(0, len(matriz), bloque):
+            fin = inicio + bloque
+            asignacion[inicio:fin] = np.argmax(matriz[inicio:fin] @ centroides.T, axis=1)
+        return asignacion
+
+    @classmethod
+    def _entrenar(cls, matriz, n_listas, iteraciones, semilla):
+        rng = np.random.default_rng(semilla)
+        centroides = matriz[rng.choice(len(matriz), n_listas, replace=False)].copy()
+
+        for _ in range(iteraciones):
+            asignacion = cls._asignar(matriz, centroides)
+            orden = np.argsort(asignacion, kind='stable')
+            celdas, inicios = np.unique(asignacion[orden], return_index=True)
+            sumas = np.add.reduceat(matriz[orden], inicios, axis=0)
+            normas = np.linalg.norm(sumas, axis=1, keepdims=True)
+            # Las celdas que quedan vacías conservan su centroide anterior
+            centroides[celdas] = sumas / np.maximum(normas, 1e-12)
+
+        return centroides, cls._asignar(matriz, centroides)
+
+    def buscar(self, sonda, k=1, activos=None):
+        """Devolver (filas, similitudes) de los k rostros más parecidos entre las celdas sondeadas"""
+        listas = _top_k(self.centroides @ sonda, self.n_sondas)
+        bloques = [np.arange(self.limites[l], self.limites[l + 1]) for l in listas]
+        posiciones = np.concatenate(bloques) if bloques else np.empty(0, dtype=np.int64)
+
+        similitudes = np.concatenate([
+            self.matriz[self.limites[l]:self.limites[l + 1]] @ sonda for l in listas
+        ]) if len(posiciones) else np.empty(0, dtype=np.float32)
+        if activos is not None:
+            similitudes = _descartar_inactivos(similitudes, activos[self.filas[posiciones]])
+
+        mejores = _top_k(similitudes, k)
+        return self.filas[posiciones[mejores]], similitudes[mejores]
+
+    def buscar_lote(self, sondas, k=1, activos=None):
+        """Cada sonda visita celdas distintas, así que se buscan por separado"""
+        return [self.buscar(sonda, k=k, activos=activos) for sonda in sondas]
+
+
+INDICES = {
+    IndiceExacto.nombre: IndiceExacto,
+    IndiceIVF.nombre: IndiceIVF,
+}
+
+
+def construir_indice(matriz, tipo='exacto', umbral_exacto=10000, **opciones):
+    """Construir el índice configurado; por debajo de `umbral_exacto` filas se usa búsqueda exacta"""
+    clase = INDICES.get(tipo, IndiceExacto)
+    if len(matriz) < umbral_exacto:
+        clase = IndiceExacto
+    return clase(matriz, **opciones)
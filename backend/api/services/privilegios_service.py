@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_compartida import cache_compartida
+
+
+class PrivilegiosService:
+    """Códigos de privilegio de cada rol, resueltos una vez por proceso.
+
+    Cada rol se guarda como frozenset en una LRU local acotada; un sello de
+    versión compartido en la cache invalida todas las LRU cuando cambia un
+    Rol, Privilegio o RolPrivilegio. Con la cache caliente comprobar un
+    privilegio es una prueba de pertenencia, sin consultas.
+
+    El sello solo llega a los demás workers si la cache es compartida
+    (Redis): sin ella no se guarda nada entre llamadas y cada comprobación
+    consulta la BD. Cada entrada vence además a los PRIVILEGIOS_CACHE_TTL
+    segundos, por si un aviso se pierde (p. ej. Redis reiniciado).
+
+    Para los claims del JWT cada privilegio se representa con el bit de su id:
+    el mapa de bits de un rol es un entero en hexadecimal.
+    """
+
+    version_key = "privilegios_roles_version"
+
+    def __init__(self, max_roles=None):
+        self.max_roles = max_roles or getattr(settings, 'PRIVILEGIOS_CACHE_ROLES', 256)
+        self.ttl = getattr(settings, 'PRIVILEGIOS_CACHE_TTL', 60)
+        self._roles = OrderedDict()  # rol_id -> (códigos, cargado_en)
+        self._bits = None  # (bits, cargado_en)
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _version_compartida(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, 0, None)
+            version = cache.get(self.version_key, 0)
+        return version
+
+    def version(self):
+        """Sello de versión vigente (viaja en el claim `rol_v` del JWT)"""
+        return self._version_compartida()
+
+    def _sincronizar(self, version):
+        # Llamar con self._lock tomado
+        if version != self._version:
+            self._roles.clear()
+            self._bits = None
+            self._version = version
+
+    def _vigente(self, entrada, ahora):
+        return entrada is not None and ahora - entrada[1] < self.ttl
+
+    def _consultar_codigos(self, rol_id):
+        from ..models import RolPrivilegio
+
+        return frozenset(
+            RolPrivilegio.objects.filter(rol_id=rol_id).values_list('privilegio__codigo', flat=True)
+        )
+
+    def codigos_de_rol(self, rol_id):
+        """frozenset con los códigos de privilegio del rol (vacío si no hay rol)"""
+        if rol_id is None:
+            return frozenset()
+        if not cache_compartida():
+            return self._consultar_codigos(rol_id)
+
+        version = self._version_compartida()
+        ahora = time.monotonic()
+        with self._lock:
+            self._sincronizar(version)
+            entrada = self._roles.get(rol_id)
+            if self._vigente(entrada, ahora):
+                self._roles.move_to_end(rol_id)
+                return entrada[0]
+
+        codigos = self._consultar_codigos(rol_id)
+        with self._lock:
+            # Si la versión cambió mientras se consultaba, no guardar un valor viejo
+            if version == self._version:
+                self._roles[rol_id] = (codigos, ahora)
+                self._roles.move_to_end(rol_id)
+                while len(self._roles) > self.max_roles:
+                    self._roles.popitem(last=False)
+        return codigos
+
+    def tiene_privilegio(self, usuario, codigo):
+        return codigo in self.codigos_de_rol(getattr(usuario, 'rol_id', None))
+
+    def bits(self):
+        """dict código -> posición de bit (el id del Privilegio)"""
+        from ..models import Privilegio
+
+        if not cache_compartida():
+            return dict(Privilegio.objects.values_list('codigo', 'id'))
+
+        version = self._version_compartida()
+        ahora = time.monotonic()
+        with self._lock:
+            self._sincronizar(version)
+            if self._vigente(self._bits, ahora):
+                return self._bits[0]
+
+        bits = dict(Privilegio.objects.values_list('codigo', 'id'))
+        with self._lock:
+            if version == self._version:
+                self._bits = (bits, ahora)
+        return bits
+
+    def mapa_de_bits(self, rol_id):
+        """Privilegios del rol como entero hexadecimal compacto"""
+        bits = self.bits()
+        mapa = 0
+        for codigo in self.codigos_de_rol(rol_id):
+            if codigo in bits:
+                mapa |= 1 << bits[codigo]
+        return format(mapa, 'x')
+
+    def mapa_incluye(self, mapa, codigo):
+        bit = self.bits().get(codigo)
+        if bit is None:
+            return False
+        return bool(int(mapa, 16) >> bit & 1)
+
+    def invalidar(self):
+        """Avisar a todos los procesos que deben volver a resolver los privilegios"""
+        self._version_compartida()
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, 0, None)
+            cache.incr(self.version_key)
+
+
+# Instancia global del servicio
+privilegios_service = PrivilegiosService()
@@ -0,0 +1,105 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import ConfiguracionReconocimiento, Privilegio, Rol, RolPrivilegio, RostroUsuario, User
+from .services.configuracion_service import configuracion_service
+from .services.facial_recognition_service import facial_service
+from .services.privilegios_service import privilegios_service
+from .tokens import invalidar_usuario
+
+# Campos cuyo cambio altera la galería de reconocimiento facial
+CAMPOS_GALERIA = {'embedding', 'esta_activo', 'usuario'}
+CAMPOS_NOMBRE = {'first_name', 'last_name'}
+
+
+def _publicar(delta):
+    # Solo tras el commit, para que los demás procesos no vean cambios revertidos
+    transaction.on_commit(lambda: facial_service.publicar_cambio(delta))
+
+
+def _delta_rostro(rostro):
+    if not rostro.esta_activo:
+        return ('eliminar', rostro.id)
+    return (
+        'guardar',
+        rostro.id,
+        rostro.usuario_id,
+        rostro.usuario.get_full_name(),
+        bytes(rostro.embedding),
+    )
+
+
+@receiver(post_save, sender=RostroUsuario)
+def rostro_guardado(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # actualizar_estadisticas guarda solo contadores: no afecta a la galería
+    if update_fields is not None and not CAMPOS_GALERIA & set(update_fields):
+        return
+    _publicar(_delta_rostro(instance))
+
+
+@receiver(post_delete, sender=RostroUsuario)
+def rostro_eliminado(sender, instance, **kwargs):
+    _publicar(('eliminar', instance.id))
+
+
+@receiver(post_save, sender=User)
+def usuario_guardado(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    """Propagar cambios de nombre al resultado del reconocimiento"""
+    if raw or created:
+        return
+    if update_fields is not None and not CAMPOS_NOMBRE & set(update_fields):
+        return
+    rostro = RostroUsuario.objects.filter(usuario=instance, esta_activo=True).first()
+    if rostro is not None:
+        rostro.usuario = instance
+        _publicar(_delta_rostro(rostro))
+
+
+@receiver(post_save, sender=ConfiguracionReconocimiento)
+@receiver(post_delete, sender=ConfiguracionReconocimiento)
+def configuracion_modificada(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    transaction.on_commit(configuracion_service.invalidar)
+
+
+@receiver(post_save, sender=Rol)
+@receiver(post_delete, sender=Rol)
+@receiver(post_save, sender=Privilegio)
+@receiver(post_delete, sender=Privilegio)
+@receiver(post_save, sender=RolPrivilegio)
+@receiver(post_delete, sender=RolPrivilegio)
+def privilegios_modificados(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    transaction.on_commit(privilegios_service.invalidar)
+
+
+@receiver(post_init, sender=User)
+def usuario_cargado(sender, instance, **kwargs):
+    instance._rol_id_original = instance.__dict__.get('rol_id')
+
+
+@receiver(post_save, sender=User)
+def usuario_cambio_rol(sender, instance, raw=False, created=False, **kwargs):
+    """Un cambio de rol deja viejos los claims de privilegios de sus tokens"""
+    if raw or created:
+        return
+    if instance.rol_id != getattr(instance, '_rol_id_original', instance.rol_id):
+        instance._rol_id_original = instance.rol_id
+        transaction.on_commit(privilegios_service.invalidar)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def usuario_modificado(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    """Cualquier cambio del User (is_active, is_staff, rol, ...) deja viejos los claims de sus tokens"""
+    if raw or created:
+        return
+    # El login solo toca last_login
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(lambda: invalidar_usuario(instance.pk))
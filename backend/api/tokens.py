@@ -0,0 +1,142 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .services.cache_compartida import cache_compartida
+from .services.privilegios_service import privilegios_service
+
+
+def privilegios_en_token():
+    return getattr(settings, 'JWT_PRIVILEGIOS_EN_TOKEN', False)
+
+
+def usuario_en_token():
+    return getattr(settings, 'JWT_USUARIO_EN_TOKEN', False)
+
+
+def _usuario_version_key(user_id):
+    return f"usuario_token_version:{user_id}"
+
+
+def version_usuario(user_id):
+    """Sello de versión del usuario en la cache compartida (claim `usr_v`)"""
+    clave = _usuario_version_key(user_id)
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, 0, None)
+        version = cache.get(clave, 0)
+    return version
+
+
+def invalidar_usuario(user_id):
+    """Dejar viejos los claims de usuario de todos los tokens emitidos a `user_id`"""
+    clave = _usuario_version_key(user_id)
+    version_usuario(user_id)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, 0, None)
+        cache.incr(clave)
+
+
+def claims_usuario_vigentes(token):
+    """
+    True si los claims de usuario del token siguen valiendo: su `usr_v` es el
+    sello actual del usuario en la cache compartida. Guardar o borrar el User
+    (p. ej. desactivarlo) sube el sello y el token vuelve a cargar el User.
+    Sin cache compartida nunca: un worker no ve los cambios hechos en otro.
+    """
+    if not cache_compartida() or 'usr_v' not in token:
+        return False
+    try:
+        return token['usr_v'] == version_usuario(token[api_settings.USER_ID_CLAIM])
+    except KeyError:
+        return False
+
+
+def agregar_claims_usuario(token, user):
+    """Claims con los que UsuarioToken responde sin consultar la tabla de usuarios"""
+    token['usr_v'] = version_usuario(user.id)
+    token['username'] = user.get_username()
+    token['is_staff'] = user.is_staff
+    token['is_superuser'] = user.is_superuser
+    token['unidad'] = user.unidad_habitacional_id
+    token['rol'] = user.rol_id
+    return token
+
+
+def agregar_claims_privilegios(token, user):
+    """
+    Claims de autorización:
+      rol   -> id del rol del usuario
+      rol_v -> sello de versión de privilegios con que se calculó el mapa
+      privs -> mapa de bits (hex) de los privilegios del rol
+    """
+    token['rol'] = user.rol_id
+    token['rol_v'] = privilegios_service.version()
+    token['privs'] = privilegios_service.mapa_de_bits(user.rol_id)
+    return token
+
+
+def agregar_claims(token, user):
+    """Agregar los claims de los modos activos (JWT_USUARIO_EN_TOKEN / JWT_PRIVILEGIOS_EN_TOKEN)"""
+    if usuario_en_token():
+        agregar_claims_usuario(token, user)
+    if privilegios_en_token():
+        agregar_claims_privilegios(token, user)
+    return token
+
+
+def emitir_tokens(user):
+    """RefreshToken del usuario; sus claims se heredan al access token"""
+    return agregar_claims(RefreshToken.for_user(user), user)
+
+
+class TokenRefreshClaimsSerializer(TokenRefreshSerializer):
+    """
+    Refresh que vuelve a calcular los claims del access token:
+    - con JWT_USUARIO_EN_TOKEN siempre (is_staff, unidad o rol pudieron cambiar).
+    - con JWT_PRIVILEGIOS_EN_TOKEN cuando el sello `rol_v` quedó atrás
+      (cambió algún Rol/Privilegio/RolPrivilegio o el rol del usuario).
+    Es la única consulta: se paga al refrescar, no en cada request.
+    """
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        privilegios_viejos = privilegios_en_token() and access.get('rol_v') != privilegios_service.version()
+        if not (usuario_en_token() or privilegios_viejos):
+            return data
+
+        from .models import User
+
+        user = User.objects.filter(id=access.get(api_settings.USER_ID_CLAIM), is_active=True).first()
+        if user is None:
+            raise TokenError('El usuario del token no existe o está inactivo')
+        agregar_claims(access, user)
+        data['access'] = str(access)
+        return data
+
+
+def privilegio_en_claims(token, codigo):
+    """
+    True/False si el token trae claims de privilegios vigentes; None si no los
+    trae o si su sello `rol_v` ya no es el actual (hay que resolver por rol).
+
+    El sello se compara con el de la cache compartida, de modo que una
+    revocación invalida los claims en todos los workers en el acto. Sin cache
+    compartida el sello de un proceso no refleja los cambios hechos en otro:
+    los claims no se usan y se resuelve siempre por rol.
+    """
+    if token is None or not privilegios_en_token() or not cache_compartida():
+        return None
+    try:
+        mapa = token.get('privs')
+        if mapa is None or token.get('rol_v') != privilegios_service.version():
+            return None
+        return privilegios_service.mapa_incluye(mapa, codigo)
+    except (AttributeError, TypeError, ValueError):
+        return None
@@ -2,11 +2,13 @@ import json
 import base64
 from django.core.files.base import ContentFile
 from django.utils import timezone
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Prefetch, Q
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import login
 from .models import (
@@ -19,7 +21,9 @@ from .models import (
     Invitado,
     RostroUsuario, 
     RegistroAcceso,
+    PresenciaUsuario,
     ConfiguracionReconocimiento,
+    embedding_a_bytes,
 )
 from .serializers import (
     UserSerializer,
@@ -28,20 +32,27 @@ from .serializers import (
     RolSerializer,
     PrivilegioSerializer,
     RolPrivilegioSerializer,
+    MatrizPrivilegiosSerializer,
     CuotaSerializer,
     InvitadoSerializer,
     RostroUsuarioSerializer, 
     RegistroAccesoSerializer,
-    
+    PresenciaUsuarioSerializer,
 )
+from .filtros import filtrar_rango_fechas, id_de_parametro
+from .pagination import RegistroAccesoPagination
 from .permissions import TienePrivilegio
+from .services.configuracion_service import configuracion_service
 from .services.facial_recognition_service import facial_service
+from .services.capturas_service import guardado_capturas
+from .tokens import TokenRefreshClaimsSerializer, emitir_tokens
 from bitacora.utils import registrar_bitacora
 
 
 class AuthViewSet(viewsets.ViewSet):
     """
     /api/auth/login/  -> POST {username, password} -> {access, refresh, user}
+    /api/auth/token/refresh/ -> POST {refresh} -> {access}
     /api/auth/logout/ -> POST {refresh|refresh_token} -> 205
     """
 
@@ -52,7 +63,7 @@ class AuthViewSet(viewsets.ViewSet):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data["user"]
-            refresh = RefreshToken.for_user(user)
+            refresh = emitir_tokens(user)
 
             # Bitácora: LOGIN exitoso
             try:
@@ -79,6 +90,19 @@ class AuthViewSet(viewsets.ViewSet):
         # (opcional) podrías registrar intento fallido si amplías tus choices
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=["post"], url_path="token/refresh", authentication_classes=[])
+    def refresh(self, request):
+        """Nuevo access token; recalcula los claims de privilegios si quedaron viejos"""
+        serializer = TokenRefreshClaimsSerializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            return Response(
+                {"detail": str(e), "code": "token_not_valid"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=["post"], permission_classes=[AllowAny])
     def logout(self, request):
         """
@@ -134,7 +158,7 @@ class AuthViewSet(viewsets.ViewSet):
 
 
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related("unidad_habitacional", "rol").prefetch_related("rol__privilegios")
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, TienePrivilegio]
 
@@ -177,7 +201,7 @@ class UnidadHabitacionalViewSet(viewsets.ModelViewSet):
 
 
 class RolViewSet(viewsets.ModelViewSet):
-    queryset = Rol.objects.all()
+    queryset = Rol.objects.prefetch_related("privilegios")
     serializer_class = RolSerializer
     permission_classes = [IsAuthenticated, TienePrivilegio]
 
@@ -186,16 +210,88 @@ class RolViewSet(viewsets.ModelViewSet):
             return "roles.view"
         elif self.action == "create":
             return "roles.create"
-        elif self.action in ["update", "partial_update"]:
+        elif self.action in ["update", "partial_update", "remover_privilegio"]:
             return "roles.edit"
         elif self.action == "destroy":
             return "roles.delete"
+        elif self.action in ["privilegios", "matriz"]:
+            return "roles.view" if self.request.method == "GET" else "roles.edit"
         return None
 
     def get_permissions(self):
         self.privilegio_requerido = self.get_privilegio_requerido()
         return super().get_permissions()
 
+    @action(detail=True, methods=["get", "post"])
+    def privilegios(self, request, pk=None):
+        """
+        GET: privilegios del rol.
+        POST {privilegio_id} o {privilegio_ids: [...]}: asignarlos en un solo INSERT.
+        """
+        rol = self.get_object()
+        if request.method == "POST":
+            ids = request.data.get("privilegio_ids")
+            if ids is None and request.data.get("privilegio_id") is not None:
+                ids = [request.data.get("privilegio_id")]
+            serializer = MatrizPrivilegiosSerializer(data={"asignar": {rol.id: ids or []}})
+            serializer.is_valid(raise_exception=True)
+            RolPrivilegio.asignar(serializer.validated_data["asignar"])
+
+        privilegios = rol.privilegios.order_by("codigo")
+        return Response(PrivilegioSerializer(privilegios, many=True).data)
+
+    @action(
+        detail=True,
+        methods=["delete"],
+        url_path=r"privilegios/(?P<privilegio_pk>[^/.]+)",
+    )
+    def remover_privilegio(self, request, pk=None, privilegio_pk=None):
+        rol = self.get_object()
+        try:
+            privilegio_id = int(privilegio_pk)
+        except ValueError:
+            return Response(
+                {"error": "Privilegio no encontrado"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        if not RolPrivilegio.revocar({rol.id: [privilegio_id]}):
+            return Response(
+                {"error": "Este privilegio no está asignado al rol"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=["get", "post"])
+    def matriz(self, request):
+        """
+        Matriz rol-privilegio: cada rol con sus códigos de privilegio
+        (una consulta de roles y una de prefetch).
+
+        POST {"asignar": {rol_id: [privilegio_id, ...]}, "revocar": {...}} aplica
+        todos los cambios en una transacción (un INSERT y un DELETE) y devuelve
+        la matriz actualizada.
+        """
+        if request.method == "POST":
+            serializer = MatrizPrivilegiosSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            with transaction.atomic():
+                RolPrivilegio.revocar(serializer.validated_data["revocar"])
+                RolPrivilegio.asignar(serializer.validated_data["asignar"])
+
+        roles = Rol.objects.order_by("nombre").prefetch_related(
+            Prefetch("privilegios", queryset=Privilegio.objects.only("id", "codigo").order_by("codigo"))
+        )
+        return Response(
+            [
+                {
+                    "id": rol.id,
+                    "nombre": rol.nombre,
+                    "privilegios": [privilegio.codigo for privilegio in rol.privilegios.all()],
+                }
+                for rol in roles
+            ]
+        )
+
 
 class PrivilegioViewSet(viewsets.ModelViewSet):
     queryset = Privilegio.objects.all()
@@ -221,70 +317,16 @@ class PrivilegioViewSet(viewsets.ModelViewSet):
 class RolPrivilegioViewSet(viewsets.ModelViewSet):
     queryset = RolPrivilegio.objects.all()
     serializer_class = RolPrivilegioSerializer
-    permission_classes = [IsAuthenticated]
-
-
-class RolPrivilegioViewSet(viewsets.ModelViewSet):
-    queryset = RolPrivilegio.objects.all()
-    serializer_class = RolPrivilegioSerializer
-    permission_classes = [IsAuthenticated]
-
-    @action(detail=True, methods=["get"])
-    def privilegios(self, request, pk=None):
-        rol = self.get_object()
-        privilegios = rol.privilegios.all()
-        serializer = PrivilegioSerializer(privilegios, many=True)
-        return Response(serializer.data)
-
-    @action(detail=True, methods=["post"])
-    def asignar_privilegio(self, request, pk=None):
-        rol = self.get_object()
-        privilegio_id = request.data.get("privilegio_id")
-
-        if not privilegio_id:
-            return Response(
-                {"error": "privilegio_id es requerido"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        try:
-            privilegio = Privilegio.objects.get(id=privilegio_id)
-        except Privilegio.DoesNotExist:
-            return Response(
-                {"error": "Privilegio no encontrado"}, status=status.HTTP_404_NOT_FOUND
-            )
-
-        # Verificar si ya existe la relación
-        if RolPrivilegio.objects.filter(rol=rol, privilegio=privilegio).exists():
-            return Response(
-                {"error": "Este privilegio ya está asignado al rol"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        rol_privilegio = RolPrivilegio.objects.create(rol=rol, privilegio=privilegio)
-        serializer = RolPrivilegioSerializer(rol_privilegio)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-    @action(detail=True, methods=["delete"])
-    def remover_privilegio(self, request, pk=None, privilegio_pk=None):
-        rol = self.get_object()
+    permission_classes = [IsAuthenticated, TienePrivilegio]
 
-        try:
-            privilegio = Privilegio.objects.get(id=privilegio_pk)
-        except Privilegio.DoesNotExist:
-            return Response(
-                {"error": "Privilegio no encontrado"}, status=status.HTTP_404_NOT_FOUND
-            )
+    def get_privilegio_requerido(self):
+        if self.action == "list" or self.action == "retrieve":
+            return "roles.view"
+        return "roles.edit"
 
-        try:
-            rol_privilegio = RolPrivilegio.objects.get(rol=rol, privilegio=privilegio)
-            rol_privilegio.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        except RolPrivilegio.DoesNotExist:
-            return Response(
-                {"error": "Este privilegio no está asignado al rol"},
-                status=status.HTTP_404_NOT_FOUND,
-            )
+    def get_permissions(self):
+        self.privilegio_requerido = self.get_privilegio_requerido()
+        return super().get_permissions()
 
 
 class CuotaViewSet(viewsets.ModelViewSet):
@@ -307,6 +349,21 @@ class CuotaViewSet(viewsets.ModelViewSet):
         self.privilegio_requerido = self.get_privilegio_requerido()
         return super().get_permissions()
 
+    def get_queryset(self):
+        queryset = Cuota.objects.select_related("unidad_habitacional")
+
+        # Filtros opcionales
+        estado = self.request.query_params.get("estado", None)
+        if estado is not None:
+            queryset = queryset.filter(estado=estado)
+
+        unidad = self.request.query_params.get("unidad_habitacional", None)
+        if unidad:
+            queryset = queryset.filter(unidad_habitacional_id=id_de_parametro(unidad, "unidad_habitacional"))
+
+        # fecha_desde / fecha_hasta sobre el vencimiento
+        return filtrar_rango_fechas(queryset, "fecha_vencimiento", self.request.query_params)
+
 
 class InvitadoViewSet(viewsets.ModelViewSet):
     queryset = Invitado.objects.all()
@@ -340,15 +397,7 @@ class InvitadoViewSet(viewsets.ModelViewSet):
         if estado is not None:
             queryset = queryset.filter(estado=estado)
 
-        fecha_desde = self.request.query_params.get("fecha_desde", None)
-        if fecha_desde is not None:
-            queryset = queryset.filter(fecha_evento__gte=fecha_desde)
-
-        fecha_hasta = self.request.query_params.get("fecha_hasta", None)
-        if fecha_hasta is not None:
-            queryset = queryset.filter(fecha_evento__lte=fecha_hasta)
-
-        return queryset
+        return filtrar_rango_fechas(queryset, "fecha_evento", self.request.query_params)
 
     def perform_create(self, serializer):
         # Asignar automáticamente el residente actual al crear un invitado
@@ -453,10 +502,10 @@ class RostroUsuarioViewSet(viewsets.ModelViewSet):
                     'registro_id': registro_response.data.get('registro_id')
                 })
             else:
-                # Registrar acceso fallido (persona no reconocida)
+                # Registrar acceso fallido (persona no reconocida); tipo_acceso admite solo entrada/salida
                 registro_data = {
                     'usuario_id': None,
-                    'tipo_acceso': 'intento_fallido',
+                    'tipo_acceso': 'entrada',
                     'confianza': resultado['confianza'],
                     'imagen': imagen_captura,
                     'estado': 'fallido'
@@ -490,18 +539,11 @@ class RostroUsuarioViewSet(viewsets.ModelViewSet):
                 timestamp=timezone.now()
             )
             
-            # Guardar imagen de la captura si se proporciona
-            if imagen_base64:
-                try:
-                    format, imgstr = imagen_base64.split(';base64,')
-                    ext = format.split('/')[-1]
-                    imagen_data = ContentFile(base64.b64decode(imgstr), 
-                                            name=f'acceso_{int(timezone.now().timestamp())}.{ext}')
-                    registro.imagen_captura.save(imagen_data.name, imagen_data, save=False)
-                except Exception as e:
-                    print(f"Error guardando imagen: {e}")
-            
-            registro.save()
+            with transaction.atomic():
+                registro.save()
+                PresenciaUsuario.actualizar_desde_registros([registro])
+                # La captura se guarda en segundo plano una vez confirmado el registro
+                transaction.on_commit(lambda: guardado_capturas.encolar([registro.id], imagen_base64))
             
             return Response({
                 'success': True,
@@ -512,6 +554,85 @@ class RostroUsuarioViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
+    max_rostros_lote = 20
+
+    @action(detail=False, methods=['post'])
+    def procesar_acceso_lote(self, request):
+        """Procesar en una sola llamada todos los rostros detectados en un mismo cuadro"""
+        embeddings = request.data.get('embeddings')
+        imagen_captura = request.data.get('imagen')
+
+        if not isinstance(embeddings, list) or not embeddings:
+            return Response({'error': 'Se requiere una lista de embeddings'}, status=400)
+        if len(embeddings) > self.max_rostros_lote:
+            return Response({'error': f'Máximo {self.max_rostros_lote} rostros por solicitud'}, status=400)
+
+        try:
+            # Un solo producto matriz-matriz contra la galería
+            resultados = facial_service.reconocer_rostros(embeddings)
+
+            # Tipo de acceso una vez por usuario, aunque aparezca varias veces en el cuadro
+            tipos_acceso = facial_service.determinar_tipos_acceso([
+                resultado['usuario']['id'] for resultado in resultados if resultado['reconocido']
+            ])
+
+            registros = [
+                RegistroAcceso(
+                    usuario_id=resultado['usuario']['id'] if resultado['reconocido'] else None,
+                    tipo_acceso=tipos_acceso[resultado['usuario']['id']] if resultado['reconocido'] else 'entrada',
+                    confianza=resultado['confianza'],
+                    estado='exitoso' if resultado['reconocido'] else 'fallido',
+                )
+                for resultado in resultados
+            ]
+
+            with transaction.atomic():
+                RegistroAcceso.objects.bulk_create(registros)
+                PresenciaUsuario.actualizar_desde_registros(registros)
+                self.actualizar_estadisticas_lote(resultados)
+                # La captura del cuadro se guarda una vez, en segundo plano, para todos los registros
+                transaction.on_commit(
+                    lambda: guardado_capturas.encolar([registro.id for registro in registros], imagen_captura)
+                )
+
+            respuesta = []
+            for resultado, registro in zip(resultados, registros):
+                if resultado['reconocido']:
+                    tipo_acceso = registro.tipo_acceso
+                    respuesta.append({
+                        'acceso_permitido': True,
+                        'usuario': resultado['usuario'],
+                        'tipo_acceso': tipo_acceso,
+                        'confianza': resultado['confianza'],
+                        'mensaje': f"Acceso de {tipo_acceso} permitido para {resultado['usuario']['nombre']}",
+                        'registro_id': registro.id
+                    })
+                else:
+                    respuesta.append({
+                        'acceso_permitido': False,
+                        'mensaje': 'Persona no reconocida. Acceso denegado.',
+                        'confianza': resultado['confianza'],
+                        'registro_id': registro.id
+                    })
+
+            return Response({'resultados': respuesta})
+
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+
+    def actualizar_estadisticas_lote(self, resultados):
+        """Actualizar las estadísticas de todos los rostros reconocidos con un solo UPDATE por lote"""
+        reconocidos = [resultado for resultado in resultados if resultado['rostro_id']]
+        if not reconocidos:
+            return
+
+        rostros = RostroUsuario.objects.in_bulk([resultado['rostro_id'] for resultado in reconocidos])
+        for resultado in reconocidos:
+            rostro = rostros.get(resultado['rostro_id'])
+            if rostro:
+                rostro.actualizar_estadisticas(resultado['confianza'], guardar=False)
+        RostroUsuario.objects.bulk_update(rostros.values(), RostroUsuario.CAMPOS_ESTADISTICAS)
+
     @action(detail=False, methods=['get'])
     def estadisticas(self, request):
         """Obtener estadísticas del sistema de reconocimiento"""
@@ -530,7 +651,8 @@ class RostroUsuarioViewSet(viewsets.ModelViewSet):
                 'total_rostros_registrados': total_rostros,
                 'total_accesos_registrados': total_accesos,
                 'accesos_hoy': accesos_hoy,
-                'ultimos_accesos': ultimos_accesos_data
+                'ultimos_accesos': ultimos_accesos_data,
+                'capturas': guardado_capturas.estadisticas()
             })
             
         except Exception as e:
@@ -543,17 +665,23 @@ class RostroUsuarioViewSet(viewsets.ModelViewSet):
         embedding = request.data.get('embedding')  # JSON string del vector facial
         imagen_base64 = request.data.get('imagen')  # Imagen en base64 para referencia
         
+        try:
+            # El frontend envía el vector como JSON string; se almacena como float32 binario
+            embedding_binario = embedding_a_bytes(embedding)
+        except (TypeError, ValueError):
+            return Response({'error': 'Embedding inválido'}, status=400)
+
         try:
             usuario = User.objects.get(id=usuario_id)
             
             # Crear o actualizar el registro de rostro
             rostro, created = RostroUsuario.objects.get_or_create(
                 usuario=usuario,
-                defaults={'embedding': embedding}
+                defaults={'embedding': embedding_binario}
             )
             
             if not created:
-                rostro.embedding = embedding
+                rostro.embedding = embedding_binario
                 rostro.esta_activo = True
             
             # Guardar imagen de referencia si se proporciona
@@ -576,48 +704,55 @@ class RostroUsuarioViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
+    # Umbral por defecto de la consulta manual; el de los accesos sale de la configuración
+    umbral_consulta = 0.6
+
     @action(detail=False, methods=['post'])
     def reconocer_rostro(self, request):
-        """Reconocer un rostro a partir de un embedding"""
+        """Reconocer un rostro a partir de un embedding con el motor vectorizado compartido"""
         embedding_entrante = request.data.get('embedding')
-        umbral_confianza = float(request.data.get('umbral', 0.6))
-        
+
+        if not embedding_entrante:
+            return Response({'error': 'Embedding es requerido'}, status=400)
+
+        configuracion = configuracion_service.obtener()
         try:
-            rostros_activos = RostroUsuario.objects.filter(esta_activo=True)
+            umbral_confianza = float(request.data.get('umbral', self.umbral_consulta))
+            top_k = max(1, min(int(request.data.get('top_k', configuracion.top_k)), 20))
+        except (TypeError, ValueError):
+            return Response({'error': 'umbral y top_k deben ser numéricos'}, status=400)
+
+        try:
+            resultado = facial_service.reconocer_rostro(
+                embedding_entrante, umbral=umbral_confianza, top_k=top_k
+            )
+
             usuario_reconocido = None
-            mejor_confianza = 0
-            
-            for rostro in rostros_activos:
-                # Simular cálculo de similitud (en producción usarías una biblioteca de IA)
-                confianza = self.calcular_similitud(embedding_entrante, rostro.embedding)
-                
-                if confianza > mejor_confianza and confianza >= umbral_confianza:
-                    mejor_confianza = confianza
-                    usuario_reconocido = rostro.usuario
-            
+            if resultado['reconocido']:
+                usuario_reconocido = User.objects.select_related(
+                    'rol', 'unidad_habitacional'
+                ).filter(id=resultado['usuario']['id']).first()
+
+            # `candidatos`: los demás rostros sobre el umbral, para la interfaz del operador
             return Response({
                 'reconocido': usuario_reconocido is not None,
                 'usuario': UserSerializer(usuario_reconocido).data if usuario_reconocido else None,
-                'confianza': mejor_confianza
+                'confianza': resultado['confianza'] if usuario_reconocido else 0.0,
+                'rostro_id': resultado['rostro_id'] if usuario_reconocido else None,
+                'candidatos': resultado['candidatos']
             })
             
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
-    def calcular_similitud(self, embedding1, embedding2):
-        """Función simplificada para calcular similitud entre embeddings"""
-        # En producción, aquí integrarías con FaceAPI.js o similar
-        # Esta es una simulación básica
-        import random
-        return round(random.uniform(0.7, 0.95), 2)  # Simular reconocimiento exitoso
-
 class RegistroAccesoViewSet(viewsets.ModelViewSet):
     queryset = RegistroAcceso.objects.all()
     serializer_class = RegistroAccesoSerializer
     permission_classes = [IsAuthenticated, TienePrivilegio]
+    pagination_class = RegistroAccesoPagination
     
     def get_privilegio_requerido(self):
-        if self.action == 'list' or self.action == 'retrieve':
+        if self.action == 'list' or self.action == 'retrieve' or self.action == 'presentes':
             return 'access.view'
         elif self.action == 'create':
             return 'access.create'
@@ -629,17 +764,26 @@ class RegistroAccesoViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = RegistroAcceso.objects.all()
-        
-        # Filtrar por fecha si se proporciona
-        fecha_inicio = self.request.query_params.get('fecha_inicio')
-        fecha_fin = self.request.query_params.get('fecha_fin')
-        
-        if fecha_inicio:
-            queryset = queryset.filter(timestamp__date__gte=fecha_inicio)
-        if fecha_fin:
-            queryset = queryset.filter(timestamp__date__lte=fecha_fin)
-            
-        return queryset
+        params = self.request.query_params
+
+        usuario = params.get('usuario')
+        if usuario:
+            queryset = queryset.filter(usuario_id=id_de_parametro(usuario, 'usuario'))
+
+        # Filtrar por fecha si se proporciona (fecha_inicio/fecha_fin: nombres anteriores)
+        queryset = filtrar_rango_fechas(queryset, 'timestamp', params)
+        return filtrar_rango_fechas(queryset, 'timestamp', params, desde='fecha_inicio', hasta='fecha_fin')
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            registro = serializer.save()
+            PresenciaUsuario.actualizar_desde_registros([registro])
+
+    @action(detail=False, methods=['get'])
+    def presentes(self, request):
+        """Usuarios que están dentro del condominio en este momento"""
+        presencias = PresenciaUsuario.objects.filter(dentro=True).select_related('usuario').order_by('-ultima_vez_visto')
+        return Response(PresenciaUsuarioSerializer(presencias, many=True).data)
 
     @action(detail=False, methods=['post'])
     def registrar_acceso(self, request):
@@ -659,14 +803,11 @@ class RegistroAccesoViewSet(viewsets.ModelViewSet):
                 estado='exitoso' if usuario else 'fallido'
             )
             
-            # Guardar imagen de la captura si se proporciona
-            if imagen_base64:
-                format, imgstr = imagen_base64.split(';base64,')
-                ext = format.split('/')[-1]
-                imagen_data = ContentFile(base64.b64decode(imgstr), name=f'acceso_{registro.timestamp}.{ext}')
-                registro.imagen_captura.save(imagen_data.name, imagen_data, save=False)
-            
-            registro.save()
+            with transaction.atomic():
+                registro.save()
+                PresenciaUsuario.actualizar_desde_registros([registro])
+                # La captura se guarda en segundo plano una vez confirmado el registro
+                transaction.on_commit(lambda: guardado_capturas.encolar([registro.id], imagen_base64))
             
             return Response({
                 'success': True,
@@ -695,11 +836,11 @@ class ConfiguracionReconocimientoViewSet(viewsets.ViewSet):
                           status=403)
         
         configuraciones = request.data
-        for nombre, valor in configuraciones.items():
-            ConfiguracionReconocimiento.establecer_valor(nombre, str(valor))
+        with transaction.atomic():
+            for nombre, valor in configuraciones.items():
+                ConfiguracionReconocimiento.establecer_valor(nombre, str(valor))
         
-        # Limpiar cache de configuraciones
-        from django.core.cache import cache
-        cache.delete('configuracion_reconocimiento')
+        # Las señales de ConfiguracionReconocimiento invalidan la instantánea
+        # de configuración en todos los procesos al confirmar la transacción
         
         return Response({'success': True, 'message': 'Configuración actualizada correctamente'})
\ No newline at end of file
@@ -0,0 +1,139 @@
+import hashlib
+import json
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from api.filtros import inicio_dia
+from api.services.cache_compartida import cache_compartida
+
+from .models import Reserva
+
+
+def dias_de(inicio, fin):
+    """Días locales que toca el intervalo [inicio, fin)"""
+    dia = timezone.localtime(inicio).date()
+    ultimo = timezone.localtime(fin - timedelta(microseconds=1)).date()
+    while dia <= ultimo:
+        yield dia
+        dia += timedelta(days=1)
+
+
+class CalendarioService:
+    """Ocupación de las áreas por día, cacheada por (área, día).
+
+    Cada entrada guarda los bloques de las reservas activas que tocan ese
+    día local ({id, inicio, fin, estado, asistentes}) y su huella, un hash
+    del contenido: todos los workers calculan el mismo ETag para los mismos
+    bloques, sin serializar nada al responder.
+
+    Cada (área, día) tiene un número de versión en la cache que forma parte
+    de la clave de la entrada. Los cambios de una reserva suben la versión de
+    los días que ocupaba y de los que ocupa ahora (areas/signals.py); un
+    cálculo que empezó antes queda guardado bajo la versión vieja y nadie
+    lo vuelve a leer.
+
+    Sin cache compartida la invalidación no llegaría a los demás workers:
+    cada pedido se calcula con una consulta y no se guarda nada.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout or getattr(settings, 'CALENDARIO_CACHE_TTL', 900)
+
+    @staticmethod
+    def _version_key(area_id, dia):
+        return f"calendario_area_v:{area_id}:{dia.isoformat()}"
+
+    @staticmethod
+    def _key(area_id, dia, version):
+        return f"calendario_area:{area_id}:{dia.isoformat()}:{version}"
+
+    def dias(self, area_ids, desde, hasta):
+        """
+        {(area_id, dia): {"huella", "bloques"}} para cada área y día de
+        [desde, hasta]. Dos lecturas de cache (versiones y entradas) y, si
+        faltan días, una consulta.
+        """
+        pares = [
+            (area_id, desde + timedelta(days=n))
+            for area_id in area_ids
+            for n in range((hasta - desde).days + 1)
+        ]
+        if not cache_compartida():
+            return self._calcular(pares)
+
+        versiones = cache.get_many([self._version_key(*par) for par in pares])
+        claves = {
+            self._key(*par, versiones.get(self._version_key(*par), 0)): par
+            for par in pares
+        }
+        encontrados = cache.get_many(claves)
+        resultado = {claves[clave]: valor for clave, valor in encontrados.items()}
+
+        faltantes = {clave: par for clave, par in claves.items() if clave not in encontrados}
+        if faltantes:
+            nuevos = self._calcular(list(faltantes.values()))
+            # Con las versiones leídas antes de consultar: si hubo un cambio
+            # en el medio, esta escritura queda bajo una clave ya vieja
+            cache.set_many({clave: nuevos[par] for clave, par in faltantes.items()}, self.timeout)
+            resultado.update(nuevos)
+        return resultado
+
+    def _calcular(self, pares):
+        areas = {area_id for area_id, _ in pares}
+        primero = min(dia for _, dia in pares)
+        ultimo = max(dia for _, dia in pares)
+
+        bloques = defaultdict(list)
+        reservas = (
+            Reserva.objects.filter(
+                area_id__in=areas,
+                estado__in=Reserva.ESTADOS_ACTIVOS,
+                inicio__lt=inicio_dia(ultimo + timedelta(days=1)),
+                fin__gt=inicio_dia(primero),
+            )
+            .order_by("inicio", "id")
+            .values_list("id", "area_id", "inicio", "fin", "estado", "asistentes")
+        )
+        for id_, area_id, inicio, fin, estado, asistentes in reservas:
+            bloque = {
+                "id": id_,
+                "inicio": timezone.localtime(inicio),
+                "fin": timezone.localtime(fin),
+                "estado": estado,
+                "asistentes": asistentes,
+            }
+            for dia in dias_de(inicio, fin):
+                bloques[(area_id, dia)].append(bloque)
+
+        return {par: self._entrada(bloques.get(par, [])) for par in pares}
+
+    @staticmethod
+    def _entrada(bloques):
+        contenido = json.dumps(bloques, sort_keys=True, default=str)
+        return {"huella": hashlib.sha1(contenido.encode()).hexdigest(), "bloques": bloques}
+
+    @staticmethod
+    def etag(dias):
+        huellas = "|".join(f"{area_id}:{dia}:{dias[(area_id, dia)]['huella']}" for area_id, dia in sorted(dias))
+        return '"' + hashlib.sha1(huellas.encode()).hexdigest() + '"'
+
+    def invalidar(self, area_id, inicio, fin):
+        """Subir la versión de los días que toca [inicio, fin) en el área"""
+        if not cache_compartida():
+            return
+        for dia in dias_de(inicio, fin):
+            clave = self._version_key(area_id, dia)
+            try:
+                cache.incr(clave)
+            except ValueError:
+                # Sin versión guardada se leía 0
+                if not cache.add(clave, 1, None):
+                    cache.incr(clave)
+
+
+# Instancia global del servicio
+calendario_service = CalendarioService()
@@ -0,0 +1,129 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from api.filtros import inicio_dia
+
+from .models import Reserva
+
+SOLAPE = "solape"
+BUFFER = "buffer"
+
+
+def fusionar(intervalos):
+    """Intervalos (inicio, fin) ordenados por inicio -> disjuntos, fusionando los que se tocan"""
+    fusionados = []
+    for inicio, fin in intervalos:
+        if fusionados and inicio <= fusionados[-1][1]:
+            if fin > fusionados[-1][1]:
+                fusionados[-1] = (fusionados[-1][0], fin)
+        else:
+            fusionados.append((inicio, fin))
+    return fusionados
+
+
+class Disponibilidad:
+    """Ocupación de un área en una ventana de tiempo.
+
+    Carga una sola vez las reservas activas (pendientes y aprobadas) que
+    tocan la ventana y las guarda como dos listas de intervalos disjuntos
+    ordenados: `ocupados` (las reservas tal cual) y `bloqueados` (cada reserva
+    extendida `buffer_min` minutos a cada lado). Una reserva nueva
+    [inicio, fin) es válida si no corta ningún bloqueado; la búsqueda es
+    binaria sobre los inicios.
+    """
+
+    def __init__(self, area, desde, hasta, excluir=None):
+        self.area = area
+        self.desde = desde
+        self.hasta = hasta
+        self.buffer = timedelta(minutes=area.buffer_min)
+
+        reservas = Reserva.objects.filter(
+            area=area,
+            estado__in=Reserva.ESTADOS_ACTIVOS,
+            inicio__lt=hasta + self.buffer,
+            fin__gt=desde - self.buffer,
+        )
+        if excluir is not None:
+            reservas = reservas.exclude(pk=excluir)
+        intervalos = list(reservas.order_by("inicio", "fin").values_list("inicio", "fin"))
+
+        self.ocupados = fusionar(intervalos)
+        self.bloqueados = fusionar((inicio - self.buffer, fin + self.buffer) for inicio, fin in intervalos)
+        self._reglas = None
+
+    @staticmethod
+    def _corta(intervalos, inicio, fin):
+        # Último intervalo que empieza antes de `fin`; al ser disjuntos y
+        # ordenados, es el único candidato a terminar después de `inicio`
+        i = bisect_left(intervalos, (fin,)) - 1
+        return i >= 0 and intervalos[i][1] > inicio
+
+    def conflicto(self, inicio, fin):
+        """None si [inicio, fin) está libre; SOLAPE o BUFFER si no"""
+        if self._corta(self.ocupados, inicio, fin):
+            return SOLAPE
+        if self.buffer and self._corta(self.bloqueados, inicio, fin):
+            return BUFFER
+        return None
+
+    def agregar(self, inicio, fin):
+        """Sumar una reserva aceptada en memoria (p. ej. la ocurrencia anterior de una serie)"""
+        ocupados = list(self.ocupados)
+        insort(ocupados, (inicio, fin))
+        self.ocupados = fusionar(ocupados)
+        bloqueados = list(self.bloqueados)
+        insort(bloqueados, (inicio - self.buffer, fin + self.buffer))
+        self.bloqueados = fusionar(bloqueados)
+
+    def horario(self, dia):
+        """(apertura, cierre) del día: la regla de ese día de semana o el horario general del área"""
+        if self._reglas is None:
+            self._reglas = {
+                regla.dia_semana: (regla.hora_apertura, regla.hora_cierre) for regla in self.area.reglas.all()
+            }
+        return self._reglas.get(dia.weekday(), (self.area.hora_apertura, self.area.hora_cierre))
+
+    def ventana(self, dia):
+        """Inicio y fin (aware) en que se puede reservar ese día"""
+        apertura, cierre = self.horario(dia)
+        if apertura and cierre:
+            return (
+                timezone.make_aware(datetime.combine(dia, apertura)),
+                timezone.make_aware(datetime.combine(dia, cierre)),
+            )
+        return inicio_dia(dia), inicio_dia(dia + timedelta(days=1))
+
+    def libres(self, dia, duracion=None):
+        """Huecos [(inicio, fin)] del día donde cabe una reserva, de al menos `duracion` si se indica"""
+        inicio, fin = self.ventana(dia)
+        huecos = []
+        i = max(bisect_left(self.bloqueados, (inicio,)) - 1, 0)
+        for bloque_inicio, bloque_fin in self.bloqueados[i:]:
+            if bloque_inicio >= fin:
+                break
+            if bloque_inicio > inicio:
+                huecos.append((inicio, bloque_inicio))
+            inicio = max(inicio, bloque_fin)
+        if inicio < fin:
+            huecos.append((inicio, fin))
+
+        minimo = duracion or timedelta(0)
+        return [(a, b) for a, b in huecos if b - a > timedelta(0) and b - a >= minimo]
+
+    def ocupados_del_dia(self, dia):
+        """Reservas activas (fusionadas) recortadas al día"""
+        inicio, fin = inicio_dia(dia), inicio_dia(dia + timedelta(days=1))
+        i = max(bisect_left(self.ocupados, (inicio,)) - 1, 0)
+        return [
+            (max(a, inicio), min(b, fin))
+            for a, b in self.ocupados[i:]
+            if a < fin and b > inicio
+        ]
+
+    @classmethod
+    def de_dias(cls, area, primer_dia, dias, excluir=None):
+        """Disponibilidad cargada para `dias` días locales desde `primer_dia`"""
+        return cls(area, inicio_dia(primer_dia), inicio_dia(primer_dia + timedelta(days=dias)), excluir=excluir)
@@ -0,0 +1,62 @@
+from bisect import bisect_left, insort
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from areas.calendario import calendario_service
+from areas.models import Reserva
+
+
+class Command(BaseCommand):
+    help = (
+        'Lista las reservas activas que se solapan en la misma área (impiden '
+        'crear la restricción de la migración areas 0004) y, con --cancelar, '
+        'cancela las que chocan conservando primero las aprobadas y luego las más antiguas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cancelar', action='store_true', help='Cancelar las reservas que chocan')
+
+    def handle(self, *args, **options):
+        activas = (
+            Reserva.objects.filter(estado__in=Reserva.ESTADOS_ACTIVOS)
+            # APROBADA < PENDIENTE: primero las aprobadas
+            .order_by('area_id', 'estado', 'creado_en', 'id')
+            .only('id', 'area_id', 'estado', 'inicio', 'fin', 'bloqueo_inicio')
+        )
+
+        choques = []
+        area_actual = None
+        for reserva in activas.iterator():
+            if reserva.area_id != area_actual:
+                # Intervalos conservados del área, (inicio, fin, id): disjuntos y ordenados
+                area_actual, conservados = reserva.area_id, []
+            i = bisect_left(conservados, (reserva.fin,)) - 1
+            if i >= 0 and conservados[i][1] > reserva.bloqueo_inicio:
+                choques.append((reserva, conservados[i][2]))
+                continue
+            insort(conservados, (reserva.bloqueo_inicio, reserva.fin, reserva.id))
+
+        if not choques:
+            self.stdout.write('No hay reservas activas que se solapen')
+            return
+
+        for reserva, conservada in choques:
+            self.stdout.write(
+                f'Reserva #{reserva.id} ({reserva.estado}, área #{reserva.area_id}) choca con #{conservada}'
+            )
+        if not options['cancelar']:
+            self.stdout.write(f'{len(choques)} reservas en conflicto; use --cancelar para cancelarlas')
+            return
+
+        def invalidar_calendario():
+            for reserva, _ in choques:
+                calendario_service.invalidar(reserva.area_id, reserva.inicio, reserva.fin)
+
+        with transaction.atomic():
+            Reserva.objects.filter(id__in=[reserva.id for reserva, _ in choques]).update(
+                estado=Reserva.Estado.CANCELADA
+            )
+            # update() no emite post_save: invalidar el calendario a mano
+            transaction.on_commit(invalidar_calendario)
+        self.stdout.write(self.style.SUCCESS(f'{len(choques)} reservas canceladas'))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def calcular_bloqueo_inicio(apps, schema_editor):
+    Area = apps.get_model("areas", "Area")
+    Reserva = apps.get_model("areas", "Reserva")
+    for area in Area.objects.all():
+        Reserva.objects.filter(area=area).update(
+            bloqueo_inicio=F("inicio") - timedelta(minutes=area.buffer_min)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("areas", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reserva",
+            name="bloqueo_inicio",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(calcular_bloqueo_inicio, migrations.RunPython.noop),
+    ]
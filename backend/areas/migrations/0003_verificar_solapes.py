@@ -0,0 +1,49 @@
+from django.core.management.base import CommandError
+from django.db import migrations
+
+ACTIVOS = ("PENDIENTE", "APROBADA")
+
+
+def verificar_solapes(apps, schema_editor):
+    """
+    La restricción de 0004 no se puede crear si ya hay reservas activas que
+    comparten [bloqueo_inicio, fin) en la misma área. Qué reserva cancelar lo
+    decide la administración, no la migración: si hay solapes se aborta con
+    la lista y se resuelven antes (p. ej. `manage.py resolver_solapes_reservas`).
+    """
+    Reserva = apps.get_model("areas", "Reserva")
+    activas = (
+        Reserva.objects.filter(estado__in=ACTIVOS)
+        .order_by("area_id", "bloqueo_inicio", "id")
+        .values_list("id", "area_id", "bloqueo_inicio", "fin")
+    )
+
+    solapes = []
+    area_actual = fin_anterior = None
+    for id_, area_id, inicio, fin in activas.iterator():
+        if area_id != area_actual:
+            area_actual, fin_anterior = area_id, None
+        # Ordenadas por inicio: alcanza con la que termina más tarde hasta ahora
+        if fin_anterior is not None and inicio < fin_anterior[1]:
+            solapes.append((fin_anterior[0], id_, area_id))
+        if fin_anterior is None or fin > fin_anterior[1]:
+            fin_anterior = (id_, fin)
+
+    if solapes:
+        raise CommandError(
+            f"Hay {len(solapes)} pares de reservas activas que se solapan y la restricción de "
+            "0004 no se puede crear: "
+            + ", ".join(f"#{a} y #{b} (área #{area_id})" for a, b, area_id in solapes)
+            + ". Cancélelas o reprográmelas (manage.py resolver_solapes_reservas las lista) y vuelva a migrar."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("areas", "0002_reserva_bloqueo_inicio"),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_solapes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+import areas.models
+
+
+class AgregarRestriccionPostgres(migrations.AddConstraint):
+    """AddConstraint que solo toca la base en PostgreSQL (sqlite no tiene EXCLUDE)"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("areas", "0003_verificar_solapes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="reserva",
+            name="bloqueo_inicio",
+            field=models.DateTimeField(editable=False),
+        ),
+        # btree_gist: igualdad de area_id dentro del índice GiST
+        BtreeGistExtension(),
+        AgregarRestriccionPostgres(
+            model_name="reserva",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(("estado__in", ["PENDIENTE", "APROBADA"])),
+                expressions=[
+                    ("area", "="),
+                    (
+                        areas.models.TsTzRange(
+                            "bloqueo_inicio", "fin", django.contrib.postgres.fields.ranges.RangeBoundary()
+                        ),
+                        "&&",
+                    ),
+                ],
+                name="reserva_sin_solape",
+                violation_error_message="Ya existe una reserva activa que se solapa en este intervalo.",
+            ),
+        ),
+    ]
@@ -1,5 +1,10 @@
+from datetime import timedelta
+
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeBoundary, RangeOperators
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Func, Q
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
@@ -18,6 +23,41 @@ class Area(models.Model):
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        nueva = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Un cambio de buffer_min mueve el bloqueo de sus reservas activas
+            if not nueva:
+                self.actualizar_bloqueos()
+
+    def actualizar_bloqueos(self):
+        """
+        Recalcular bloqueo_inicio de las reservas activas con el buffer_min
+        actual. Si con el buffer nuevo dos reservas activas quedan a menos de
+        buffer_min minutos, ValidationError (la restricción las rechazaría).
+        """
+        buffer = timedelta(minutes=self.buffer_min)
+        activas = Reserva.objects.filter(area=self, estado__in=Reserva.ESTADOS_ACTIVOS)
+        desfasadas = activas.exclude(bloqueo_inicio=F("inicio") - buffer)
+        if not desfasadas.exists():
+            return 0
+
+        if buffer:
+            choques = []
+            fin_anterior = None
+            for id_, inicio, fin in activas.order_by("inicio", "fin").values_list("id", "inicio", "fin"):
+                if fin_anterior is not None and inicio - buffer < fin_anterior[1]:
+                    choques.append((fin_anterior[0], id_))
+                if fin_anterior is None or fin > fin_anterior[1]:
+                    fin_anterior = (id_, fin)
+            if choques:
+                raise ValidationError(
+                    f"Con un buffer de {self.buffer_min} min chocan reservas activas: "
+                    + ", ".join(f"#{a} y #{b}" for a, b in choques[:10])
+                )
+        return desfasadas.update(bloqueo_inicio=F("inicio") - buffer)
+
 
 class ReglaArea(models.Model):
     """Reglas simples por día de semana (0=lunes ... 6=domingo) para horarios especiales."""
@@ -34,6 +74,16 @@ class ReglaArea(models.Model):
         return f"{self.area.nombre} - {self.dia_semana}"
 
 
+# Restricción de exclusión (solo PostgreSQL, migración 0004): dos reservas
+# activas de la misma área no pueden compartir [bloqueo_inicio, fin)
+RESTRICCION_SOLAPE = "reserva_sin_solape"
+
+
+class TsTzRange(Func):
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
 class Reserva(models.Model):
     class Estado(models.TextChoices):
         PENDIENTE = "PENDIENTE", "Pendiente"
@@ -41,6 +91,9 @@ class Reserva(models.Model):
         CANCELADA = "CANCELADA", "Cancelada"
         RECHAZADA = "RECHAZADA", "Rechazada"
 
+    # Estados que ocupan el área
+    ESTADOS_ACTIVOS = (Estado.PENDIENTE, Estado.APROBADA)
+
     area = models.ForeignKey(Area, on_delete=models.PROTECT, related_name="reservas")
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="reservas"
@@ -52,6 +105,9 @@ class Reserva(models.Model):
         max_length=12, choices=Estado.choices, default=Estado.PENDIENTE
     )
     motivo = models.CharField(max_length=255, blank=True)
+    # inicio - buffer_min del área al reservar; lo usa la restricción de
+    # exclusión (PostgreSQL no acepta timestamptz - interval en un índice)
+    bloqueo_inicio = models.DateTimeField(editable=False)
     creado_en = models.DateTimeField(auto_now_add=True)
     actualizado_en = models.DateTimeField(auto_now=True)
 
@@ -59,9 +115,24 @@ class Reserva(models.Model):
         indexes = [
             models.Index(fields=["area", "inicio"]),
         ]
+        constraints = [
+            ExclusionConstraint(
+                name=RESTRICCION_SOLAPE,
+                expressions=[
+                    ("area", RangeOperators.EQUAL),
+                    (TsTzRange("bloqueo_inicio", "fin", RangeBoundary()), RangeOperators.OVERLAPS),
+                ],
+                condition=Q(estado__in=["PENDIENTE", "APROBADA"]),
+                violation_error_message="Ya existe una reserva activa que se solapa en este intervalo.",
+            ),
+        ]
         ordering = ["-inicio"]
 
-    def clean(self):
+    def clean(self, disponibilidad=None):
+        """
+        Reglas del área y choques con otras reservas. `disponibilidad` permite
+        validar muchas reservas contra una ocupación ya cargada.
+        """
         if self.inicio >= self.fin:
             raise ValidationError("La hora de inicio debe ser menor a la hora de fin.")
         if self.asistentes > self.area.aforo_max:
@@ -74,12 +145,15 @@ class Reserva(models.Model):
                 f"Duración supera el máximo permitido ({self.area.max_duracion_min} min)."
             )
 
+        # Una sola carga de la ocupación del área alrededor de la reserva
+        from .disponibilidad import BUFFER, SOLAPE, Disponibilidad
+
+        if disponibilidad is None:
+            disponibilidad = Disponibilidad(self.area, self.inicio, self.fin, excluir=self.pk)
+
         # Validar ventana de horario del área (regla del día si existe, si no usa global)
         local_dt = timezone.localtime(self.inicio)
-        dia_sem = local_dt.weekday()
-        regla = self.area.reglas.filter(dia_semana=dia_sem).first()
-        h_open = regla.hora_apertura if regla else self.area.hora_apertura
-        h_close = regla.hora_cierre if regla else self.area.hora_cierre
+        h_open, h_close = disponibilidad.horario(local_dt.date())
         if h_open and h_close:
             if not (h_open <= local_dt.time() <= h_close):
                 raise ValidationError(
@@ -90,34 +164,38 @@ class Reserva(models.Model):
                     "La reserva finaliza fuera del horario permitido del área."
                 )
 
-        # Validar solapamiento con otras reservas activas (pendiente/aprobada)
-        estados_activos = [Reserva.Estado.PENDIENTE, Reserva.Estado.APROBADA]
-        qs = Reserva.objects.filter(area=self.area, estado__in=estados_activos)
-        if self.pk:
-            qs = qs.exclude(pk=self.pk)
-        overlap = qs.filter(inicio__lt=self.fin, fin__gt=self.inicio).exists()
-        if overlap:
+        # Validar solapamiento con otras reservas activas (pendiente/aprobada) y buffer
+        conflicto = disponibilidad.conflicto(self.inicio, self.fin)
+        if conflicto == SOLAPE:
             raise ValidationError(
                 "Ya existe una reserva activa que se solapa en este intervalo."
             )
+        if conflicto == BUFFER:
+            raise ValidationError(
+                f"Debe respetarse un buffer de {self.area.buffer_min} min entre reservas."
+            )
 
-        # Validar buffer
-        if self.area.buffer_min:
-            from datetime import timedelta
-
-            before = qs.filter(
-                fin__gt=self.inicio - timedelta(minutes=self.area.buffer_min),
-                fin__lte=self.inicio,
-            ).exists()
-            after = qs.filter(
-                inicio__lt=self.fin + timedelta(minutes=self.area.buffer_min),
-                inicio__gte=self.fin,
-            ).exists()
-            if before or after:
-                raise ValidationError(
-                    f"Debe respetarse un buffer de {self.area.buffer_min} min entre reservas."
-                )
+    def calcular_bloqueo(self):
+        self.bloqueo_inicio = self.inicio - timedelta(minutes=self.area.buffer_min)
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-        return super().save(*args, **kwargs)
+        if self.area_id and self.inicio:
+            self.calcular_bloqueo()
+        # Camino rápido: clean detecta casi todos los choques sin escribir.
+        # La restricción de solape no se valida aquí (otra consulta y solo
+        # existe en PostgreSQL): la aplica la base de datos al guardar
+        self.full_clean(validate_constraints=False)
+        try:
+            # Savepoint: si la restricción rechaza la fila, la transacción
+            # externa sigue usable
+            with transaction.atomic():
+                return super().save(*args, **kwargs)
+        except IntegrityError as e:
+            if RESTRICCION_SOLAPE not in str(e):
+                raise
+        # Otra reserva concurrente ganó el intervalo: repetir clean para
+        # informar el mismo error que si se hubiera visto antes
+        self.clean()
+        raise ValidationError(
+            "Ya existe una reserva activa que se solapa en este intervalo."
+        )
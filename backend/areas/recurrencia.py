@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+DIAS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+FRECUENCIAS = ("DAILY", "WEEKLY")
+
+
+def max_ocurrencias():
+    return getattr(settings, "RESERVAS_RECURRENTES_MAX", 100)
+
+
+def parsear_regla(texto):
+    """
+    Subconjunto de RRULE (RFC 5545): FREQ=DAILY|WEEKLY, INTERVAL=n,
+    BYDAY=MO,WE,... (solo WEEKLY) y COUNT=n o UNTIL=AAAAMMDD (fecha incluida).
+    Ejemplo: "FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=12". ValueError si no es válida.
+    """
+    partes = {}
+    for parte in texto.upper().replace("RRULE:", "").split(";"):
+        if not parte.strip():
+            continue
+        clave, _, valor = parte.partition("=")
+        partes[clave.strip()] = valor.strip()
+
+    regla = {"frecuencia": partes.pop("FREQ", None)}
+    if regla["frecuencia"] not in FRECUENCIAS:
+        raise ValueError("FREQ debe ser DAILY o WEEKLY.")
+
+    try:
+        regla["intervalo"] = int(partes.pop("INTERVAL", 1))
+        regla["repeticiones"] = int(partes.pop("COUNT")) if "COUNT" in partes else None
+    except ValueError:
+        raise ValueError("INTERVAL y COUNT deben ser enteros.")
+    if regla["intervalo"] < 1 or (regla["repeticiones"] is not None and regla["repeticiones"] < 1):
+        raise ValueError("INTERVAL y COUNT deben ser mayores a cero.")
+
+    hasta = partes.pop("UNTIL", None)
+    regla["hasta"] = None
+    if hasta:
+        # AAAAMMDD, AAAAMMDDTHHMMSSZ (se usa la fecha) o AAAA-MM-DD
+        if "-" not in hasta:
+            hasta = f"{hasta[:4]}-{hasta[4:6]}-{hasta[6:8]}"
+        try:
+            regla["hasta"] = parse_date(hasta[:10])
+        except ValueError:
+            pass
+        if regla["hasta"] is None:
+            raise ValueError("UNTIL debe ser una fecha AAAAMMDD.")
+    if (regla["repeticiones"] is None) == (regla["hasta"] is None):
+        raise ValueError("Indique COUNT o UNTIL (uno de los dos).")
+
+    dias = partes.pop("BYDAY", None)
+    regla["dias_semana"] = None
+    if dias:
+        if regla["frecuencia"] != "WEEKLY":
+            raise ValueError("BYDAY solo se admite con FREQ=WEEKLY.")
+        try:
+            regla["dias_semana"] = sorted({DIAS[dia.strip()] for dia in dias.split(",")})
+        except KeyError:
+            raise ValueError("BYDAY admite MO, TU, WE, TH, FR, SA y SU.")
+
+    if partes:
+        raise ValueError(f"Partes no soportadas: {', '.join(sorted(partes))}.")
+    return regla
+
+
+def _fechas(primer_dia, regla):
+    # Generador sin fin de fechas que cumplen la regla a partir de primer_dia
+    if regla["frecuencia"] == "DAILY":
+        dia = primer_dia
+        while True:
+            yield dia
+            dia += timedelta(days=regla["intervalo"])
+
+    # WEEKLY: los días de BYDAY (o el de la primera fecha) cada INTERVAL semanas
+    dias_semana = regla["dias_semana"] or [primer_dia.weekday()]
+    semana = primer_dia - timedelta(days=primer_dia.weekday())
+    while True:
+        for dia_semana in dias_semana:
+            dia = semana + timedelta(days=dia_semana)
+            if dia >= primer_dia:
+                yield dia
+        semana += timedelta(weeks=regla["intervalo"])
+
+
+def ocurrencias(inicio, fin, regla):
+    """
+    [(inicio, fin)] de cada ocurrencia, conservando la hora local de la
+    primera (aunque cambie el horario de verano) y su duración.
+    ValueError si la regla supera el máximo de ocurrencias.
+    """
+    local = timezone.localtime(inicio)
+    duracion = fin - inicio
+    limite = max_ocurrencias()
+
+    resultado = []
+    for dia in _fechas(local.date(), regla):
+        if regla["hasta"] and dia > regla["hasta"]:
+            break
+        if len(resultado) == limite:
+            raise ValueError(f"La regla genera más de {limite} ocurrencias.")
+        ocurrencia = timezone.make_aware(datetime.combine(dia, local.time().replace(tzinfo=None)))
+        resultado.append((ocurrencia, ocurrencia + duracion))
+        if regla["repeticiones"] and len(resultado) == regla["repeticiones"]:
+            break
+    return resultado
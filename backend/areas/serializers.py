@@ -1,5 +1,7 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 from .models import Area, Reserva, ReglaArea
+from .recurrencia import ocurrencias, parsear_regla
 
 
 class ReglaAreaSerializer(serializers.ModelSerializer):
@@ -15,6 +17,13 @@ class AreaSerializer(serializers.ModelSerializer):
         model = Area
         fields = "__all__"
 
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except DjangoValidationError as e:
+            # Un buffer_min que hace chocar reservas activas -> 400
+            raise serializers.ValidationError(e.messages)
+
 
 class ReservaSerializer(serializers.ModelSerializer):
     usuario = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -39,12 +48,22 @@ class ReservaSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data["usuario"] = self.context["request"].user
-        reserva = super().create(validated_data)
+        try:
+            reserva = super().create(validated_data)
+        except DjangoValidationError as e:
+            # Reglas de Reserva.clean y choque con la restricción de solape -> 400
+            raise serializers.ValidationError(e.messages)
         # Hook bitácora / notificación:
         self._audit("RESERVA_CREADA", reserva)
         self._notify("reserva_creada", reserva)
         return reserva
 
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
+
     def _audit(self, action, reserva):
         try:
             from core.audit import audit_log  # adapta a tu proyecto
@@ -66,3 +85,27 @@ class ReservaSerializer(serializers.ModelSerializer):
             notify_event(event, payload=self.to_representation(reserva))
         except Exception:
             pass
+
+
+class ReservaRecurrenteSerializer(serializers.Serializer):
+    """Serie de reservas: la primera ocurrencia (inicio/fin) y una regla tipo RRULE"""
+
+    area = serializers.PrimaryKeyRelatedField(queryset=Area.objects.prefetch_related("reglas"))
+    inicio = serializers.DateTimeField()
+    fin = serializers.DateTimeField()
+    regla = serializers.CharField(help_text="Ej.: FREQ=WEEKLY;BYDAY=MO,WE;COUNT=12")
+    asistentes = serializers.IntegerField(min_value=1, default=1)
+    motivo = serializers.CharField(max_length=255, required=False, allow_blank=True, default="")
+    # False: si alguna ocurrencia choca no se crea ninguna
+    parcial = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data["inicio"] >= data["fin"]:
+            raise serializers.ValidationError("La hora de inicio debe ser menor a la hora de fin.")
+        try:
+            data["ocurrencias"] = ocurrencias(data["inicio"], data["fin"], parsear_regla(data["regla"]))
+        except ValueError as e:
+            raise serializers.ValidationError({"regla": str(e)})
+        if not data["ocurrencias"]:
+            raise serializers.ValidationError({"regla": "La regla no genera ocurrencias (UNTIL es anterior al inicio)."})
+        return data
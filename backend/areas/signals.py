@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .calendario import calendario_service
+from .models import Reserva
+
+
+def _intervalo(reserva):
+    return reserva.area_id, reserva.inicio, reserva.fin
+
+
+def _invalidar_calendario(*intervalos):
+    def invalidar():
+        for area_id, inicio, fin in set(intervalos):
+            if area_id and inicio and fin:
+                calendario_service.invalidar(area_id, inicio, fin)
+
+    transaction.on_commit(invalidar)
+
+
+@receiver(post_init, sender=Reserva)
+def reserva_cargada(sender, instance, **kwargs):
+    datos = instance.__dict__
+    instance._intervalo_original = (datos.get('area_id'), datos.get('inicio'), datos.get('fin'))
+
+
+@receiver(post_save, sender=Reserva)
+def reserva_guardada(sender, instance, raw=False, **kwargs):
+    """Aprobar, cancelar, reprogramar o crear cambia los días que ocupaba y los que ocupa"""
+    if raw:
+        return
+    _invalidar_calendario(instance._intervalo_original, _intervalo(instance))
+    instance._intervalo_original = _intervalo(instance)
+
+
+@receiver(post_delete, sender=Reserva)
+def reserva_eliminada(sender, instance, **kwargs):
+    _invalidar_calendario(_intervalo(instance))
@@ -1,3 +1,386 @@
-from django.test import TestCase
+import threading
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import User
+
+from .calendario import CalendarioService
+from .disponibilidad import BUFFER, SOLAPE, Disponibilidad
+from .models import Area, ReglaArea, Reserva
+
+# Un lunes
+DIA = date(2025, 3, 3)
+
+
+def hora(h, m=0, dia=DIA):
+    return timezone.make_aware(datetime.combine(dia, time(h, m)))
+
+
+class DisponibilidadTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create(username='residente', ci='r1', telefono='0')
+        self.area = Area.objects.create(
+            nombre='Gimnasio', aforo_max=10, hora_apertura=time(8), hora_cierre=time(22), buffer_min=15
+        )
+
+    def reservar(self, inicio, fin, estado=Reserva.Estado.APROBADA):
+        return Reserva.objects.create(area=self.area, usuario=self.usuario, inicio=inicio, fin=fin, estado=estado)
+
+    def test_huecos_del_dia_con_buffer(self):
+        self.reservar(hora(10), hora(11))
+        self.reservar(hora(11, 15), hora(12))
+        self.reservar(hora(15), hora(16), estado=Reserva.Estado.CANCELADA)
+
+        disponibilidad = Disponibilidad.de_dias(self.area, DIA, 1)
+
+        self.assertEqual(disponibilidad.libres(DIA), [(hora(8), hora(9, 45)), (hora(12, 15), hora(22))])
+        self.assertEqual(disponibilidad.ocupados_del_dia(DIA), [(hora(10), hora(11)), (hora(11, 15), hora(12))])
+        self.assertEqual(disponibilidad.libres(DIA, timedelta(hours=2)), [(hora(12, 15), hora(22))])
+
+    def test_conflictos(self):
+        self.reservar(hora(10), hora(11))
+        disponibilidad = Disponibilidad(self.area, hora(0), hora(0, dia=DIA + timedelta(days=1)))
+
+        self.assertEqual(disponibilidad.conflicto(hora(10, 30), hora(12)), SOLAPE)
+        self.assertEqual(disponibilidad.conflicto(hora(11), hora(12)), BUFFER)
+        self.assertEqual(disponibilidad.conflicto(hora(9), hora(9, 50)), BUFFER)
+        self.assertIsNone(disponibilidad.conflicto(hora(11, 15), hora(12)))
+        self.assertIsNone(disponibilidad.conflicto(hora(8), hora(9, 45)))
+
+    def test_clean_usa_una_carga(self):
+        ReglaArea.objects.create(area=self.area, dia_semana=DIA.weekday(), hora_apertura=time(9), hora_cierre=time(12))
+        self.reservar(hora(10), hora(11))
+
+        reserva = Reserva(area=self.area, usuario=self.usuario, inicio=hora(11), fin=hora(11, 30))
+        with self.assertNumQueries(2), self.assertRaisesMessage(ValidationError, 'buffer de 15 min'):
+            reserva.clean()
+
+        reserva = Reserva(area=self.area, usuario=self.usuario, inicio=hora(12), fin=hora(13))
+        with self.assertRaisesMessage(ValidationError, 'finaliza fuera del horario'):
+            reserva.clean()
+
+    def test_endpoint_de_semana(self):
+        self.reservar(hora(10), hora(11))
+        client = APIClient()
+        client.force_authenticate(self.usuario)
+
+        respuesta = client.get(f'/api/areas/{self.area.id}/disponibilidad/', {'fecha': DIA.isoformat(), 'dias': 7})
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.data['dias']), 7)
+        self.assertEqual(len(respuesta.data['dias'][0]['libres']), 2)
+        martes = DIA + timedelta(days=1)
+        self.assertEqual(
+            respuesta.data['dias'][1]['libres'], [{'inicio': hora(8, dia=martes), 'fin': hora(22, dia=martes)}]
+        )
+
+        respuesta = client.get(f'/api/areas/{self.area.id}/disponibilidad/', {'dias': 30})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class SolapeTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create(username='residente', ci='r1', telefono='0')
+        self.area = Area.objects.create(nombre='Salón', aforo_max=50, buffer_min=30)
+
+    def test_bloqueo_inicio_incluye_el_buffer(self):
+        reserva = Reserva.objects.create(area=self.area, usuario=self.usuario, inicio=hora(10), fin=hora(12))
+        self.assertEqual(reserva.bloqueo_inicio, hora(9, 30))
+
+    def test_choque_responde_400(self):
+        Reserva.objects.create(area=self.area, usuario=self.usuario, inicio=hora(10), fin=hora(12))
+        client = APIClient()
+        client.force_authenticate(self.usuario)
+
+        respuesta = client.post(
+            '/api/reservas/',
+            {'area': self.area.id, 'inicio': hora(11), 'fin': hora(13), 'asistentes': 5},
+            format='json',
+        )
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('solapa', respuesta.data[0])
+
+
+class BufferYSolapesExistentesTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create(username='residente', ci='r1', telefono='0')
+        self.area = Area.objects.create(nombre='Salón', aforo_max=50, max_duracion_min=600)
+
+    def reservar(self, inicio, fin, **datos):
+        return Reserva.objects.create(area=self.area, usuario=self.usuario, inicio=inicio, fin=fin, **datos)
+
+    def test_cambio_de_buffer_recalcula_los_bloqueos_activos(self):
+        activa = self.reservar(hora(10), hora(11))
+        cancelada = self.reservar(hora(14), hora(15), estado=Reserva.Estado.CANCELADA)
+
+        self.area.buffer_min = 30
+        self.area.save()
+
+        activa.refresh_from_db()
+        cancelada.refresh_from_db()
+        self.assertEqual(activa.bloqueo_inicio, hora(9, 30))
+        self.assertEqual(cancelada.bloqueo_inicio, hora(14))
+
+    def test_buffer_que_hace_chocar_reservas_activas(self):
+        primera = self.reservar(hora(10), hora(11))
+        segunda = self.reservar(hora(11, 15), hora(12))
+
+        self.area.buffer_min = 30
+        with self.assertRaisesMessage(ValidationError, f'#{primera.id} y #{segunda.id}'):
+            self.area.save()
+        self.area.refresh_from_db()
+        self.assertEqual(self.area.buffer_min, 0)
+
+    def reservas_solapadas(self):
+        # Filas previas a la restricción: bulk_create no pasa por clean
+        filas = [
+            (Reserva.Estado.PENDIENTE, hora(9), hora(11)),
+            (Reserva.Estado.APROBADA, hora(10), hora(12)),
+            (Reserva.Estado.PENDIENTE, hora(12), hora(13)),
+            (Reserva.Estado.PENDIENTE, hora(12, 30), hora(14)),
+        ]
+        return Reserva.objects.bulk_create([
+            Reserva(area=self.area, usuario=self.usuario, estado=estado, inicio=inicio, fin=fin, bloqueo_inicio=inicio)
+            for estado, inicio, fin in filas
+        ])
+
+    def test_migracion_aborta_con_los_solapes_existentes(self):
+        from importlib import import_module
+
+        from django.apps import apps
+
+        verificar_solapes = import_module('areas.migrations.0003_verificar_solapes').verificar_solapes
+        reservas = self.reservas_solapadas()
+
+        with self.assertRaises(CommandError) as error:
+            verificar_solapes(apps, None)
+        self.assertIn(f'#{reservas[0].id} y #{reservas[1].id}', str(error.exception))
+        self.assertIn(f'#{reservas[2].id} y #{reservas[3].id}', str(error.exception))
+        self.assertFalse(Reserva.objects.filter(estado=Reserva.Estado.CANCELADA).exists())
+
+        Reserva.objects.filter(pk__in=[reservas[0].pk, reservas[3].pk]).delete()
+        verificar_solapes(apps, None)
+
+    def test_comando_lista_y_cancela_los_solapes(self):
+        reservas = self.reservas_solapadas()
+
+        salida = StringIO()
+        call_command('resolver_solapes_reservas', stdout=salida)
+        self.assertIn('2 reservas en conflicto', salida.getvalue())
+        self.assertFalse(Reserva.objects.filter(estado=Reserva.Estado.CANCELADA).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('resolver_solapes_reservas', '--cancelar', stdout=StringIO())
+        estados = dict(Reserva.objects.values_list('id', 'estado'))
+        self.assertEqual(
+            [estados[reserva.id] for reserva in reservas],
+            [Reserva.Estado.CANCELADA, Reserva.Estado.APROBADA, Reserva.Estado.PENDIENTE, Reserva.Estado.CANCELADA],
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'La restricción de exclusión es de PostgreSQL')
+class SolapeConcurrenteTests(TransactionTestCase):
+    def setUp(self):
+        self.usuario = User.objects.create(username='residente', ci='r1', telefono='0')
+        self.area = Area.objects.create(nombre='Salón', aforo_max=50, buffer_min=30)
+
+    def test_la_restriccion_cubre_el_buffer(self):
+        # Sin el camino rápido de clean, la base de datos rechaza el choque
+        with mock.patch.object(Reserva, 'clean'):
+            Reserva.objects.create(area=self.area, usuario=self.usuario, inicio=hora(10), fin=hora(12))
+            with self.assertRaises(ValidationError):
+                Reserva.objects.create(area=self.area, usuario=self.usuario, inicio=hora(12, 15), fin=hora(13))
+            Reserva.objects.create(area=self.area, usuario=self.usuario, inicio=hora(12, 30), fin=hora(13))
+
+    def test_reservas_concurrentes_del_mismo_horario(self):
+        intentos = 10
+        barrera = threading.Barrier(intentos)
+        resultados = []
+
+        def reservar(n):
+            try:
+                barrera.wait()
+                Reserva.objects.create(
+                    area=self.area, usuario=self.usuario, inicio=hora(10, n), fin=hora(11, n)
+                )
+                resultados.append('creada')
+            except ValidationError:
+                resultados.append('rechazada')
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reservar, args=(n,)) for n in range(intentos)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(resultados.count('creada'), 1)
+        self.assertEqual(resultados.count('rechazada'), intentos - 1)
+        self.assertEqual(Reserva.objects.filter(area=self.area).count(), 1)
+
+
+class ReservasRecurrentesTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', ci='a1', telefono='0', is_staff=True)
+        self.area = Area.objects.create(
+            nombre='Gimnasio', aforo_max=20, hora_apertura=time(7), hora_cierre=time(21), buffer_min=10
+        )
+        ReglaArea.objects.create(area=self.area, dia_semana=4, hora_apertura=time(7), hora_cierre=time(18))
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def crear_serie(self, **datos):
+        datos = {'area': self.area.id, 'inicio': hora(18), 'fin': hora(19), 'asistentes': 15, **datos}
+        return self.client.post('/api/reservas/recurrentes/', datos, format='json')
+
+    def test_serie_semanal_en_un_insert(self):
+        # Área con reglas, reservas existentes y el INSERT (entre SAVEPOINT y RELEASE)
+        with self.assertNumQueries(6):
+            respuesta = self.crear_serie(regla='FREQ=WEEKLY;BYDAY=MO,WE;COUNT=8')
+
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(len(respuesta.data['creadas']), 8)
+        reservas = list(Reserva.objects.filter(area=self.area).order_by('inicio'))
+        self.assertEqual([timezone.localtime(r.inicio).weekday() for r in reservas[:4]], [0, 2, 0, 2])
+        self.assertTrue(all(r.estado == Reserva.Estado.APROBADA for r in reservas))
+        self.assertEqual(reservas[0].bloqueo_inicio, hora(17, 50))
+
+    def test_conflictos_por_ocurrencia(self):
+        miercoles = DIA + timedelta(days=2)
+        Reserva.objects.create(
+            area=self.area, usuario=self.admin, inicio=hora(18, 30, dia=miercoles), fin=hora(20, dia=miercoles)
+        )
+        # El viernes la regla del área cierra a las 18:00
+        regla = 'FREQ=DAILY;UNTIL=20250307'
+
+        respuesta = self.crear_serie(regla=regla)
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(
+            [c['inicio'] for c in respuesta.data['conflictos']],
+            [hora(18, dia=miercoles), hora(18, dia=DIA + timedelta(days=4))],
+        )
+        self.assertEqual(Reserva.objects.filter(area=self.area).count(), 1)
+
+        respuesta = self.crear_serie(regla=regla, parcial=True)
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(len(respuesta.data['creadas']), 3)
+        self.assertIn('solapa', respuesta.data['conflictos'][0]['errores'][0])
+
+    def test_ocurrencias_de_la_misma_serie_no_se_solapan(self):
+        self.area = Area.objects.create(nombre='Quincho', aforo_max=20, max_duracion_min=2000)
+        respuesta = self.crear_serie(
+            regla='FREQ=DAILY;COUNT=3', parcial=True, inicio=hora(8), fin=hora(9, dia=DIA + timedelta(days=1))
+        )
+
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(len(respuesta.data['creadas']), 2)
+        self.assertEqual(respuesta.data['conflictos'][0]['inicio'], hora(8, dia=DIA + timedelta(days=1)))
+
+    def test_regla_invalida_y_permisos(self):
+        for regla in (
+            'FREQ=MONTHLY;COUNT=2', 'FREQ=WEEKLY', 'FREQ=DAILY;COUNT=500', 'FREQ=WEEKLY;BYDAY=XX;COUNT=2',
+            # UNTIL anterior al inicio: ninguna ocurrencia
+            'FREQ=DAILY;UNTIL=20250301',
+        ):
+            respuesta = self.crear_serie(regla=regla)
+            self.assertEqual(respuesta.status_code, 400, regla)
+            self.assertIn('regla', respuesta.data)
+
+        self.client.force_authenticate(User.objects.create(username='residente', ci='r1', telefono='0'))
+        self.assertEqual(self.crear_serie(regla='FREQ=DAILY;COUNT=2').status_code, 403)
+
+
+@override_settings(CACHE_COMPARTIDA=True)
+class CalendarioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username='admin', ci='a1', telefono='0', is_staff=True)
+        self.area = Area.objects.create(nombre='Quincho', aforo_max=30, max_duracion_min=600)
+        self.reserva = Reserva.objects.create(
+            area=self.area, usuario=self.admin, inicio=hora(20), fin=hora(2, dia=DIA + timedelta(days=1)), asistentes=12
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = f'/api/areas/calendario/?area={self.area.id}&desde={DIA}&hasta={DIA + timedelta(days=2)}'
+
+    def test_bloques_por_dia_desde_la_cache(self):
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(self.url)
+        dias = respuesta.data['areas'][self.area.id]
+        self.assertEqual(list(dias), ['2025-03-03', '2025-03-04', '2025-03-05'])
+        self.assertEqual(dias['2025-03-03'], dias['2025-03-04'])
+        self.assertEqual(dias['2025-03-03'][0]['asistentes'], 12)
+        self.assertEqual(dias['2025-03-05'], [])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).data, respuesta.data)
+
+    def test_etag(self):
+        etag = self.client.get(self.url)['ETag']
+
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etag)
+
+    def test_etag_depende_solo_del_contenido(self):
+        etag = self.client.get(self.url)['ETag']
+        # Otro worker (o la cache vaciada) recalcula y llega al mismo ETag
+        cache.clear()
+        self.assertEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_calculo_tardio_no_pisa_la_invalidacion(self):
+        servicio = CalendarioService()
+        calcular = servicio._calcular
+
+        def calcular_y_cancelar(pares):
+            viejos = calcular(pares)
+            # La reserva se cancela mientras el cálculo todavía no se guardó
+            Reserva.objects.filter(pk=self.reserva.pk).update(estado=Reserva.Estado.CANCELADA)
+            servicio.invalidar(self.area.id, self.reserva.inicio, self.reserva.fin)
+            return viejos
+
+        with mock.patch.object(servicio, '_calcular', side_effect=calcular_y_cancelar):
+            self.assertEqual(len(servicio.dias([self.area.id], DIA, DIA)[(self.area.id, DIA)]['bloques']), 1)
+        self.assertEqual(servicio.dias([self.area.id], DIA, DIA)[(self.area.id, DIA)]['bloques'], [])
+
+    def test_cambios_de_estado_invalidan_los_dias(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/reservas/{self.reserva.id}/aprobar/')
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['areas'][self.area.id]['2025-03-04'][0]['estado'], Reserva.Estado.APROBADA)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/reservas/{self.reserva.id}/cancelar/')
+        dias = self.client.get(self.url).data['areas'][self.area.id]
+        self.assertEqual(dias['2025-03-03'], [])
+        self.assertEqual(dias['2025-03-04'], [])
+
+    def test_sin_cache_compartida_consulta_siempre(self):
+        with override_settings(CACHE_COMPARTIDA=False):
+            with self.assertNumQueries(1):
+                etag = self.client.get(self.url)['ETag']
+            # Otro worker cancela: su invalidación no llegaría a esta cache local
+            Reserva.objects.filter(pk=self.reserva.pk).update(estado=Reserva.Estado.CANCELADA)
+            with self.assertNumQueries(1):
+                respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['areas'][self.area.id]['2025-03-03'], [])
+
+    def test_ventana_invalida(self):
+        self.assertEqual(self.client.get('/api/areas/calendario/?desde=2025-03-10&hasta=2025-03-01').status_code, 400)
+        self.assertEqual(self.client.get('/api/areas/calendario/?desde=2025-01-01&hasta=2025-06-01').status_code, 400)
@@ -2,18 +2,128 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
 from django.utils import timezone
+from datetime import timedelta
 
-from .models import Area, Reserva, ReglaArea
-from .serializers import AreaSerializer, ReservaSerializer, ReglaAreaSerializer
+from .calendario import calendario_service
+from .disponibilidad import Disponibilidad
+from .models import RESTRICCION_SOLAPE, Area, Reserva, ReglaArea
+from .serializers import AreaSerializer, ReservaSerializer, ReglaAreaSerializer, ReservaRecurrenteSerializer
 from .permissions import IsAdminOrReadOnly
+from api.authentication import JWTAutenticacionSinConsulta
+from api.filtros import fecha_de_parametro
+
+# Un día o una semana
+DISPONIBILIDAD_MAX_DIAS = 7
+# Dos meses de calendario por pedido
+CALENDARIO_MAX_DIAS = 62
 
 
 class AreaViewSet(viewsets.ModelViewSet):
-    queryset = Area.objects.all()
+    queryset = Area.objects.prefetch_related("reglas")
     serializer_class = AreaSerializer
     permission_classes = [IsAuthenticated & IsAdminOrReadOnly]
 
+    @action(detail=True, methods=["get"])
+    def disponibilidad(self, request, pk=None):
+        """
+        Horarios libres del área por día.
+        ?fecha=AAAA-MM-DD (por defecto hoy), ?dias=1..7 (por defecto 1) y
+        ?duracion=<min> para devolver solo huecos donde quepa esa duración.
+        """
+        area = self.get_object()
+        params = request.query_params
+        fecha = params.get("fecha")
+        primer_dia = fecha_de_parametro(fecha, "fecha") if fecha else timezone.localdate()
+        try:
+            dias = int(params.get("dias", 1))
+            duracion = int(params.get("duracion", 0))
+        except ValueError:
+            raise ValidationError("dias y duracion deben ser enteros.")
+        if not 1 <= dias <= DISPONIBILIDAD_MAX_DIAS:
+            raise ValidationError({"dias": f"Entre 1 y {DISPONIBILIDAD_MAX_DIAS}."})
+
+        disponibilidad = Disponibilidad.de_dias(area, primer_dia, dias)
+        resultado = []
+        for n in range(dias):
+            dia = primer_dia + timedelta(days=n)
+            apertura, cierre = disponibilidad.horario(dia)
+            resultado.append(
+                {
+                    "fecha": dia,
+                    "apertura": apertura,
+                    "cierre": cierre,
+                    "libres": [
+                        {"inicio": inicio, "fin": fin}
+                        for inicio, fin in disponibilidad.libres(dia, timedelta(minutes=duracion))
+                    ],
+                    "ocupados": [
+                        {"inicio": inicio, "fin": fin}
+                        for inicio, fin in disponibilidad.ocupados_del_dia(dia)
+                    ],
+                }
+            )
+        return Response(
+            {
+                "area": area.id,
+                "buffer_min": area.buffer_min,
+                "max_duracion_min": area.max_duracion_min,
+                "dias": resultado,
+            }
+        )
+
+
+    @action(detail=False, methods=["get"])
+    def calendario(self, request):
+        """
+        Ocupación por área y día: ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD (por
+        defecto una semana) y ?area=1,2 (por defecto las áreas activas).
+        Cada día trae bloques {id, inicio, fin, estado, asistentes} de las
+        reservas activas; una reserva que cruza la medianoche aparece en
+        ambos días.
+
+        Se sirve desde la cache por (área, día) y responde ETag: con
+        If-None-Match vigente devuelve 304 sin cuerpo.
+        """
+        params = request.query_params
+        desde = fecha_de_parametro(params["desde"], "desde") if params.get("desde") else timezone.localdate()
+        hasta = fecha_de_parametro(params["hasta"], "hasta") if params.get("hasta") else desde + timedelta(days=6)
+        if not 0 <= (hasta - desde).days < CALENDARIO_MAX_DIAS:
+            raise ValidationError({"hasta": f"Debe ser igual o posterior a desde, hasta {CALENDARIO_MAX_DIAS} días."})
+
+        if params.get("area"):
+            try:
+                area_ids = sorted({int(valor) for valor in params["area"].split(",")})
+            except ValueError:
+                raise ValidationError({"area": "Lista de ids separados por coma."})
+        else:
+            area_ids = list(Area.objects.filter(activo=True).order_by("id").values_list("id", flat=True))
+
+        dias = calendario_service.dias(area_ids, desde, hasta)
+        etag = calendario_service.etag(dias)
+        if etag in [valor.strip() for valor in request.headers.get("If-None-Match", "").split(",")]:
+            respuesta = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            respuesta = Response(
+                {
+                    "desde": desde,
+                    "hasta": hasta,
+                    "areas": {
+                        area_id: {
+                            dia.isoformat(): dias[(area_id, dia)]["bloques"]
+                            for dia in (desde + timedelta(days=n) for n in range((hasta - desde).days + 1))
+                        }
+                        for area_id in area_ids
+                    },
+                }
+            )
+        respuesta["ETag"] = etag
+        # El navegador guarda la respuesta pero la revalida siempre con If-None-Match
+        respuesta["Cache-Control"] = "private, no-cache"
+        return respuesta
 
 class ReglaAreaViewSet(viewsets.ModelViewSet):
     queryset = ReglaArea.objects.all()
@@ -25,6 +135,8 @@ class ReservaViewSet(viewsets.ModelViewSet):
     queryset = Reserva.objects.select_related("area", "usuario").all()
     serializer_class = ReservaSerializer
     permission_classes = [IsAuthenticated]
+    # Lecturas sin consultar el usuario (claims del token)
+    authentication_classes = [JWTAutenticacionSinConsulta]
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -36,7 +148,7 @@ class ReservaViewSet(viewsets.ModelViewSet):
         if estado:
             qs = qs.filter(estado=estado)
         if mias == "1":
-            qs = qs.filter(usuario=self.request.user)
+            qs = qs.filter(usuario_id=self.request.user.id)
         return qs
 
     def perform_destroy(self, instance):
@@ -85,3 +197,75 @@ class ReservaViewSet(viewsets.ModelViewSet):
         except Exception:
             pass
         return Response(self.get_serializer(reserva).data)
+
+    @staticmethod
+    def _invalidar_calendario(reservas):
+        for reserva in reservas:
+            calendario_service.invalidar(reserva.area_id, reserva.inicio, reserva.fin)
+
+    @action(detail=False, methods=["post"])
+    def recurrentes(self, request):
+        """
+        Crear una serie de reservas (clases, eventos semanales) en un solo INSERT.
+
+        Todas las ocurrencias se validan en memoria contra las reglas del área y
+        una sola carga de sus reservas activas; se crean APROBADAS. Responde las
+        creadas y los conflictos por ocurrencia. Con parcial=false (por defecto)
+        un conflicto cancela toda la serie (409).
+        """
+        if not request.user.is_staff:
+            return Response({"detail": "Solo administradores."}, status=403)
+        entrada = ReservaRecurrenteSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        datos = entrada.validated_data
+        area, serie = datos["area"], datos["ocurrencias"]
+
+        disponibilidad = Disponibilidad(area, serie[0][0], serie[-1][1])
+        validas, conflictos = [], []
+        for inicio, fin in serie:
+            reserva = Reserva(
+                area=area,
+                usuario=request.user,
+                inicio=inicio,
+                fin=fin,
+                asistentes=datos["asistentes"],
+                motivo=datos["motivo"],
+                estado=Reserva.Estado.APROBADA,
+            )
+            try:
+                reserva.clean(disponibilidad=disponibilidad)
+            except DjangoValidationError as e:
+                conflictos.append({"inicio": inicio, "fin": fin, "errores": e.messages})
+                continue
+            # Las ocurrencias siguientes también deben respetar esta
+            disponibilidad.agregar(inicio, fin)
+            reserva.calcular_bloqueo()
+            validas.append(reserva)
+
+        if not validas or (conflictos and not datos["parcial"]):
+            return Response({"creadas": [], "conflictos": conflictos}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            with transaction.atomic():
+                creadas = Reserva.objects.bulk_create(validas)
+                # bulk_create no emite post_save: invalidar el calendario a mano
+                transaction.on_commit(lambda: self._invalidar_calendario(creadas))
+        except IntegrityError as e:
+            if RESTRICCION_SOLAPE not in str(e):
+                raise
+            # Otra reserva entró entre la validación y el INSERT: nada se creó
+            return Response(
+                {"detail": "Otra reserva ocupó parte de la serie mientras se validaba; intente de nuevo."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        try:
+            from core.notifications import notify_event
+
+            notify_event("reservas_recurrentes_creadas", payload={"ids": [r.id for r in creadas]})
+        except Exception:
+            pass
+        return Response(
+            {"creadas": self.get_serializer(creadas, many=True).data, "conflictos": conflictos},
+            status=status.HTTP_201_CREATED,
+        )
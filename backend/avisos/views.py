@@ -10,12 +10,15 @@ from .serializers import AvisoSerializer, AdjuntoSerializer
 
 # Permiso “simple”: admin escribe, el resto solo lectura
 from api.permissions import IsAdminOrReadOnly
+from api.authentication import JWTAutenticacionSinConsulta
 
 
 class AvisoViewSet(viewsets.ModelViewSet):
     queryset = Aviso.objects.all().prefetch_related("adjuntos", "unidades_destino")
     serializer_class = AvisoSerializer
     permission_classes = [IsAdminOrReadOnly]
+    # Lecturas sin consultar el usuario (claims del token)
+    authentication_classes = [JWTAutenticacionSinConsulta]
 
     def get_queryset(self):
         user = self.request.user
@@ -0,0 +1,124 @@
+# backend/bitacora/buffer.py
+import atexit
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+class BufferBitacora:
+    """
+    Buffer en memoria para las filas de Bitácora del middleware.
+
+    - las filas se acumulan y se insertan con un solo bulk_create cada
+      `max_filas` filas o cada `intervalo_ms` milisegundos (hilo de fondo).
+    - el rol (primer grupo del usuario) se resuelve al vaciar, con una sola
+      consulta por lote, en lugar de una consulta por request.
+    - al llegar a `capacidad`, la política de desborde decide:
+        "vaciar"    → el request que desborda vacía el buffer (no se pierde nada)
+        "descartar" → la fila nueva se descarta y se cuenta en `descartadas`
+    - al terminar el proceso se vacía lo pendiente (atexit).
+    """
+
+    def __init__(self, max_filas=None, intervalo_ms=None, capacidad=None, desborde=None):
+        self.max_filas = max_filas or getattr(settings, "BITACORA_BUFFER_FILAS", 100)
+        self.intervalo_ms = intervalo_ms or getattr(settings, "BITACORA_BUFFER_MS", 1000)
+        self.capacidad = capacidad or getattr(settings, "BITACORA_BUFFER_CAPACIDAD", 5000)
+        self.desborde = desborde or getattr(settings, "BITACORA_BUFFER_DESBORDE", "vaciar")
+
+        self._filas = deque()
+        self._lock = threading.Lock()
+        self._lock_vaciado = threading.Lock()
+        self._evento = threading.Event()
+        self._hilo = None
+        self.descartadas = 0
+        self.errores = 0
+
+    def __len__(self):
+        return len(self._filas)
+
+    def agregar(self, datos, usuario_id=None):
+        """Encolar una fila (kwargs de Bitacora); `usuario_id` permite resolver el rol al vaciar."""
+        with self._lock:
+            desbordado = len(self._filas) >= self.capacidad
+            if desbordado and self.desborde == "descartar":
+                self.descartadas += 1
+                return
+            if not desbordado:
+                self._filas.append((datos, usuario_id))
+            lleno = len(self._filas) >= self.max_filas
+
+        if desbordado:
+            # Contrapresión: este request paga el vaciado y luego encola su fila
+            self.vaciar()
+            with self._lock:
+                self._filas.append((datos, usuario_id))
+
+        self._asegurar_hilo()
+        if lleno:
+            self._evento.set()
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(
+                    target=self._bucle, name="bitacora-buffer", daemon=True
+                )
+                self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            self._evento.wait(self.intervalo_ms / 1000)
+            self._evento.clear()
+            close_old_connections()
+            self.vaciar()
+            close_old_connections()
+
+    def vaciar(self):
+        """Insertar todas las filas pendientes con un bulk_create."""
+        with self._lock_vaciado:
+            with self._lock:
+                lote = list(self._filas)
+                self._filas.clear()
+            if not lote:
+                return 0
+
+            from .models import Bitacora
+
+            try:
+                roles = self.roles_de_usuarios([usuario_id for _, usuario_id in lote if usuario_id])
+                filas = []
+                for datos, usuario_id in lote:
+                    if usuario_id and datos.get("rol") is None:
+                        datos = {**datos, "rol": roles.get(usuario_id)}
+                    filas.append(Bitacora(**datos))
+                Bitacora.objects.bulk_create(filas, batch_size=500)
+            except Exception:
+                # Nunca romper por la bitácora: se cuentan las filas perdidas
+                self.errores += len(lote)
+                return 0
+            return len(lote)
+
+    @staticmethod
+    def roles_de_usuarios(usuario_ids):
+        """Primer grupo (por id) de cada usuario, como hacía `user.groups.first()`."""
+        if not usuario_ids:
+            return {}
+        from django.contrib.auth import get_user_model
+
+        Membresia = get_user_model().groups.through
+        roles = {}
+        for usuario_id, nombre in (
+            Membresia.objects.filter(user_id__in=set(usuario_ids))
+            .order_by("user_id", "group_id")
+            .values_list("user_id", "group__name")
+        ):
+            roles.setdefault(usuario_id, nombre)
+        return roles
+
+
+buffer_bitacora = BufferBitacora()
+atexit.register(buffer_bitacora.vaciar)
@@ -0,0 +1,123 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from bitacora import particiones
+from bitacora.models import CAMPOS_BUSQUEDA
+
+TABLA_BENCHMARK = "bitacora_benchmark_busqueda"
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara ?search= de la Bitácora con icontains por columna contra la columna '
+        '`busqueda` con índice pg_trgm, sobre una tabla sintética (solo PostgreSQL)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=5_000_000, help='Filas de la tabla sintética')
+        parser.add_argument(
+            '--terminos', default='usuario1234,10.0.4.17,reservas/42/,firefox,no-existe',
+            help='Términos de búsqueda separados por coma',
+        )
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--conservar', action='store_true', help='No borrar la tabla al terminar')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('El benchmark requiere PostgreSQL (pg_trgm)'))
+            return
+
+        terminos = [t.strip() for t in options['terminos'].split(',') if t.strip()]
+        with connection.cursor() as cursor:
+            self._crear_tabla(cursor, options['filas'])
+            try:
+                self.stdout.write('Sin índice de trigramas (icontains por columna):')
+                for termino in terminos:
+                    self._medir(cursor, 'icontains', self._sql_icontains(), termino, options['repeticiones'])
+
+                inicio = time.perf_counter()
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                cursor.execute(
+                    f'CREATE INDEX ON "{TABLA_BENCHMARK}" USING gin (busqueda gin_trgm_ops)'
+                )
+                cursor.execute(f'ANALYZE "{TABLA_BENCHMARK}"')
+                self.stdout.write(f'Índice GIN pg_trgm creado en {time.perf_counter() - inicio:.1f} s')
+
+                self.stdout.write('Columna `busqueda` con índice de trigramas:')
+                for termino in terminos:
+                    self._medir(cursor, 'busqueda', self._sql_busqueda(), termino, options['repeticiones'])
+            finally:
+                if not options['conservar']:
+                    cursor.execute(f'DROP TABLE IF EXISTS "{TABLA_BENCHMARK}"')
+
+    def _crear_tabla(self, cursor, filas):
+        inicio = time.perf_counter()
+        cursor.execute(f'DROP TABLE IF EXISTS "{TABLA_BENCHMARK}"')
+        cursor.execute(
+            f'CREATE UNLOGGED TABLE "{TABLA_BENCHMARK}" '
+            f'(LIKE "{particiones.TABLA}" INCLUDING DEFAULTS INCLUDING GENERATED)'
+        )
+        cursor.execute(f'CREATE INDEX ON "{TABLA_BENCHMARK}" (fecha, id)')
+        cursor.execute(
+            f"""
+            INSERT INTO "{TABLA_BENCHMARK}"
+                (id, fecha, usuario, rol, accion, entidad, entidad_id, metodo, ruta, status, ip, user_agent)
+            SELECT
+                gen_random_uuid(),
+                now() - make_interval(secs => i),
+                'usuario' || (i %% 20000),
+                (ARRAY['Administrador', 'Residente', 'Guardia', 'Personal'])[1 + i %% 4],
+                (ARRAY['READ', 'CREATE', 'UPDATE', 'DELETE', 'LOGIN', 'LOGOUT'])[1 + i %% 6],
+                (ARRAY['usuarios', 'areas', 'reservas', 'cuotas', 'avisos', 'accesos'])[1 + i %% 6],
+                (i %% 5000)::text,
+                (ARRAY['GET', 'POST', 'PATCH', 'DELETE'])[1 + i %% 4],
+                '/api/' || (ARRAY['usuarios', 'areas', 'reservas', 'cuotas', 'avisos', 'accesos'])[1 + i %% 6]
+                    || '/' || (i %% 5000) || '/',
+                (ARRAY[200, 201, 204, 400, 403, 404])[1 + i %% 6],
+                ('10.' || (i / 65536 %% 256) || '.' || (i / 256 %% 256) || '.' || (i %% 256))::inet,
+                (ARRAY[
+                    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/124.0',
+                    'Mozilla/5.0 (X11; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0',
+                    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) Safari/604.1',
+                    'okhttp/4.12.0'
+                ])[1 + i %% 4]
+            FROM generate_series(1, %s) AS i
+            """,
+            [filas],
+        )
+        cursor.execute(f'ANALYZE "{TABLA_BENCHMARK}"')
+        self.stdout.write(f'{filas} filas sintéticas en {time.perf_counter() - inicio:.1f} s')
+
+    @staticmethod
+    def _sql_icontains():
+        # Lo que genera SearchFilter: un UPPER(...) LIKE UPPER(...) por columna, unidos con OR
+        condiciones = ' OR '.join(
+            f'UPPER("{campo}"::text) LIKE UPPER(%(patron)s)' for campo in CAMPOS_BUSQUEDA
+        )
+        return (
+            f'SELECT id FROM "{TABLA_BENCHMARK}" WHERE ({condiciones}) '
+            'ORDER BY fecha DESC, id DESC LIMIT 21'
+        )
+
+    @staticmethod
+    def _sql_busqueda():
+        return (
+            f'SELECT id FROM "{TABLA_BENCHMARK}" WHERE busqueda LIKE LOWER(%(patron)s) '
+            'ORDER BY fecha DESC, id DESC LIMIT 21'
+        )
+
+    def _medir(self, cursor, nombre, sql, termino, repeticiones):
+        patron = '%' + termino.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        latencias = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            cursor.execute(sql, {'patron': patron})
+            filas = len(cursor.fetchall())
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        self.stdout.write(
+            f"  {nombre:<10} {termino!r:<18} filas={filas:<3} "
+            f"p50={np.percentile(latencias, 50):.1f} ms  max={max(latencias):.1f} ms"
+        )
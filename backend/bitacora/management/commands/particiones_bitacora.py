@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from bitacora import particiones
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea las particiones mensuales futuras de la Bitácora y desprende '
+        '(archiva o elimina) las más antiguas que el período de retención'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses-futuros', type=int,
+            default=getattr(settings, 'BITACORA_PARTICIONES_FUTURAS', 3),
+            help='Meses por adelantado para los que debe existir partición',
+        )
+        parser.add_argument(
+            '--retener-meses', type=int,
+            default=getattr(settings, 'BITACORA_RETENCION_MESES', None),
+            help='Meses completos a conservar en la tabla viva (sin valor = no desprender)',
+        )
+        parser.add_argument(
+            '--eliminar', action='store_true',
+            help='Eliminar las particiones desprendidas en lugar de archivarlas',
+        )
+        parser.add_argument(
+            '--esquema-archivo',
+            default=getattr(settings, 'BITACORA_ESQUEMA_ARCHIVO', 'bitacora_archivo'),
+            help='Esquema al que se mueven las particiones archivadas',
+        )
+        parser.add_argument('--simular', action='store_true', help='Mostrar los cambios sin aplicarlos')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('El particionado de la Bitácora solo aplica a PostgreSQL'))
+            return
+
+        with connection.cursor() as cursor:
+            if not particiones.es_particionada(cursor):
+                raise CommandError('La tabla de Bitácora no está particionada; ejecute las migraciones')
+
+        actual = particiones.inicio_mes(timezone.now())
+        simular = options['simular']
+
+        for desplazamiento in range(options['meses_futuros'] + 1):
+            mes = particiones.sumar_meses(actual, desplazamiento)
+            nombre = particiones.nombre_particion(mes)
+            if simular:
+                self.stdout.write(f'Asegurar partición {nombre}')
+                continue
+            with transaction.atomic(), connection.cursor() as cursor:
+                if particiones.crear_particion(cursor, mes):
+                    self.stdout.write(self.style.SUCCESS(f'Partición creada: {nombre}'))
+
+        if options['retener_meses'] is None:
+            return
+
+        limite = particiones.sumar_meses(actual, -options['retener_meses'])
+        with connection.cursor() as cursor:
+            antiguas = [nombre for mes, nombre in particiones.listar_particiones(cursor) if mes < limite]
+
+        destino = 'eliminada' if options['eliminar'] else f"archivada en {options['esquema_archivo']}"
+        for nombre in antiguas:
+            if simular:
+                self.stdout.write(f'Desprender {nombre} ({destino})')
+                continue
+            with transaction.atomic(), connection.cursor() as cursor:
+                particiones.desprender_particion(
+                    cursor,
+                    nombre,
+                    esquema_archivo=None if options['eliminar'] else options['esquema_archivo'],
+                    eliminar=options['eliminar'],
+                )
+            self.stdout.write(self.style.SUCCESS(f'Partición {nombre} {destino}'))
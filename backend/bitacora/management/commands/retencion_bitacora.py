@@ -0,0 +1,113 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from api.filtros import inicio_dia
+from bitacora.models import Bitacora, BitacoraResumenDiario
+from bitacora.utils import CAMPOS_EXPORTACION, fila_exportable
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacta la Bitácora más antigua que la retención: resume cada día en '
+        'BitacoraResumenDiario, archiva las filas en NDJSON comprimido bajo '
+        'MEDIA_ROOT y las borra por lotes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=getattr(settings, 'BITACORA_RETENCION_DIAS', 90),
+            help='Días de bitácora detallada que se conservan',
+        )
+        parser.add_argument(
+            '--lote', type=int, default=getattr(settings, 'BITACORA_RETENCION_LOTE', 5000),
+            help='Filas borradas por sentencia DELETE',
+        )
+        parser.add_argument(
+            '--pausa-ms', type=int, default=100,
+            help='Pausa entre lotes para no competir con los inserts del middleware',
+        )
+        parser.add_argument('--simular', action='store_true', help='Mostrar los días a compactar sin cambiar nada')
+
+    def handle(self, *args, **options):
+        limite = inicio_dia(timezone.localdate() - timedelta(days=options['dias']))
+        primera = Bitacora.objects.filter(fecha__lt=limite).aggregate(primera=Min('fecha'))['primera']
+        if primera is None:
+            self.stdout.write('No hay filas de bitácora fuera del período de retención')
+            return
+
+        while primera is not None:
+            dia = timezone.localtime(primera).date()
+            fin = inicio_dia(dia + timedelta(days=1))
+            filas = Bitacora.objects.filter(fecha__gte=inicio_dia(dia), fecha__lt=fin)
+            if options['simular']:
+                self.stdout.write(f'{dia}: {filas.count()} filas')
+            else:
+                self._compactar_dia(dia, filas, options['lote'], options['pausa_ms'] / 1000)
+            # Saltar directo al siguiente día con filas
+            primera = Bitacora.objects.filter(fecha__gte=fin, fecha__lt=limite).aggregate(
+                primera=Min('fecha')
+            )['primera']
+
+    def _compactar_dia(self, dia, filas, lote, pausa):
+        # Si el día ya tiene resumen, una corrida anterior archivó y resumió pero
+        # no terminó de borrar: solo falta borrar (repetir no duplica totales)
+        if not BitacoraResumenDiario.objects.filter(dia=dia).exists():
+            ruta = self._archivar(dia, filas)
+            with transaction.atomic():
+                resumen = BitacoraResumenDiario.objects.bulk_create(
+                    [
+                        BitacoraResumenDiario(dia=dia, **grupo)
+                        for grupo in filas.order_by()
+                        .values('usuario', 'accion', 'status', 'ruta')
+                        .annotate(total=Count('id'), primera=Min('fecha'), ultima=Max('fecha'))
+                    ],
+                    batch_size=1000,
+                )
+            self.stdout.write(f'{dia}: {len(resumen)} filas de resumen, archivo {ruta}')
+
+        borradas = self._borrar_por_lotes(filas, lote, pausa)
+        self.stdout.write(self.style.SUCCESS(f'{dia}: {borradas} filas borradas'))
+
+    def _archivar(self, dia, filas):
+        """Escribir las filas del día en MEDIA_ROOT/<dir>/AAAA/MM/bitacora_AAAA-MM-DD.ndjson.gz"""
+        directorio = os.path.join(
+            settings.MEDIA_ROOT,
+            getattr(settings, 'BITACORA_ARCHIVO_DIR', 'bitacora_archivo'),
+            f'{dia:%Y}',
+            f'{dia:%m}',
+        )
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, f'bitacora_{dia.isoformat()}.ndjson.gz')
+
+        # Se escribe a un temporal y se renombra: nunca queda un archivo a medias
+        temporal = f'{ruta}.tmp'
+        with gzip.open(temporal, 'wt', encoding='utf-8') as archivo:
+            for fila in filas.order_by('fecha', 'id').values_list(*CAMPOS_EXPORTACION).iterator(chunk_size=2000):
+                archivo.write(json.dumps(fila_exportable(fila), cls=DjangoJSONEncoder, ensure_ascii=False))
+                archivo.write('\n')
+        os.replace(temporal, ruta)
+        return ruta
+
+    @staticmethod
+    def _borrar_por_lotes(filas, lote, pausa):
+        """DELETE acotados, cada uno en su propia transacción corta."""
+        total = 0
+        while True:
+            ids = list(filas.order_by().values_list('id', flat=True)[:lote])
+            if not ids:
+                return total
+            # Repetir el rango de fecha permite descartar particiones en PostgreSQL
+            borradas, _ = filas.filter(id__in=ids).delete()
+            total += borradas
+            if pausa:
+                time.sleep(pausa)
@@ -4,6 +4,7 @@ from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 from django.utils import timezone
 
+from .buffer import buffer_bitacora
 from .models import Bitacora
 
 
@@ -68,18 +69,16 @@ class RequestBitacoraMiddleware(MiddlewareMixin):
             accion = self._accion_inferida(request, response)
 
             usuario = None
-            rol = None
+            usuario_id = None
             if getattr(request, "user", None) and request.user.is_authenticated:
                 usuario = getattr(request.user, "username", None) or str(request.user)
-                # tomamos el primer grupo como “rol” si existe
-                first_group = request.user.groups.first()
-                if first_group:
-                    rol = first_group.name
+                # el “rol” (primer grupo) se resuelve al vaciar el buffer, una consulta por lote
+                usuario_id = request.user.pk
 
-            Bitacora.objects.create(
+            datos = dict(
                 fecha=timezone.now(),
                 usuario=usuario,
-                rol=rol,
+                rol=None,
                 accion=accion,
                 entidad=None,
                 entidad_id=None,
@@ -90,6 +89,13 @@ class RequestBitacoraMiddleware(MiddlewareMixin):
                 user_agent=request.META.get("HTTP_USER_AGENT"),
                 extra=None,
             )
+
+            if getattr(settings, "BITACORA_ASINCRONA", True):
+                buffer_bitacora.agregar(datos, usuario_id=usuario_id)
+            else:
+                if usuario_id:
+                    datos["rol"] = buffer_bitacora.roles_de_usuarios([usuario_id]).get(usuario_id)
+                Bitacora.objects.create(**datos)
         except Exception:
             # Nunca romper la request por la bitácora
             pass
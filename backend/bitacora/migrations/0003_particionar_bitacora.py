@@ -0,0 +1,32 @@
+from django.db import migrations
+
+from bitacora import particiones
+
+
+def particionar(apps, schema_editor):
+    # El particionado declarativo solo existe en PostgreSQL; en otros motores
+    # (sqlite en desarrollo) la tabla queda como está
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not particiones.es_particionada(cursor):
+            particiones.particionar(cursor)
+
+
+def desparticionar(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if particiones.es_particionada(cursor):
+            particiones.desparticionar(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bitacora", "0002_alter_bitacora_options_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, desparticionar),
+    ]
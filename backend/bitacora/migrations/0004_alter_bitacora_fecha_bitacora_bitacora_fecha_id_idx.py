@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bitacora', '0003_particionar_bitacora'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bitacora',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='bitacora',
+            index=models.Index(fields=['fecha', 'id'], name='bitacora_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:16
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def crear_indice_trigramas(apps, schema_editor):
+    # Índice GIN pg_trgm para LIKE '%termino%' sobre la columna generada;
+    # en la tabla particionada se propaga a cada partición
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS bitacora_busqueda_trgm_idx "
+        "ON bitacora_bitacora USING gin (busqueda gin_trgm_ops)"
+    )
+
+
+def eliminar_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS bitacora_busqueda_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bitacora', '0004_alter_bitacora_fecha_bitacora_bitacora_fecha_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bitacora',
+            name='busqueda',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Concat('ruta', models.Value(' '), 'entidad', models.Value(' '), 'user_agent', models.Value(' '), 'usuario', models.Value(' '), 'rol', models.Value(' '), 'ip')), output_field=models.TextField()),
+        ),
+        migrations.RunPython(crear_indice_trigramas, eliminar_indice_trigramas),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bitacora', '0005_bitacora_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BitacoraResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('usuario', models.CharField(blank=True, max_length=150, null=True)),
+                ('accion', models.CharField(choices=[('LOGIN', 'Login'), ('LOGOUT', 'Logout'), ('CREATE', 'Create'), ('READ', 'Read'), ('UPDATE', 'Update'), ('DELETE', 'Delete')], max_length=10)),
+                ('status', models.PositiveIntegerField()),
+                ('ruta', models.CharField(max_length=512)),
+                ('total', models.PositiveIntegerField()),
+                ('primera', models.DateTimeField()),
+                ('ultima', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de Bitácora',
+                'verbose_name_plural': 'Resúmenes diarios de Bitácora',
+                'ordering': ['-dia'],
+                'indexes': [models.Index(fields=['dia', 'accion'], name='bitacora_resumen_dia_idx')],
+            },
+        ),
+    ]
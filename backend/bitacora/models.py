@@ -1,7 +1,12 @@
 import uuid
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat, Lower
 from django.utils import timezone
 
+# Columnas que cubre ?search= en /api/bitacora/
+CAMPOS_BUSQUEDA = ["ruta", "entidad", "user_agent", "usuario", "rol", "ip"]
+
 
 class Bitacora(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -15,7 +20,7 @@ class Bitacora(models.Model):
         ("DELETE", "Delete"),
     ]
 
-    fecha = models.DateTimeField(default=timezone.now, db_index=True)
+    fecha = models.DateTimeField(default=timezone.now)
     usuario = models.CharField(max_length=150, blank=True, null=True)
     rol = models.CharField(max_length=150, blank=True, null=True)
 
@@ -31,11 +36,52 @@ class Bitacora(models.Model):
     user_agent = models.TextField(blank=True, null=True)
     extra = models.JSONField(blank=True, null=True)
 
+    # Texto de búsqueda en minúsculas, calculado por la base de datos en cada
+    # insert/update (incluidos los bulk_create del middleware). En PostgreSQL
+    # tiene un índice GIN pg_trgm, así que `LIKE '%termino%'` no recorre la tabla.
+    busqueda = models.GeneratedField(
+        expression=Lower(
+            Concat(*[part for campo in CAMPOS_BUSQUEDA for part in (campo, Value(" "))][:-1])
+        ),
+        output_field=models.TextField(),
+        db_persist=True,
+    )
+
     class Meta:
         ordering = ["-fecha"]
         verbose_name = "Bitácora"
         verbose_name_plural = "Bitácoras"
+        indexes = [
+            # Paginación por cursor (fecha, id); también sirve a los filtros por fecha
+            models.Index(fields=["fecha", "id"], name="bitacora_fecha_id_idx"),
+        ]
 
     def __str__(self):
         u = self.usuario or "-"
         return f"[{self.fecha:%Y-%m-%d %H:%M}] {u} {self.accion} {self.ruta}"
+
+
+class BitacoraResumenDiario(models.Model):
+    """
+    Agregado diario de las filas de Bitácora compactadas por la retención
+    (`manage.py retencion_bitacora`): una fila por día/usuario/acción/status/ruta.
+    Las filas originales quedan en el archivo NDJSON comprimido del día.
+    """
+
+    dia = models.DateField()
+    usuario = models.CharField(max_length=150, blank=True, null=True)
+    accion = models.CharField(max_length=10, choices=Bitacora.ACCION_CHOICES)
+    status = models.PositiveIntegerField()
+    ruta = models.CharField(max_length=512)
+    total = models.PositiveIntegerField()
+    primera = models.DateTimeField()
+    ultima = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-dia"]
+        verbose_name = "Resumen diario de Bitácora"
+        verbose_name_plural = "Resúmenes diarios de Bitácora"
+        indexes = [models.Index(fields=["dia", "accion"], name="bitacora_resumen_dia_idx")]
+
+    def __str__(self):
+        return f"[{self.dia}] {self.usuario or '-'} {self.accion} {self.ruta} x{self.total}"
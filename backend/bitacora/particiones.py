@@ -0,0 +1,200 @@
+# backend/bitacora/particiones.py
+"""
+Particionado mensual (PostgreSQL) de la tabla de Bitácora.
+
+La tabla `bitacora_bitacora` se particiona por rango sobre `fecha`, una
+partición por mes (`bitacora_bitacora_pAAAA_MM`, límites en UTC) más una
+partición por defecto que recibe cualquier fila fuera de rango, para que un
+insert del middleware nunca falle por falta de partición.
+
+La llave primaria pasa a ser (id, fecha): PostgreSQL exige que la llave de
+partición forme parte de toda restricción única. Para Django `id` sigue
+siendo la llave primaria del modelo.
+"""
+import re
+from datetime import date
+
+TABLA = "bitacora_bitacora"
+DEFECTO = f"{TABLA}_default"
+SIN_PARTICIONAR = f"{TABLA}_sin_particionar"
+
+_PATRON_PARTICION = re.compile(rf"^{TABLA}_p(\d{{4}})_(\d{{2}})$")
+
+
+def inicio_mes(fecha):
+    return date(fecha.year, fecha.month, 1)
+
+
+def sumar_meses(mes, meses):
+    indice = mes.year * 12 + (mes.month - 1) + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nombre_particion(mes):
+    return f"{TABLA}_p{mes:%Y_%m}"
+
+
+def _limite(mes):
+    return f"'{mes.isoformat()} 00:00:00+00'"
+
+
+def es_particionada(cursor):
+    cursor.execute(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+        )
+        """,
+        [TABLA],
+    )
+    return cursor.fetchone()[0]
+
+
+def listar_particiones(cursor):
+    """Particiones mensuales adjuntas como [(mes, nombre)], ordenadas por mes."""
+    cursor.execute(
+        """
+        SELECT hija.relname
+        FROM pg_inherits i
+        JOIN pg_class padre ON padre.oid = i.inhparent
+        JOIN pg_class hija ON hija.oid = i.inhrelid
+        WHERE padre.relname = %s AND pg_table_is_visible(padre.oid)
+        """,
+        [TABLA],
+    )
+    particiones = []
+    for (nombre,) in cursor.fetchall():
+        coincidencia = _PATRON_PARTICION.match(nombre)
+        if coincidencia:
+            mes = date(int(coincidencia.group(1)), int(coincidencia.group(2)), 1)
+            particiones.append((mes, nombre))
+    return sorted(particiones)
+
+
+def _columnas(cursor, tabla=TABLA):
+    """Columnas insertables (las generadas las calcula PostgreSQL) como lista SQL."""
+    cursor.execute(
+        """
+        SELECT a.attname
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+          AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = ''
+        ORDER BY a.attnum
+        """,
+        [tabla],
+    )
+    return ", ".join(f'"{nombre}"' for (nombre,) in cursor.fetchall())
+
+
+def _copiar(cursor, origen, destino):
+    columnas = _columnas(cursor, origen)
+    cursor.execute(f'INSERT INTO "{destino}" ({columnas}) SELECT {columnas} FROM "{origen}"')
+
+
+def crear_particion(cursor, mes):
+    """
+    Crear y adjuntar la partición de `mes`; False si ya existía.
+
+    Las filas del mes que hubieran caído en la partición por defecto se mueven
+    a la nueva antes de adjuntarla (ATTACH falla si el defecto las contiene).
+    Debe ejecutarse dentro de una transacción.
+    """
+    mes = inicio_mes(mes)
+    nombre = nombre_particion(mes)
+    if any(existente == nombre for _, existente in listar_particiones(cursor)):
+        return False
+
+    desde, hasta = _limite(mes), _limite(sumar_meses(mes, 1))
+    columnas = _columnas(cursor)
+    cursor.execute(f'CREATE TABLE "{nombre}" (LIKE "{TABLA}" INCLUDING DEFAULTS INCLUDING GENERATED)')
+    cursor.execute(
+        f"""
+        WITH movidas AS (
+            DELETE FROM "{DEFECTO}" WHERE fecha >= {desde} AND fecha < {hasta}
+            RETURNING {columnas}
+        )
+        INSERT INTO "{nombre}" ({columnas}) SELECT {columnas} FROM movidas
+        """
+    )
+    cursor.execute(
+        f'ALTER TABLE "{TABLA}" ATTACH PARTITION "{nombre}" FOR VALUES FROM ({desde}) TO ({hasta})'
+    )
+    return True
+
+
+def desprender_particion(cursor, nombre, esquema_archivo=None, eliminar=False):
+    """
+    Desprender una partición de la tabla viva.
+
+    - eliminar=True       → se borra la tabla desprendida
+    - esquema_archivo="x" → se mueve al esquema x (archivo consultable aparte)
+    - en otro caso queda como tabla suelta con el mismo nombre
+    """
+    cursor.execute(f'ALTER TABLE "{TABLA}" DETACH PARTITION "{nombre}"')
+    if eliminar:
+        cursor.execute(f'DROP TABLE "{nombre}"')
+    elif esquema_archivo:
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{esquema_archivo}"')
+        cursor.execute(f'ALTER TABLE "{nombre}" SET SCHEMA "{esquema_archivo}"')
+
+
+def _definiciones_indices(cursor):
+    """CREATE INDEX de los índices secundarios actuales de la tabla."""
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(ix.indexrelid)
+        FROM pg_index ix
+        JOIN pg_class t ON t.oid = ix.indrelid
+        WHERE t.relname = %s AND pg_table_is_visible(t.oid)
+          AND NOT ix.indisprimary
+        """,
+        [TABLA],
+    )
+    # En la tabla padre pg_get_indexdef devuelve "ON ONLY"; se recrean completos
+    return [definicion.replace(" ON ONLY ", " ON ", 1) for (definicion,) in cursor.fetchall()]
+
+
+def particionar(cursor, meses_futuros=3, hoy=None):
+    """
+    Convertir la tabla normal en particionada (operación única, bloquea la
+    tabla mientras copia las filas existentes).
+    """
+    indices = _definiciones_indices(cursor)
+    cursor.execute(f'ALTER TABLE "{TABLA}" RENAME TO "{SIN_PARTICIONAR}"')
+    cursor.execute(
+        f'CREATE TABLE "{TABLA}" (LIKE "{SIN_PARTICIONAR}" INCLUDING DEFAULTS INCLUDING GENERATED) '
+        "PARTITION BY RANGE (fecha)"
+    )
+    cursor.execute(f'CREATE TABLE "{DEFECTO}" PARTITION OF "{TABLA}" DEFAULT')
+
+    cursor.execute(f'SELECT MIN(fecha) FROM "{SIN_PARTICIONAR}"')
+    primera = cursor.fetchone()[0]
+    actual = inicio_mes(hoy or date.today())
+    mes = inicio_mes(primera) if primera else actual
+    mes = min(mes, actual)
+    while mes <= sumar_meses(actual, meses_futuros):
+        crear_particion(cursor, mes)
+        mes = sumar_meses(mes, 1)
+
+    _copiar(cursor, SIN_PARTICIONAR, TABLA)
+    cursor.execute(f'DROP TABLE "{SIN_PARTICIONAR}"')
+    cursor.execute(f'ALTER TABLE "{TABLA}" ADD CONSTRAINT "{TABLA}_pkey" PRIMARY KEY (id, fecha)')
+    # Con la tabla vieja borrada los nombres quedan libres; en la tabla padre
+    # cada índice se propaga a todas las particiones
+    for definicion in indices:
+        cursor.execute(definicion)
+
+
+def desparticionar(cursor):
+    """Operación inversa: volver a una tabla normal con llave primaria (id)."""
+    indices = _definiciones_indices(cursor)
+    cursor.execute(f'CREATE TABLE "{SIN_PARTICIONAR}" (LIKE "{TABLA}" INCLUDING DEFAULTS INCLUDING GENERATED)')
+    _copiar(cursor, TABLA, SIN_PARTICIONAR)
+    cursor.execute(f'DROP TABLE "{TABLA}"')
+    cursor.execute(f'ALTER TABLE "{SIN_PARTICIONAR}" RENAME TO "{TABLA}"')
+    cursor.execute(f'ALTER TABLE "{TABLA}" ADD CONSTRAINT "{TABLA}_pkey" PRIMARY KEY (id)')
+    for definicion in indices:
+        cursor.execute(definicion)
@@ -5,4 +5,4 @@ from .models import Bitacora
 class BitacoraSerializer(serializers.ModelSerializer):
     class Meta:
         model = Bitacora
-        fields = "__all__"
+        exclude = ("busqueda",)
@@ -1,3 +1,310 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.models import User
+from api.tests import plan_de, queryset_de_listado
+
+from . import particiones
+from .buffer import BufferBitacora
+from .models import Bitacora, BitacoraResumenDiario
+from .views import BitacoraViewSet, BusquedaBitacoraFilter
+
+
+# Nodo que recorre el índice (fecha, id): en PostgreSQL con particiones el plan
+# nombra el índice de cada partición (bitacora_bitacora_2025_01_fecha_id_idx, ...)
+USA_INDICE_FECHA = r'(Index (Only )?Scan (using|on)|USING (COVERING )?INDEX) \w*fecha_id_idx\b'
+
+
+class FiltrosBitacoraTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', ci='a1', telefono='0', is_staff=True)
+
+    def test_rango_de_fechas_usa_el_indice(self):
+        queryset = queryset_de_listado(
+            BitacoraViewSet, self.admin, fecha_desde='2025-01-01', fecha_hasta='2025-01-31'
+        )
+        self.assertRegex(plan_de(queryset), USA_INDICE_FECHA)
+        self.assertNotIn('django_datetime_cast_date', str(queryset.query))
+
+
+def fila(**datos):
+    return {"metodo": "POST", "ruta": "/api/avisos/", "status": 201, "accion": "CREATE", **datos}
+
+
+class BufferBitacoraTests(TestCase):
+    def setUp(self):
+        # Sin hilo de fondo: el test decide cuándo se vacía
+        parche = mock.patch.object(BufferBitacora, "_asegurar_hilo")
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_vaciar_en_un_solo_insert_con_roles(self):
+        guardia = User.objects.create(username="guardia", ci="g1", telefono="0")
+        guardia.groups.add(Group.objects.create(name="Seguridad"), Group.objects.create(name="Otro"))
+        buffer = BufferBitacora(max_filas=10)
+
+        for n in range(3):
+            buffer.agregar(fila(usuario="guardia", entidad_id=str(n)), usuario_id=guardia.id)
+        buffer.agregar(fila(usuario=None))
+        self.assertFalse(Bitacora.objects.exists())
+        self.assertFalse(buffer._evento.is_set())
+
+        # Una consulta para los roles y un INSERT para las cuatro filas
+        with self.assertNumQueries(2):
+            self.assertEqual(buffer.vaciar(), 4)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(
+            sorted(Bitacora.objects.values_list("rol", flat=True), key=str), [None, "Seguridad", "Seguridad", "Seguridad"]
+        )
+
+    def test_avisa_al_hilo_al_juntar_max_filas(self):
+        buffer = BufferBitacora(max_filas=2)
+        buffer.agregar(fila())
+        self.assertFalse(buffer._evento.is_set())
+        buffer.agregar(fila())
+        self.assertTrue(buffer._evento.is_set())
+
+    def test_desborde_vaciar(self):
+        buffer = BufferBitacora(max_filas=100, capacidad=2, desborde="vaciar")
+        for _ in range(3):
+            buffer.agregar(fila())
+        # El request que desborda vacía las dos filas previas y encola la suya
+        self.assertEqual(Bitacora.objects.count(), 2)
+        self.assertEqual(len(buffer), 1)
+        self.assertEqual(buffer.descartadas, 0)
+
+    def test_desborde_descartar(self):
+        buffer = BufferBitacora(max_filas=100, capacidad=2, desborde="descartar")
+        for _ in range(3):
+            buffer.agregar(fila())
+        self.assertFalse(Bitacora.objects.exists())
+        self.assertEqual((len(buffer), buffer.descartadas), (2, 1))
+
+    def test_errores_no_rompen_y_se_cuentan(self):
+        buffer = BufferBitacora()
+        buffer.agregar(fila(status=None))
+        self.assertEqual(buffer.vaciar(), 0)
+        self.assertEqual((buffer.errores, len(buffer)), (1, 0))
+
+
+class ParticionesBitacoraTests(TestCase):
+    def ejecutar(self, *argumentos):
+        salida = StringIO()
+        call_command("particiones_bitacora", *argumentos, stdout=salida)
+        return salida.getvalue()
+
+    def test_aritmetica_de_meses(self):
+        self.assertEqual(particiones.inicio_mes(date(2025, 3, 31)), date(2025, 3, 1))
+        self.assertEqual(particiones.sumar_meses(date(2025, 11, 1), 3), date(2026, 2, 1))
+        self.assertEqual(particiones.sumar_meses(date(2025, 1, 1), -1), date(2024, 12, 1))
+        self.assertEqual(particiones.nombre_particion(date(2025, 2, 1)), "bitacora_bitacora_p2025_02")
+
+    @skipUnless(connection.vendor != "postgresql", "Fuera de PostgreSQL el comando no hace nada")
+    def test_sin_postgresql_solo_avisa(self):
+        self.assertIn("solo aplica a PostgreSQL", self.ejecutar())
+
+    @skipUnless(connection.vendor == "postgresql", "El particionado es de PostgreSQL")
+    def test_crea_futuras_mueve_el_defecto_y_desprende_antiguas(self):
+        actual = particiones.inicio_mes(timezone.now())
+        vieja = Bitacora.objects.create(
+            fecha=datetime(2001, 1, 15, tzinfo=dt_timezone.utc), metodo="POST", ruta="/", status=201
+        )
+
+        self.assertIn("Asegurar partición", self.ejecutar("--meses-futuros=1", "--simular"))
+        self.ejecutar("--meses-futuros=1")
+        self.assertEqual(self.ejecutar("--meses-futuros=1"), "")  # ya existían
+        with connection.cursor() as cursor:
+            meses = [mes for mes, _ in particiones.listar_particiones(cursor)]
+            self.assertIn(actual, meses)
+            self.assertIn(particiones.sumar_meses(actual, 1), meses)
+
+            # La fila de enero de 2001 estaba en el defecto y pasa a su partición
+            self.assertTrue(particiones.crear_particion(cursor, date(2001, 1, 1)))
+            cursor.execute('SELECT id FROM "bitacora_bitacora_p2001_01"')
+            self.assertEqual([fila[0] for fila in cursor.fetchall()], [vieja.id])
+            cursor.execute(f'SELECT COUNT(*) FROM "{particiones.DEFECTO}"')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+        self.ejecutar("--meses-futuros=0", "--retener-meses=12", "--eliminar")
+        with connection.cursor() as cursor:
+            self.assertNotIn(date(2001, 1, 1), [mes for mes, _ in particiones.listar_particiones(cursor)])
+        self.assertFalse(Bitacora.objects.filter(pk=vieja.pk).exists())
+
+
+class PaginacionBitacoraTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create(username="admin", ci="a1", telefono="0", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+        # Tres fechas repetidas: el id desempata dentro de cada una
+        base = timezone.now().replace(microsecond=0)
+        Bitacora.objects.bulk_create(
+            Bitacora(fecha=base - timedelta(minutes=n % 3), **fila(entidad_id=str(n))) for n in range(8)
+        )
+
+    def recorrer(self, url):
+        ids, consultas = [], []
+        while url:
+            with CaptureQueriesContext(connection) as contexto:
+                respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 200)
+            consultas += [consulta["sql"] for consulta in contexto.captured_queries]
+            ids += [registro["id"] for registro in respuesta.data["results"]]
+            url = respuesta.data["next"]
+        return ids, consultas
+
+    def test_recorre_todas_las_filas_una_vez_sin_count(self):
+        esperados = [
+            str(pk) for pk in Bitacora.objects.order_by("-fecha", "-id").values_list("id", flat=True)
+        ]
+        ids, consultas = self.recorrer("/api/bitacora/?page_size=3")
+        self.assertEqual(ids, esperados)
+        self.assertFalse([sql for sql in consultas if "COUNT(" in sql.upper() or "OFFSET" in sql.upper()])
+
+        ids, _ = self.recorrer("/api/bitacora/?page_size=3&ordering=fecha")
+        self.assertEqual(ids, esperados[::-1])
+
+    def test_previous_vuelve_a_la_pagina_anterior(self):
+        primera = self.client.get("/api/bitacora/?page_size=3").data
+        segunda = self.client.get(primera["next"]).data
+        self.assertEqual(self.client.get(segunda["previous"]).data["results"], primera["results"])
+
+
+class BusquedaBitacoraTests(TestCase):
+    BUSQUEDAS = [
+        "avisos", "AVISOS", "Mozilla", "firefox admin", "Seguridad 10.0.0",
+        "/api/avisos/ aviso", '"avisos/ aviso"', '"linux x86"', '"firefox/1"', "inexistente",
+    ]
+
+    def setUp(self):
+        Bitacora.objects.bulk_create([
+            Bitacora(**fila(entidad="Aviso", usuario="Admin", rol="Seguridad", ip="10.0.0.1",
+                            user_agent="Mozilla/5.0 (X11; Linux x86_64) Firefox/128.0")),
+            Bitacora(**fila(ruta="/api/areas/", entidad=None, usuario="guardia", rol=None, ip=None)),
+            Bitacora(**fila(entidad="AVISO", usuario=None, user_agent="curl/8.5")),
+        ])
+
+    def buscar(self, filtro, termino):
+        request = Request(APIRequestFactory().get("/", {"search": termino}))
+        vista = BitacoraViewSet(request=request, action="list", format_kwarg=None, kwargs={})
+        return set(filtro.filter_queryset(request, Bitacora.objects.all(), vista).values_list("id", flat=True))
+
+    def test_misma_semantica_que_search_filter(self):
+        for termino in self.BUSQUEDAS:
+            with self.subTest(termino=termino):
+                self.assertEqual(
+                    self.buscar(BusquedaBitacoraFilter(), termino), self.buscar(SearchFilter(), termino)
+                )
+
+
+class ExportarBitacoraTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create(username="admin", ci="a1", telefono="0", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+        base = timezone.now().replace(microsecond=0)
+        # Creadas en desorden: la exportación las devuelve de la más vieja a la más nueva
+        Bitacora.objects.bulk_create([
+            Bitacora(fecha=base - timedelta(minutes=1), **fila(entidad_id="2", extra={"campo": "ñandú"})),
+            Bitacora(fecha=base - timedelta(minutes=5), **fila(entidad_id="1")),
+            Bitacora(fecha=base, **fila(entidad_id="3", accion="DELETE", metodo="DELETE")),
+        ])
+
+    def exportar(self, **params):
+        respuesta = self.client.get("/api/bitacora/exportar/", params)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        return respuesta, b"".join(respuesta.streaming_content).decode()
+
+    def test_csv_filtrado_en_orden_cronologico(self):
+        respuesta, contenido = self.exportar(formato="csv", accion="CREATE")
+        self.assertTrue(respuesta["Content-Type"].startswith("text/csv"))
+        self.assertIn('filename="bitacora_', respuesta["Content-Disposition"])
+
+        filas = list(csv.DictReader(contenido.splitlines()))
+        self.assertEqual([registro["entidad_id"] for registro in filas], ["1", "2"])
+        self.assertEqual(json.loads(filas[1]["extra"]), {"campo": "ñandú"})
+        self.assertEqual(filas[0]["extra"], "")
+
+    def test_ndjson_una_fila_por_linea(self):
+        respuesta, contenido = self.exportar(formato="ndjson")
+        self.assertEqual(respuesta["Content-Type"], "application/x-ndjson")
+
+        registros = [json.loads(linea) for linea in contenido.splitlines()]
+        self.assertEqual([registro["entidad_id"] for registro in registros], ["1", "2", "3"])
+        self.assertEqual(registros[1]["extra"], {"campo": "ñandú"})
+        self.assertEqual(
+            [registro["fecha"] for registro in registros], sorted(registro["fecha"] for registro in registros)
+        )
+
+    def test_formato_invalido(self):
+        self.assertEqual(self.client.get("/api/bitacora/exportar/", {"formato": "xml"}).status_code, 400)
+
+
+class RetencionBitacoraTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media, BITACORA_ARCHIVO_DIR="archivo")
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.dia = timezone.localdate() - timedelta(days=100)
+        mediodia = timezone.make_aware(datetime.combine(self.dia, time(12)))
+        Bitacora.objects.bulk_create([
+            Bitacora(fecha=mediodia, **fila(usuario="admin")),
+            Bitacora(fecha=mediodia + timedelta(minutes=5), **fila(usuario="admin")),
+            Bitacora(fecha=mediodia + timedelta(hours=1), **fila(usuario="admin", accion="DELETE", status=204)),
+            Bitacora(fecha=mediodia - timedelta(days=1), **fila(usuario="guardia")),
+        ])
+        self.reciente = Bitacora.objects.create(**fila(usuario="admin"))
+
+    def ejecutar(self, *argumentos):
+        salida = StringIO()
+        call_command("retencion_bitacora", "--dias=90", "--lote=1", "--pausa-ms=0", *argumentos, stdout=salida)
+        return salida.getvalue()
+
+    def test_resume_archiva_y_borra_lo_antiguo(self):
+        self.assertIn(f"{self.dia}: 3 filas", self.ejecutar("--simular"))
+        self.assertEqual(Bitacora.objects.count(), 5)
+
+        self.ejecutar()
+        self.assertEqual(list(Bitacora.objects.values_list("id", flat=True)), [self.reciente.id])
+        self.assertEqual(
+            sorted(BitacoraResumenDiario.objects.values_list("dia", "usuario", "accion", "total")),
+            [
+                (self.dia - timedelta(days=1), "guardia", "CREATE", 1),
+                (self.dia, "admin", "CREATE", 2),
+                (self.dia, "admin", "DELETE", 1),
+            ],
+        )
+        resumen = BitacoraResumenDiario.objects.get(dia=self.dia, accion="CREATE")
+        self.assertEqual(resumen.ultima - resumen.primera, timedelta(minutes=5))
+
+        ruta = os.path.join(self.media, "archivo", f"{self.dia:%Y}", f"{self.dia:%m}", f"bitacora_{self.dia}.ndjson.gz")
+        with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+            registros = [json.loads(linea) for linea in archivo]
+        self.assertEqual([registro["accion"] for registro in registros], ["CREATE", "CREATE", "DELETE"])
+
+        # Una segunda corrida no encuentra nada ni duplica el resumen
+        self.assertIn("No hay filas", self.ejecutar())
+        self.assertEqual(BitacoraResumenDiario.objects.count(), 3)
@@ -2,6 +2,19 @@
 from django.utils import timezone
 from .models import Bitacora
 
+# Columnas de la exportación y del archivo frío (en este orden)
+CAMPOS_EXPORTACION = [
+    "id", "fecha", "usuario", "rol", "accion", "entidad", "entidad_id",
+    "metodo", "ruta", "status", "ip", "user_agent", "extra",
+]
+
+
+def fila_exportable(fila):
+    """Tupla de values_list(*CAMPOS_EXPORTACION) → dict con la fecha local en ISO."""
+    registro = dict(zip(CAMPOS_EXPORTACION, fila))
+    registro["fecha"] = timezone.localtime(registro["fecha"]).isoformat()
+    return registro
+
 
 def _client_ip(request):
     xff = request.META.get("HTTP_X_FORWARDED_FOR")
@@ -1,48 +1,118 @@
 # backend/bitacora/views.py
+import csv
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.filters import SearchFilter
+
+from api.filtros import filtrar_rango_fechas
+from api.pagination import KeysetPagination
 
-from .models import Bitacora
+from .models import CAMPOS_BUSQUEDA, Bitacora
 from .serializers import BitacoraSerializer
+from .utils import CAMPOS_EXPORTACION, fila_exportable
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+class BitacoraPagination(KeysetPagination):
+    # ?ordering=fecha | -fecha (por defecto, lo más reciente primero)
+    ordering = ("-fecha", "-id")
+
 
+class BusquedaBitacoraFilter(SearchFilter):
+    """
+    ?search= sobre la columna generada `busqueda` en lugar de un icontains
+    por cada columna de search_fields. Misma semántica (cada término debe
+    aparecer como subcadena en alguna de las columnas), pero un solo
+    `LIKE '%termino%'` que en PostgreSQL resuelve el índice GIN pg_trgm.
 
-class BitacoraPagination(PageNumberPagination):
-    page_size = 20
-    page_size_query_param = "page_size"
-    max_page_size = 200
+    Las columnas van unidas por un espacio, así que una frase entre comillas
+    ("avisos/ aviso") podría encontrarse cruzando dos de ellas; para esos
+    términos se exige además el icontains en alguna columna.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        for termino in self.get_search_terms(request):
+            queryset = queryset.filter(busqueda__contains=termino.lower())
+            if " " in termino:
+                queryset = queryset.filter(
+                    reduce(or_, (Q(**{f"{campo}__icontains": termino}) for campo in view.search_fields))
+                )
+        return queryset
 
 
 class BitacoraViewSet(ReadOnlyModelViewSet):
-    queryset = Bitacora.objects.all().order_by("-fecha")
+    queryset = Bitacora.objects.all().defer("busqueda").order_by("-fecha")
     serializer_class = BitacoraSerializer
     # Solo usuarios autenticados que además sean admin (is_staff)
     permission_classes = [IsAuthenticated, IsAdminUser]
     pagination_class = BitacoraPagination
 
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    search_fields = ["ruta", "entidad", "user_agent", "usuario", "rol", "ip"]
+    # El orden lo fija la paginación por cursor sobre (fecha, id)
+    filter_backends = [DjangoFilterBackend, BusquedaBitacoraFilter]
+    search_fields = CAMPOS_BUSQUEDA
     filterset_fields = ["accion", "metodo", "status", "usuario"]
-    ordering_fields = [
-        "fecha",
-        "usuario",
-        "rol",
-        "accion",
-        "entidad",
-        "metodo",
-        "ruta",
-        "status",
-        "ip",
-    ]
 
     def get_queryset(self):
-        qs = super().get_queryset()
-        fecha_desde = self.request.query_params.get("fecha_desde")
-        fecha_hasta = self.request.query_params.get("fecha_hasta")
-        if fecha_desde:
-            qs = qs.filter(fecha__date__gte=fecha_desde)
-        if fecha_hasta:
-            qs = qs.filter(fecha__date__lte=fecha_hasta)
-        return qs
+        # Rango sobre la columna: usa el índice y PostgreSQL descarta las
+        # particiones mensuales fuera del rango
+        return filtrar_rango_fechas(super().get_queryset(), "fecha", self.request.query_params)
+
+    @action(detail=False, methods=["get"])
+    def exportar(self, request):
+        """
+        Exportar la bitácora filtrada (mismos filtros que el listado) como
+        CSV o NDJSON (?formato=csv|ndjson), en orden cronológico.
+
+        Las filas se leen con un cursor del servidor (.iterator()) y se envían
+        a medida que llegan, así que la memoria no crece con el volumen.
+        """
+        formato = request.query_params.get("formato", "csv")
+        if formato not in ("csv", "ndjson"):
+            raise ValidationError({"formato": "Use csv o ndjson."})
+
+        filas = (
+            self.filter_queryset(self.get_queryset())
+            .order_by("fecha", "id")
+            .values_list(*CAMPOS_EXPORTACION)
+            .iterator(chunk_size=2000)
+        )
+        if formato == "csv":
+            contenido, tipo = self._filas_csv(filas), "text/csv; charset=utf-8"
+        else:
+            contenido, tipo = self._filas_ndjson(filas), "application/x-ndjson"
+
+        respuesta = StreamingHttpResponse(contenido, content_type=tipo)
+        respuesta["Content-Disposition"] = (
+            f'attachment; filename="bitacora_{timezone.localdate():%Y%m%d}.{formato}"'
+        )
+        return respuesta
+
+    def _filas_csv(self, filas):
+        escritor = csv.writer(_Eco())
+        yield escritor.writerow(CAMPOS_EXPORTACION)
+        for fila in filas:
+            registro = fila_exportable(fila)
+            if registro["extra"] is not None:
+                registro["extra"] = json.dumps(registro["extra"], cls=DjangoJSONEncoder)
+            yield escritor.writerow(registro.values())
+
+    def _filas_ndjson(self, filas):
+        for fila in filas:
+            yield json.dumps(fila_exportable(fila), cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
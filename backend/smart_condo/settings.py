@@ -99,6 +99,26 @@ DATABASES = {
     }
 }
 
+# Cache compartida por todos los workers (gunicorn): los sellos de versión de
+# privilegios, configuración y galería de rostros, y el calendario de áreas,
+# solo invalidan a los demás procesos si viven en Redis. Sin REDIS_URL se usa
+# la cache local del proceso y los servicios no guardan nada entre requests
+# que deba invalidarse (ver api/services/cache_compartida.py).
+REDIS_URL = config("REDIS_URL", default="")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
@@ -113,6 +133,22 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
 }
 
+# True: el login emite tokens con el rol y un mapa de bits de privilegios
+# (claims rol/rol_v/privs) y TienePrivilegio decide sin consultar la BD.
+# Si cambian los privilegios el sello rol_v queda viejo: se resuelve por rol
+# hasta que el cliente refresque el token (/api/auth/token/refresh/).
+# El sello vigente se lee de la cache compartida (REDIS_URL); sin ella los
+# claims se ignoran, porque un worker no ve los cambios hechos en otro.
+JWT_PRIVILEGIOS_EN_TOKEN = False
+# True: el token lleva username/is_staff/is_superuser/unidad/rol y las lecturas
+# de avisos y reservas usan un UsuarioToken en lugar de consultar el User.
+# Requiere cache compartida: el claim usr_v se compara con el sello del usuario,
+# que sube al guardarlo (p. ej. desactivarlo); sin ella se consulta el User.
+JWT_USUARIO_EN_TOKEN = False
+# Segundos que un worker reutiliza los privilegios de un rol aunque no le llegue
+# el aviso de invalidación (solo con cache compartida; sin ella se consulta siempre)
+PRIVILEGIOS_CACHE_TTL = 60
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -158,6 +194,38 @@ USE_TZ = True
 # True: registra TOD (requests GET/HEAD, redirecciones, etc.)
 # False: solo acciones de usuario (LOGIN/LOGOUT y mutaciones POST/PUT/PATCH/DELETE)
 BITACORA_VERBOSE = False
+# True: el middleware encola las filas y las inserta por lotes (bulk_create) en segundo plano
+BITACORA_ASINCRONA = True
+BITACORA_BUFFER_FILAS = 100  # vaciar al juntar N filas...
+BITACORA_BUFFER_MS = 1000  # ...o cada T milisegundos
+BITACORA_BUFFER_CAPACIDAD = 5000
+BITACORA_BUFFER_DESBORDE = "vaciar"  # "vaciar" (el request vacía el buffer) | "descartar"
+# Particiones mensuales (PostgreSQL), mantenidas con `manage.py particiones_bitacora`
+BITACORA_PARTICIONES_FUTURAS = 3  # meses por adelantado
+BITACORA_RETENCION_MESES = None  # meses en la tabla viva; None = no desprender
+BITACORA_ESQUEMA_ARCHIVO = "bitacora_archivo"
+# Retención (`manage.py retencion_bitacora`): resumen diario + NDJSON.gz en MEDIA_ROOT/BITACORA_ARCHIVO_DIR
+BITACORA_RETENCION_DIAS = 90
+BITACORA_RETENCION_LOTE = 5000  # filas por DELETE
+BITACORA_ARCHIVO_DIR = "bitacora_archivo"
+
+# ===== Reconocimiento facial =====
+# Cada worker aplica los cambios de rostros como deltas publicados en la cache
+# y, por si alguno no le llega, recarga la galería completa cada N segundos
+GALERIA_RECARGA_SEG = 300
+# Vida máxima de la configuración de reconocimiento en cada worker (además del sello de versión)
+CONFIGURACION_CACHE_TTL = 60
+
+# ===== Capturas de acceso =====
+# Las imágenes de RegistroAcceso se guardan en segundo plano; si la cola está llena se descartan
+CAPTURAS_MAX_PENDIENTES = 64
+CAPTURAS_HILOS = 2
+
+# ===== Reservas =====
+# Tope de ocurrencias por serie en POST /api/reservas/recurrentes/
+RESERVAS_RECURRENTES_MAX = 100
+# Vida de cada (área, día) en la cache del calendario; los cambios de reservas la invalidan antes
+CALENDARIO_CACHE_TTL = 900
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
@@ -9,7 +9,6 @@ import {
   IconButton,
   InputLabel,
   MenuItem,
-  Pagination,
   Paper,
   Select,
   Table, TableBody, TableCell, TableContainer, TableHead, TableRow,
@@ -21,6 +20,7 @@ import {
 } from '@mui/material';
 import { useEffect, useMemo, useState } from 'react';
 import { useBitacora } from '../../hooks/useBitacora';
+import { exportarBitacora } from '../../services/bitacoraService';
 
 
 // 🔧 NUEVO: helper para evaluar vacío
@@ -33,25 +33,10 @@ function useDebouncedValue(value, delay = 450) {
   return v;
 }
 
-// ---- export CSV
-function exportCSV(rows, filename = 'bitacora.csv') {
-  if (!rows?.length) return;
-  const headers = Object.keys(rows[0]);
-  const lines = [
-    headers.join(','),
-    ...rows.map(obj =>
-      headers.map(h => {
-        let val = obj[h];
-        if (val === null || val === undefined) val = '';
-        val = String(val).replace(/"/g, '""');
-        if (val.includes(',') || val.includes('"') || val.includes('\n')) val = `"${val}"`;
-        return val;
-      }).join(',')
-    )
-  ];
-  const csv = lines.join('\n');
-  const blob = new Blob([csv], { type: 'text/csv;charset=utf-8;' });
-  const url = URL.createObjectURL(blob);
+// ---- export CSV (todas las filas filtradas; el backend las genera en streaming)
+async function exportCSV(params, filename = 'bitacora.csv') {
+  const res = await exportarBitacora(params, 'csv');
+  const url = URL.createObjectURL(res.data);
   const a = document.createElement('a');
   a.href = url; a.download = filename;
   document.body.appendChild(a); a.click();
@@ -61,7 +46,7 @@ function exportCSV(rows, filename = 'bitacora.csv') {
 
 // ---- columnas
 const columns = [
-  { key: 'fecha', label: 'Fecha/Hora' },
+  { key: 'fecha', label: 'Fecha/Hora', sortable: true },
   { key: 'usuario', label: 'Usuario' },
   { key: 'rol', label: 'Rol' },
   { key: 'accion', label: 'Acción' },
@@ -74,6 +59,12 @@ const columns = [
   { key: 'user_agent', label: 'User Agent' },
 ];
 
+// cursor de la URL next/previous que devuelve la API (paginación por cursor)
+function cursorDe(url) {
+  if (!url) return null;
+  return new URL(url).searchParams.get('cursor');
+}
+
 // visibilidad por breakpoint (ocultamos columnas de baja prioridad en pantallas chicas)
 const COL_VIS = {
   rol:        { display: { xs: 'none', md: 'table-cell' } },
@@ -88,7 +79,7 @@ export default function BitacoraList() {
   const theme = useTheme();
   const isSmDown = useMediaQuery(theme.breakpoints.down('sm')); // < 600px
 
-  const [page, setPage] = useState(1);
+  const [cursor, setCursor] = useState(null);
   const [pageSize] = useState(20);
   const [ordering, setOrdering] = useState('-fecha');
 
@@ -102,17 +93,16 @@ export default function BitacoraList() {
   const [fechaDesde, setFechaDesde] = useState('');
   const [fechaHasta, setFechaHasta] = useState('');
 
-  const { data, count, loading, error } = useBitacora({
-    page, pageSize, search, ordering,
+  const { data, next, previous, loading, error } = useBitacora({
+    cursor, pageSize, search, ordering,
     accion, metodo, status, usuario, fechaDesde, fechaHasta,
   });
 
-  const totalPages = Math.max(1, Math.ceil((count || 0) / pageSize));
   const currentSortKey = useMemo(() => ordering.replace('-', ''), [ordering]);
   const currentSortDir = useMemo(() => (ordering.startsWith('-') ? 'desc' : 'asc'), [ordering]);
 
   const toggleSort = (field) => {
-    setPage(1);
+    setCursor(null);
     setOrdering(prev => {
       if (prev === field) return `-${field}`;
       if (prev === `-${field}`) return field;
@@ -121,7 +111,7 @@ export default function BitacoraList() {
   };
 
   const clearFilters = () => {
-    setPage(1);
+    setCursor(null);
     setSearchInput('');
     setAccion(''); setMetodo(''); setStatus('');
     setUsuario(''); setFechaDesde(''); setFechaHasta('');
@@ -139,7 +129,7 @@ export default function BitacoraList() {
               size={isSmDown ? 'small' : 'medium'}
               label="Buscar (ruta, entidad, user_agent, etc.)"
               value={searchInput}
-              onChange={e => { setPage(1); setSearchInput(e.target.value); }}
+              onChange={e => { setCursor(null); setSearchInput(e.target.value); }}
               fullWidth
             />
           </Grid>
@@ -150,7 +140,7 @@ export default function BitacoraList() {
               <Select
                 label="Acción"
                 value={accion}
-                onChange={e => { setPage(1); setAccion(e.target.value); }}
+                onChange={e => { setCursor(null); setAccion(e.target.value); }}
               >
                 <MenuItem value="">(todas)</MenuItem>
                 {['LOGIN','LOGOUT','CREATE','READ','UPDATE','DELETE','ACCESO','CERRAR SESIÓN','BORRAR','CREAR','ACTUALIZAR'].map(a => (
@@ -166,7 +156,7 @@ export default function BitacoraList() {
               <Select
                 label="Método"
                 value={metodo}
-                onChange={e => { setPage(1); setMetodo(e.target.value); }}
+                onChange={e => { setCursor(null); setMetodo(e.target.value); }}
               >
                 <MenuItem value="">(todos)</MenuItem>
                 {['GET','POST','PUT','PATCH','DELETE'].map(m => (
@@ -182,7 +172,7 @@ export default function BitacoraList() {
               label="Status"
               type="number"
               value={status}
-              onChange={e => { setPage(1); setStatus(e.target.value); }}
+              onChange={e => { setCursor(null); setStatus(e.target.value); }}
               fullWidth
             />
           </Grid>
@@ -192,7 +182,7 @@ export default function BitacoraList() {
               size={isSmDown ? 'small' : 'medium'}
               label="Usuario"
               value={usuario}
-              onChange={e => { setPage(1); setUsuario(e.target.value); }}
+              onChange={e => { setCursor(null); setUsuario(e.target.value); }}
               fullWidth
             />
           </Grid>
@@ -204,7 +194,7 @@ export default function BitacoraList() {
               type="date"
               InputLabelProps={{ shrink: true }}
               value={fechaDesde}
-              onChange={e => { setPage(1); setFechaDesde(e.target.value); }}
+              onChange={e => { setCursor(null); setFechaDesde(e.target.value); }}
               fullWidth
             />
           </Grid>
@@ -216,7 +206,7 @@ export default function BitacoraList() {
               type="date"
               InputLabelProps={{ shrink: true }}
               value={fechaHasta}
-              onChange={e => { setPage(1); setFechaHasta(e.target.value); }}
+              onChange={e => { setCursor(null); setFechaHasta(e.target.value); }}
               fullWidth
             />
           </Grid>
@@ -228,7 +218,10 @@ export default function BitacoraList() {
             <Button
               variant="contained"
               startIcon={<DownloadIcon />}
-              onClick={() => exportCSV(data)}
+              onClick={() => exportCSV({
+                search, accion, metodo, status, usuario,
+                fecha_desde: fechaDesde, fecha_hasta: fechaHasta,
+              })}
               disabled={!data?.length}
             >
               Exportar CSV
@@ -246,22 +239,24 @@ export default function BitacoraList() {
                   key={col.key}
                   sx={{
                     whiteSpace: 'nowrap',
-                    cursor: 'pointer',
+                    cursor: col.sortable ? 'pointer' : 'default',
                     ...(COL_VIS[col.key] || {})
                   }}
-                  onClick={() => toggleSort(col.key)}
+                  onClick={col.sortable ? () => toggleSort(col.key) : undefined}
                 >
                   <Box sx={{ display: 'inline-flex', alignItems: 'center', gap: 0.5 }}>
                     {col.label}
-                    <Tooltip title="Ordenar">
-                      <IconButton size="small">
-                        <SortIcon
-                          fontSize="inherit"
-                          color={currentSortKey === col.key ? 'primary' : 'disabled'}
-                          style={{ transform: currentSortKey === col.key && currentSortDir === 'desc' ? 'rotate(180deg)' : 'none' }}
-                        />
-                      </IconButton>
-                    </Tooltip>
+                    {col.sortable && (
+                      <Tooltip title="Ordenar">
+                        <IconButton size="small">
+                          <SortIcon
+                            fontSize="inherit"
+                            color={currentSortKey === col.key ? 'primary' : 'disabled'}
+                            style={{ transform: currentSortKey === col.key && currentSortDir === 'desc' ? 'rotate(180deg)' : 'none' }}
+                          />
+                        </IconButton>
+                      </Tooltip>
+                    )}
                   </Box>
                 </TableCell>
               ))}
@@ -318,15 +313,17 @@ export default function BitacoraList() {
       </TableContainer>
 
       <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', mt: 2 }}>
-        <Typography variant="body2">Total: {count ?? 0}</Typography>
-        <Pagination
-          page={page}
-          onChange={(_, p) => setPage(p)}
-          count={totalPages}
-          color="primary"
-          showFirstButton
-          showLastButton
-        />
+        <Button size="small" onClick={() => setCursor(null)} disabled={!previous}>
+          Primera página
+        </Button>
+        <Box sx={{ display: 'flex', gap: 1 }}>
+          <Button variant="outlined" size="small" onClick={() => setCursor(cursorDe(previous))} disabled={!previous}>
+            Anterior
+          </Button>
+          <Button variant="outlined" size="small" onClick={() => setCursor(cursorDe(next))} disabled={!next}>
+            Siguiente
+          </Button>
+        </Box>
       </Box>
     </Box>
   );
@@ -27,6 +27,9 @@ import { useEffect, useRef, useState } from 'react';
 import { facialService } from '../../services/facialService';
 import { FacialRecognition, canvasToBase64, captureFrame } from '../../utils/faceAPI';
 
+// Tope de rostros por llamada a /rostros/procesar_acceso_lote/
+const MAX_ROSTROS_POR_CUADRO = 20;
+
 const MonitorAccesoAutomatico = () => {
   const videoRef = useRef(null);
   const [stream, setStream] = useState(null);
@@ -105,30 +108,38 @@ const MonitorAccesoAutomatico = () => {
 
     try {
       const canvas = captureFrame(videoRef.current);
-      const embedding = await facialRecognition.getFaceEmbedding(canvas);
+      const embeddings = await facialRecognition.getFaceEmbeddings(canvas);
 
-      if (embedding) {
+      if (embeddings.length) {
         const imagenCaptura = canvasToBase64(canvas);
-        const resultado = await facialService.procesarAccesoAutomatico(embedding, imagenCaptura);
+        // Todos los rostros del cuadro (un grupo que entra junto) en una sola llamada
+        const respuesta = await facialService.procesarAccesoLote(
+          embeddings.slice(0, MAX_ROSTROS_POR_CUADRO),
+          imagenCaptura
+        );
+        const resultados = respuesta.data.resultados;
+        // Se muestra el primer acceso permitido del cuadro o, si no hay, el primer rechazo
+        const resultado = resultados.find((r) => r.acceso_permitido) || resultados[0];
+        const mensaje = resultados.map((r) => r.mensaje).join(' · ');
 
-        if (resultado.data.acceso_permitido) {
+        if (resultado.acceso_permitido) {
           setUltimoEvento({
             tipo: 'acceso_exitoso',
-            usuario: resultado.data.usuario,
-            tipoAcceso: resultado.data.tipo_acceso,
-            confianza: resultado.data.confianza,
+            usuario: resultado.usuario,
+            tipoAcceso: resultado.tipo_acceso,
+            confianza: resultado.confianza,
             timestamp: new Date(),
-            mensaje: resultado.data.mensaje
+            mensaje: resultado.mensaje
           });
-          mostrarSnackbar(resultado.data.mensaje, 'success');
+          mostrarSnackbar(mensaje, 'success');
         } else {
           setUltimoEvento({
             tipo: 'acceso_denegado',
-            confianza: resultado.data.confianza,
+            confianza: resultado.confianza,
             timestamp: new Date(),
-            mensaje: resultado.data.mensaje
+            mensaje: resultado.mensaje
           });
-          mostrarSnackbar(resultado.data.mensaje, 'warning');
+          mostrarSnackbar(mensaje, 'warning');
         }
 
         // Actualizar estadísticas
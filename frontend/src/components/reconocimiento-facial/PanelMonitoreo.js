@@ -31,7 +31,7 @@ const PanelMonitoreo = () => {
     try {
       const [estadisticasResponse, accesosResponse] = await Promise.all([
         facialService.obtenerEstadisticas(),
-        facialService.obtenerAccesos({ limit: 10 })
+        facialService.obtenerAccesos({ page_size: 10 })
       ]);
       
       setEstadisticas(estadisticasResponse.data);
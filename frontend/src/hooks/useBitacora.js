@@ -11,7 +11,7 @@ function buildQuery(paramsObj) {
 }
 
 export function useBitacora({
-  page = 1,
+  cursor = null,
   pageSize = 20,
   search = '',
   ordering = '-fecha',
@@ -26,13 +26,12 @@ export function useBitacora({
     loading: false,
     error: null,
     data: [],
-    count: 0,
     next: null,
     previous: null,
   });
 
   const queryParams = useMemo(() => buildQuery({
-    page,
+    cursor,
     page_size: pageSize,
     search,
     ordering,
@@ -42,7 +41,7 @@ export function useBitacora({
     usuario,
     fecha_desde: fechaDesde,
     fecha_hasta: fechaHasta,
-  }), [page, pageSize, search, ordering, accion, metodo, status, usuario, fechaDesde, fechaHasta]);
+  }), [cursor, pageSize, search, ordering, accion, metodo, status, usuario, fechaDesde, fechaHasta]);
 
   useEffect(() => {
     let cancelled = false;
@@ -55,7 +54,6 @@ export function useBitacora({
           loading: false,
           error: null,
           data: res.data.results || [],
-          count: res.data.count || 0,
           next: res.data.next || null,
           previous: res.data.previous || null,
         });
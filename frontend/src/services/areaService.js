@@ -7,6 +7,10 @@ const AreaService = {
   create: (payload) => api.post("/areas/", payload),
   update: (id, payload) => api.put(`/areas/${id}/`, payload),
   remove: (id) => api.delete(`/areas/${id}/`),
+  // Horarios libres: { fecha: "AAAA-MM-DD", dias: 1..7, duracion: minutos }
+  disponibilidad: (id, params) => api.get(`/areas/${id}/disponibilidad/`, { params }),
+  // Ocupación por área y día: { desde, hasta, area: "1,2" } (responde ETag)
+  calendario: (params) => api.get("/areas/calendario/", { params }),
   // Reglas para despues
   // listRules: () => api.get("/reglas-area/"),
 };
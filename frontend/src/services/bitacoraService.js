@@ -22,3 +22,8 @@ export const getBitacora = async (params) => {
     throw e;
   }
 };
+
+// Exporta todas las filas que cumplen los filtros (el backend las envía en streaming)
+export const exportarBitacora = (params, formato = 'csv') => {
+  return api.get('bitacora/exportar/', { params: { ...params, formato }, responseType: 'blob' });
+};
@@ -9,6 +9,14 @@ export const facialService = {
     });
   },
 
+  // Procesamiento de varios rostros detectados en un mismo cuadro
+  procesarAccesoLote: (embeddings, imagen) => {
+    return api.post('/rostros/procesar_acceso_lote/', {
+      embeddings: embeddings.map((embedding) => JSON.stringify(embedding)),
+      imagen: imagen
+    });
+  },
+
   // Obtener estadísticas del sistema
   obtenerEstadisticas: () => {
     return api.get('/rostros/estadisticas/');
@@ -7,6 +7,8 @@ const ReservaService = {
   create: (payload) => api.post("/reservas/", payload),
   cancelar: (id) => api.post(`/reservas/${id}/cancelar/`),
   aprobar: (id) => api.post(`/reservas/${id}/aprobar/`), // solo admin debe
+  // Serie (solo admin): { area, inicio, fin, regla: "FREQ=WEEKLY;BYDAY=MO,WE;COUNT=12", parcial }
+  crearRecurrentes: (payload) => api.post("/reservas/recurrentes/", payload),
 };
 
 export default ReservaService;
@@ -53,6 +53,20 @@ export class FacialRecognition {
     return detection ? Array.from(detection.descriptor) : null;
   }
 
+  async getFaceEmbeddings(canvas) {
+    if (!this.modelLoaded) {
+      await this.loadModels();
+    }
+
+    // Todos los rostros del cuadro, para procesarlos en una sola llamada
+    const detections = await faceapi
+      .detectAllFaces(canvas, new faceapi.TinyFaceDetectorOptions())
+      .withFaceLandmarks()
+      .withFaceDescriptors();
+
+    return detections.map((detection) => Array.from(detection.descriptor));
+  }
+
   calculateSimilarity(embedding1, embedding2) {
     if (!embedding1 || !embedding2 || embedding1.length !== embedding2.length) {
       return 0;